@@ -18,12 +18,15 @@ Highlights (new vs previous version):
 """
 from __future__ import print_function
 
-import argparse
+import heapq
+import math
 import os
 import random
 import sys
 import time
-import unittest
+
+# Startup clock for --startup-bench (argparse/unittest/json are imported lazily)
+_T_START = getattr(time, "perf_counter", time.time)()
 
 # ---------------- Basic constants ----------------
 POS_X = 0
@@ -59,6 +62,12 @@ ASCII_MAP = """\
 # ---------------- Logging (quiet mode for tests) ----------------
 QUIET = False
 
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+LOG_LEVELS = {"debug": DEBUG, "info": INFO, "warn": WARN, "error": ERROR}
+
 def _to_text(x):
     try:
         return str(x)
@@ -68,19 +77,473 @@ def _to_text(x):
         except Exception:
             return "<unprintable>"
 
-def log(*a):
-    """Py2/3-safe logging without print kwargs or f-strings."""
-    if not QUIET:
-        line = " ".join(_to_text(x) for x in a)
+def _join(*a):
+    return " ".join(_to_text(x) for x in a)
+
+def _percent(template, args):
+    return template % args
+
+def _colored(key, template, args):
+    return c(_percent(template, args), key)
+
+class Lazy(object):
+    """Message fragment rendered only when a sink actually writes it."""
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return self.fn(*self.args)
+
+def lazyf(template, *args):
+    """Lazy '%' formatting: lazyf("%s used %s", a, b)."""
+    return Lazy(_percent, template, args)
+
+class TerminalSink(object):
+    """Batched writes to stdout; also receives raw screen output (map, prompts)."""
+    screen = True
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, text):
+        stream = self.stream or sys.stdout
         try:
-            sys.stdout.write(line + "\n")
-            sys.stdout.flush()
+            stream.write(text)
         except Exception:
             try:
-                print(line)
+                print(text, end="")
             except Exception:
                 pass
 
+    def flush(self):
+        try:
+            (self.stream or sys.stdout).flush()
+        except Exception:
+            pass
+
+    def close(self):
+        self.flush()
+
+class FileSink(object):
+    """Append log lines (not screen frames) to a file."""
+    screen = False
+
+    def __init__(self, path):
+        self.fh = open(path, "a")
+
+    def write(self, text):
+        try:
+            self.fh.write(text)
+        except Exception:
+            pass
+
+    def flush(self):
+        try:
+            self.fh.flush()
+        except Exception:
+            pass
+
+    def close(self):
+        try:
+            self.fh.close()
+        except Exception:
+            pass
+
+class RingSink(object):
+    """Keep the last N log lines in memory (post-mortems, tests)."""
+    screen = False
+
+    def __init__(self, size=200):
+        from collections import deque
+        self.lines = deque(maxlen=int(size))
+
+    def write(self, text):
+        self.lines.extend(text.rstrip("\n").split("\n"))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class NullSink(object):
+    """Discard everything; the logger skips formatting entirely."""
+    screen = False
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+CLEAR_SCREEN = "\033[2J\033[H"
+CAST_FRAME_SECONDS = 0.12  # synthetic time between frames in a .cast export
+
+class CastSink(object):
+    """
+    Record screen output as an asciicast v2 file instead of showing it. Each
+    screen clear ends a frame; frames get synthetic timestamps and, after
+    the first, only the lines that changed are rewritten. Events stream to
+    FILE.part and the header (which needs the final size) is prepended on close.
+    """
+    screen = True
+
+    def __init__(self, path, title=None, frame_seconds=CAST_FRAME_SECONDS):
+        import re
+        self.path = path
+        self.title = title
+        self.frame_seconds = frame_seconds
+        self.fh = open(path + ".part", "w")
+        self.ansi = re.compile("\033\\[[0-9;]*[A-Za-z]")
+        self.pending = ""
+        self.prev = []
+        self.frames = 0
+        self.width = 80
+        self.height = 24
+        self.bytes = 0
+
+    def write(self, text):
+        if isinstance(text, bytes) and str is bytes:  # Python 2
+            text = text.decode("utf-8", "replace")
+        parts = (self.pending + text).split(CLEAR_SCREEN)
+        for frame in parts[:-1]:
+            self._frame(frame)
+        self.pending = parts[-1]
+
+    def _frame(self, text):
+        import json
+        if not text:
+            return
+        lines = text.rstrip("\n").split("\n")
+        prev = self.prev
+        changed = []
+        for i, line in enumerate(lines):
+            if i >= len(prev) or prev[i] != line:
+                changed.append(i)
+                self.width = max(self.width, len(self.ansi.sub("", line)))
+        if not prev:
+            data = CLEAR_SCREEN + "\r\n".join(lines)
+        else:
+            data = "".join(["\033[%d;1H%s\033[K" % (i + 1, lines[i]) for i in changed] +
+                           ["\033[%d;1H\033[K" % (i + 1) for i in range(len(lines), len(prev))])
+        self.prev = lines
+        self.height = max(self.height, len(lines) + 1)
+        if data:  # an unchanged frame only lets time pass
+            event = json.dumps([round(self.frames * self.frame_seconds, 3), "o", data]) + "\n"
+            self.fh.write(event)
+            self.bytes += len(event)
+        self.frames += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        import json
+        if self.fh is None:
+            return
+        self._frame(self.pending)
+        self.pending = ""
+        self.fh.close()
+        self.fh = None
+        header = {"version": 2, "width": self.width, "height": self.height,
+                  "env": {"TERM": "xterm-256color"}}
+        if self.title:
+            header["title"] = self.title
+        with open(self.path, "w") as dst:
+            dst.write(json.dumps(header, sort_keys=True) + "\n")
+            with open(self.path + ".part") as src:
+                for chunk in iter(lambda: src.read(1 << 16), ""):
+                    dst.write(chunk)
+        os.remove(self.path + ".part")
+
+class Logger(object):
+    """
+    Leveled logger with pluggable sinks. Records are queued unformatted and
+    rendered once per frame in flush(), so filtered or null-sinked messages
+    never build strings.
+    """
+    def __init__(self, sinks=None, level=INFO):
+        self.level = level
+        self.pending = []
+        self.set_sinks(sinks if sinks is not None else [TerminalSink()])
+
+    def set_sinks(self, sinks):
+        self.flush()
+        self.sinks = list(sinks)
+        self.live = [s for s in self.sinks if not isinstance(s, NullSink)]
+        self.has_screen = any(s.screen for s in self.live)
+        self.has_lines = bool(self.live)
+
+    def wants(self, level):
+        return self.has_lines and level >= self.level
+
+    def record(self, level, fn, args):
+        self.pending.append((level, fn, args))
+
+    def raw(self, text):
+        if self.has_screen:
+            self.pending.append((None, text, None))
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = []
+        screen = []
+        lines = []
+        for level, fn, args in pending:
+            if level is None:
+                screen.append(fn)
+                continue
+            try:
+                text = fn(*args) + "\n"
+            except Exception:
+                text = "<log error>\n"
+            screen.append(text)
+            lines.append(text)
+        screen_text = "".join(screen)
+        lines_text = "".join(lines)
+        for s in self.live:
+            text = screen_text if s.screen else lines_text
+            if text:
+                s.write(text)
+            s.flush()
+
+    def close(self):
+        self.flush()
+        for s in self.sinks:
+            s.close()
+
+LOGGER = Logger()
+
+def log(*a):
+    """Py2/3-safe logging without print kwargs or f-strings."""
+    if not QUIET and LOGGER.wants(INFO):
+        LOGGER.record(INFO, _join, a)
+
+def logf(template, *args):
+    """log() with deferred '%' formatting for hot paths."""
+    if not QUIET and LOGGER.wants(INFO):
+        LOGGER.record(INFO, _percent, (template, args))
+
+def logc(key, template, *args):
+    """Colored logf()."""
+    if not QUIET and LOGGER.wants(INFO):
+        LOGGER.record(INFO, _colored, (key, template, args))
+
+def log_at(level, template, *args):
+    if not QUIET and LOGGER.wants(level):
+        LOGGER.record(level, _percent, (template, args))
+
+def flush_log():
+    LOGGER.flush()
+
+def configure_logging(level=None, log_file=None, null=False):
+    """Rebuild LOGGER's sinks from CLI options."""
+    if level is not None:
+        LOGGER.level = LOG_LEVELS.get(level, level)
+    sinks = [NullSink()] if null else [TerminalSink()]
+    if log_file:
+        sinks.append(FileSink(log_file))
+    LOGGER.set_sinks(sinks)
+
+# ---------------- Profiling ----------------
+PROFILING = False
+_clock = getattr(time, "perf_counter", time.time)
+
+# Histogram buckets (upper bounds in seconds) for the --profile report
+_PROFILE_BUCKETS = [(1e-5, "<10us"), (1e-4, "<100us"), (1e-3, "<1ms"),
+                    (1e-2, "<10ms"), (1e-1, "<100ms"), (float("inf"), ">=100ms")]
+
+def _percentile(sorted_vals, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return 0.0
+    k = int(round(p / 100.0 * (len(sorted_vals) - 1)))
+    return sorted_vals[max(0, min(len(sorted_vals) - 1, k))]
+
+class PhaseProfiler(object):
+    """
+    Per-phase timings. Call sites guard with the PROFILING flag:
+        t0 = _clock() if PROFILING else 0
+        ...
+        if PROFILING: PROFILER.add("draw", t0)
+    so a disabled profiler costs one global lookup per hook.
+    """
+    ORDER = ["input", "move", "enemies", "weather", "draw", "clear", "battle_round"]
+
+    def __init__(self):
+        self.samples = {}
+
+    def reset(self):
+        self.samples = {}
+
+    def add(self, phase, t0):
+        elapsed = _clock() - t0
+        try:
+            self.samples[phase].append(elapsed)
+        except KeyError:
+            self.samples[phase] = [elapsed]
+
+    def phases(self):
+        known = [p for p in self.ORDER if p in self.samples]
+        return known + sorted(p for p in self.samples if p not in self.ORDER)
+
+    def stats(self):
+        """Return {phase: {count, total_ms, mean_ms, p50_ms, ..., histogram}}."""
+        result = {}
+        for phase in self.phases():
+            vals = sorted(self.samples[phase])
+            hist = [0] * len(_PROFILE_BUCKETS)
+            for v in vals:
+                for i, (bound, _label) in enumerate(_PROFILE_BUCKETS):
+                    if v < bound:
+                        hist[i] += 1
+                        break
+            total = sum(vals)
+            result[phase] = {
+                "count": len(vals),
+                "total_ms": total * 1e3,
+                "mean_ms": total * 1e3 / len(vals),
+                "p50_ms": _percentile(vals, 50) * 1e3,
+                "p95_ms": _percentile(vals, 95) * 1e3,
+                "p99_ms": _percentile(vals, 99) * 1e3,
+                "max_ms": vals[-1] * 1e3,
+                "histogram": dict((label, n) for (_b, label), n in zip(_PROFILE_BUCKETS, hist)),
+            }
+        return result
+
+    def report(self):
+        stats = self.stats()
+        log("")
+        log(c("=== PROFILE (ms) ===", "hud"))
+        log("%-13s %7s %9s %8s %8s %8s %8s" % ("phase", "count", "total", "p50", "p95", "p99", "max"))
+        for phase in self.phases():
+            s = stats[phase]
+            log("%-13s %7d %9.2f %8.3f %8.3f %8.3f %8.3f" % (
+                phase, s["count"], s["total_ms"], s["p50_ms"], s["p95_ms"], s["p99_ms"], s["max_ms"]))
+            log("              " + "  ".join("%s:%d" % (label, s["histogram"][label])
+                                              for _b, label in _PROFILE_BUCKETS if s["histogram"][label]))
+
+    def dump_json(self, path):
+        import json
+        with open(path, "w") as fh:
+            json.dump(self.stats(), fh, indent=2, sort_keys=True)
+
+PROFILER = PhaseProfiler()
+PROFILE_JSON = None
+
+# ---------------- Telemetry ----------------
+
+# Typed events: name -> field names (values are passed positionally to emit())
+EVENT_FIELDS = {
+    "step": ("steps", "x", "y"),
+    "pickup": ("item", "x", "y"),
+    "mystery": ("outcome", "value"),
+    "battle_start": ("enemy", "enemy_hp", "hp"),
+    "battle_turn": ("enemy", "round", "dmg_taken", "dmg_dealt", "hp", "enemy_hp"),
+    "battle_end": ("enemy", "result", "rounds"),
+    "level_up": ("level", "max_hp", "flame_pp"),
+    "weather": ("state", "turns"),
+    "run_summary": ("summary",),
+}
+
+TELEMETRY = None  # anything with emit(kind, *values): EventBus, sim taps
+
+class EventBus(object):
+    """
+    JSONL event stream. emit() only stores a tuple in a preallocated ring;
+    serialization and file I/O happen per batch when the ring fills (or on
+    close), optionally on a background writer thread so the game loop never
+    waits on the disk.
+    """
+    def __init__(self, path, capacity=1024, threaded=False):
+        self.capacity = max(1, int(capacity))
+        self.ring = [None] * self.capacity
+        self.n = 0
+        self.seq = 0
+        self.t0 = _clock()
+        self.fh = open(path, "a")
+        self.encode = None
+        self.queue = None
+        self.thread = None
+        if threaded:
+            import threading
+            try:
+                import queue as _queue
+            except ImportError:
+                import Queue as _queue  # type: ignore
+            self.queue = _queue.Queue()
+            self.thread = threading.Thread(target=self._writer, name="telemetry")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def emit(self, kind, *values):
+        self.ring[self.n] = (self.seq, _clock() - self.t0, kind, values)
+        self.seq += 1
+        self.n += 1
+        if self.n == self.capacity:
+            self.flush()
+
+    def flush(self):
+        if not self.n:
+            return
+        batch, n = self.ring, self.n
+        self.n = 0
+        if self.queue is not None:
+            # Hand the full ring to the writer; keep emitting into a fresh one
+            self.ring = [None] * self.capacity
+            self.queue.put((batch, n))
+        else:
+            self._write(batch, n)
+
+    def _write(self, batch, n):
+        if self.encode is None:
+            import json
+            self.encode = json.JSONEncoder(separators=(",", ":")).encode
+        encode = self.encode
+        lines = []
+        for i in range(n):
+            seq, t, kind, values = batch[i]
+            rec = {"seq": seq, "t": round(t, 6), "ev": kind}
+            rec.update(zip(EVENT_FIELDS[kind], values))
+            lines.append(encode(rec))
+        lines.append("")
+        self.fh.write("\n".join(lines))
+        self.fh.flush()
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self._write(*item)
+
+    def close(self):
+        self.flush()
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+        self.fh.close()
+
+def start_telemetry(path, threaded=False, capacity=1024):
+    global TELEMETRY
+    stop_telemetry()
+    TELEMETRY = EventBus(path, capacity, threaded)
+    return TELEMETRY
+
+def stop_telemetry():
+    global TELEMETRY
+    if TELEMETRY is not None:
+        TELEMETRY.close()
+        TELEMETRY = None
+
 # ---------------- I/O helpers & compatibility ----------------
 
 def is_interactive_stdin():
@@ -90,17 +553,12 @@ def is_interactive_stdin():
         return False
 
 def out(s):
-    try:
-        sys.stdout.write(s)
-        sys.stdout.flush()
-    except Exception:
-        try:
-            sys.stdout.write(s)
-        except Exception:
-            pass
+    """Queue raw screen output; it reaches the terminal on the next flush."""
+    LOGGER.raw(s)
 
 # DEMO mode
 DEMO_MODE = False
+DEMO_STEPS = 240  # keys a DEMO run plays before quitting
 _DEMO_STEP_COUNT = 0
 _DEMO_MOVE_CHOICES = ['w', 'a', 's', 'd']
 
@@ -108,11 +566,11 @@ def demo_next_key():
     """Return synthetic movement keys and eventually 'q' to end DEMO."""
     global _DEMO_STEP_COUNT
     _DEMO_STEP_COUNT += 1
-    if _DEMO_STEP_COUNT > 240:
+    if _DEMO_STEP_COUNT > DEMO_STEPS:
         return 'q'
     weights = [1, 1, 2, 3]  # w,a,s,d (slight bias to move forward)
     total = sum(weights)
-    r = random.randint(1, total)
+    r = RNG.demo.randint(1, total)
     acc = 0
     for i, w in enumerate(weights):
         acc += w
@@ -120,18 +578,67 @@ def demo_next_key():
             return _DEMO_MOVE_CHOICES[i]
     return 'd'
 
-# Optional readchar
-_READCHAR = False
-try:
-    import readchar  # type: ignore
-    _READCHAR = True
-except Exception:
-    _READCHAR = False
+# Optional readchar (imported on the first human key read, not at startup)
+_READCHAR = None
 
-def safe_input(prompt=""):
-    """Non-blocking guard for DEMO; otherwise try normal input."""
-    if DEMO_MODE:
-        return ""
+def _readchar_module():
+    global _READCHAR
+    if _READCHAR is None:
+        try:
+            import readchar  # type: ignore
+            _READCHAR = readchar
+        except Exception:
+            _READCHAR = False
+    return _READCHAR
+
+# Turbo mode: no sleeps, no ENTER pauses, no subprocess clears
+TURBO = False
+
+# Input recording / replay (one input per line; "# seed N" header)
+_INPUT_RECORD = None
+_REPLAY = None
+
+def start_recording(path, seed):
+    global _INPUT_RECORD
+    _INPUT_RECORD = open(path, "w")
+    _INPUT_RECORD.write("# seed %d\n" % seed)
+
+def _record_input(s):
+    if _INPUT_RECORD is not None:
+        try:
+            _INPUT_RECORD.write(s + "\n")
+            _INPUT_RECORD.flush()
+        except Exception:
+            pass
+
+def load_replay(path):
+    """Load a recorded input stream. Return the recorded seed (or None)."""
+    global _REPLAY
+    seed = None
+    keys = []
+    with open(path) as fh:
+        for line in fh:
+            line = line.rstrip("\r\n")
+            if line.startswith("# seed "):
+                try:
+                    seed = int(line[7:])
+                except ValueError:
+                    pass
+            elif not line.startswith("#"):
+                keys.append(line)
+    keys.reverse()
+    _REPLAY = keys
+    return seed
+
+def scripted_input():
+    """True when inputs come from DEMO or a replay rather than a human."""
+    return DEMO_MODE or _REPLAY is not None
+
+def _next_replay():
+    # An exhausted replay quits the run
+    return _REPLAY.pop() if _REPLAY else "q"
+
+def _raw_input(prompt):
     try:
         # Py2/3 compatibility
         try:
@@ -143,22 +650,50 @@ def safe_input(prompt=""):
         # If input cannot be read (e.g., non-interactive), just return empty
         return ""
 
+def safe_input(prompt=""):
+    """Non-blocking guard for DEMO/replay; otherwise try normal input."""
+    if _REPLAY is not None:
+        return _next_replay()
+    if DEMO_MODE:
+        return ""
+    flush_log()
+    s = _raw_input(prompt)
+    _record_input(s)
+    return s
+
+def pause(prompt="ENTER…"):
+    """Wait for ENTER between screens (humans only, never in turbo)."""
+    if TURBO or scripted_input() or not is_interactive_stdin():
+        return
+    # Not recorded: replays skip pauses, so they must not consume inputs
+    flush_log()
+    _raw_input(prompt)
+
 def read_key(prompt=""):
     """
-    Read a single key. In DEMO, generate a synthetic move key.
+    Read a single key. In DEMO, generate a synthetic move key; in replay,
+    return the next recorded key.
     Otherwise:
       - If readchar is available, use it for single-key input.
       - Else fall back to input() and take the first char.
     If input cannot be read, return empty string (no auto-DEMO).
     """
+    if _REPLAY is not None:
+        return _next_replay()[:1].lower()
     if DEMO_MODE:
         return demo_next_key()
 
     if prompt:
         out(prompt)
+    flush_log()
+    ch = _read_key_raw()
+    _record_input(ch)
+    return ch
 
+def _read_key_raw():
     # Single key if available
-    if _READCHAR:
+    readchar = _readchar_module()
+    if readchar:
         try:
             ch = readchar.readchar()
             if isinstance(ch, bytes):
@@ -171,26 +706,25 @@ def read_key(prompt=""):
             pass
 
     # Fallback to line input
-    try:
-        try:
-            inp = raw_input  # noqa: F821  # type: ignore
-        except NameError:
-            inp = input
-        ch = inp("").strip()
-        return ch[:1].lower() if ch else ""
-    except Exception:
-        # Non-interactive or other error: return empty so the loop can continue
-        return ""
+    ch = _raw_input("").strip()
+    return ch[:1].lower() if ch else ""
 
 def safe_clear():
-    """Clear screen with an ANSI fallback."""
-    try:
-        ret = os.system("cls" if os.name == "nt" else "clear")
-        if ret == 0:
-            return
-    except Exception:
-        pass
-    out("\033[2J\033[H")
+    """Clear screen with an ANSI fallback (ANSI only in turbo: no subprocess)."""
+    t0 = _clock() if PROFILING else 0
+    flush_log()
+    if not TURBO:
+        try:
+            ret = os.system("cls" if os.name == "nt" else "clear")
+            if ret == 0:
+                if PROFILING:
+                    PROFILER.add("clear", t0)
+                return
+        except Exception:
+            pass
+    out(CLEAR_SCREEN)
+    if PROFILING:
+        PROFILER.add("clear", t0)
 
 # ---------------- Optional colors ----------------
 ENABLE_COLOR = True
@@ -208,6 +742,7 @@ COLORS = {
     "bar_mid": CSI + "33m",
     "bar_low": CSI + "31m",
     "status": CSI + "95m",
+    "fog": CSI + "2;90m",
 }
 
 if os.getenv("NO_COLOR") == "1":
@@ -225,6 +760,41 @@ def c(text, key):
         return text
     return COLORS.get(key, "") + text + RESET
 
+# Map cells as (sgr, text). Each sgr resets before setting its color, so a
+# row only needs a code where the color changes; blank cells (sgr None) show
+# no foreground and join whatever run they sit in.
+_GLYPHS = {
+    "player": ("player", " @ "),
+    "wall": ("wall", "###"),
+    "fog_wall": ("fog", "###"),
+    "fog_floor": ("fog", " . "),
+    "enemy": ("enemy", " E "),
+    "item": ("potion", " * "),
+    "coin": ("coin", " $ "),
+    "mystery": ("mystery", " ? "),
+    "other": (None, " * "),
+    "blank": (None, "   "),
+}
+_OBJECT_GLYPHS = {"enemy": "enemy", "potion": "item", "superpotion": "item",
+                  "antidote": "item", "coin": "coin", "mystery": "mystery"}
+_GLYPH_ATLAS = {}
+
+def glyph_atlas():
+    """Cell glyphs for the current color setting (built once per setting)."""
+    atlas = _GLYPH_ATLAS.get(ENABLE_COLOR)
+    if atlas is None:
+        atlas = {}
+        for name, (key, text) in _GLYPHS.items():
+            if not ENABLE_COLOR or text.isspace():
+                sgr = None
+            elif key is None:
+                sgr = RESET
+            else:
+                sgr = CSI + "0;" + COLORS[key][len(CSI):]
+            atlas[name] = (sgr, text)
+        _GLYPH_ATLAS[ENABLE_COLOR] = atlas
+    return atlas
+
 # ---------------- Map ----------------
 
 def build_map(s):
@@ -234,7 +804,509 @@ def build_map(s):
     grid = [list(r.ljust(maxw)) for r in rows]
     return grid, maxw, len(grid)
 
-obstacle_definition, MAP_WIDTH, MAP_HEIGHT = build_map(ASCII_MAP)
+# Installed lazily by ensure_map() / use_map() so importing stays cheap
+obstacle_definition = None
+MAP_WIDTH = 0
+MAP_HEIGHT = 0
+MAP_WRAP = True      # player moves wrap at the edges (--no-wrap turns it off)
+_COMPONENTS = {}     # wrap mode -> map_components() result for the current map
+
+def ensure_map():
+    """Parse ASCII_MAP on first use unless another map is already installed."""
+    if obstacle_definition is None:
+        use_map(build_map(ASCII_MAP)[0])
+
+def use_map(grid):
+    """Install a rectangular grid (list of char lists) as the active map."""
+    global obstacle_definition, MAP_WIDTH, MAP_HEIGHT
+    _COMPONENTS.clear()
+    obstacle_definition = grid
+    MAP_HEIGHT = len(grid)
+    MAP_WIDTH = len(grid[0]) if grid else 0
+    if FOG is not None:
+        FOG.invalidate()
+
+def generate_map(width, height, wall_density=0.25, rng=None):
+    """
+    Random maze-like grid in the style of ASCII_MAP: solid top/bottom rows
+    and horizontal wall runs. The start cell (0, 1) is always free.
+    """
+    rng = rng or random
+    grid = [[" "] * width for _ in range(height)]
+    grid[0] = ["#"] * width
+    grid[height - 1] = ["#"] * width
+    target = int(wall_density * width * (height - 2))
+    placed = 0
+    while placed < target:
+        y = rng.randint(1, height - 2)
+        run = rng.randint(3, max(3, width // 3))
+        x0 = rng.randint(0, max(0, width - run))
+        for x in range(x0, min(width, x0 + run)):
+            if grid[y][x] != "#":
+                grid[y][x] = "#"
+                placed += 1
+    grid[1][0] = " "
+    return grid
+
+# ---------------- Open world (chunks) ----------------
+CHUNK_SIZE = 16
+CHUNK_CAPACITY = 25        # resident chunks (LRU); >= (2 * radius + 1) ** 2
+CHUNK_MAX_DIFFS = 4096     # remembered chunk diffs; the oldest are forgotten
+CHUNK_WALL_DENSITY = 0.2
+_MASK64 = (1 << 64) - 1
+
+WORLD = None  # ChunkWorld in --open-world runs, None for the classic map
+
+class ChunkWorld(object):
+    """
+    Endless map of CHUNK_SIZE x CHUNK_SIZE chunks generated from (seed, cx, cy)
+    only. At most `capacity` chunks stay resident (LRU); an evicted chunk keeps
+    just a compact diff (bitmask of consumed objects + changed cells) and is
+    regenerated from it when revisited, so memory stays bounded.
+    """
+
+    def __init__(self, seed, counts, size=CHUNK_SIZE, capacity=CHUNK_CAPACITY,
+                 radius=1, max_diffs=CHUNK_MAX_DIFFS):
+        from collections import OrderedDict
+        self.seed = seed
+        self.counts = counts  # per chunk: enemies, potions, supers, antidotes, coins, mystery
+        self.size = size
+        self.capacity = max(capacity, (2 * radius + 1) ** 2)
+        self.radius = radius
+        self.max_diffs = max_diffs
+        self.chunks = OrderedDict()  # (cx, cy) -> rows (lists of chars), LRU order
+        self.diffs = OrderedDict()   # (cx, cy) -> [consumed bitmask, {(lx, ly): char}]
+        self.terrain = OrderedDict()  # (cx, cy) -> rows of non-resident chunks cell() looked at
+        self.generated = 0
+        self.evicted = 0
+
+    def chunk_rng(self, cx, cy):
+        k = (self.seed * 0x9E3779B97F4A7C15 + cx * 0xBF58476D1CE4E5B9 +
+             cy * 0x94D049BB133111EB) & _MASK64
+        return random.Random(k)
+
+    def generate(self, cx, cy):
+        """(rows, object specs) for a chunk; a pure function of (seed, cx, cy)."""
+        n = self.size
+        rng = self.chunk_rng(cx, cy)
+        rows = [[" "] * n for _ in range(n)]
+        target = int(CHUNK_WALL_DENSITY * n * n)
+        placed = 0
+        while placed < target:
+            y = rng.randrange(n)
+            run = rng.randint(3, max(3, n // 3))
+            x0 = rng.randint(0, n - run)
+            for x in range(x0, x0 + run):
+                if rows[y][x] != "#":
+                    rows[y][x] = "#"
+                    placed += 1
+        start = (cx, cy) == (0, 0)
+        if start:
+            rows[0][0] = " "  # the player starts at (0, 0)
+        free = [(x, y) for y in range(n) for x in range(n)
+                if rows[y][x] != "#" and not (start and x == 0 and y == 0)]
+        rng.shuffle(free)
+        specs = []
+        kinds = ("enemy", "potion", "superpotion", "antidote", "coin", "mystery")
+        for kind, count in zip(kinds, self.counts):
+            for _ in range(count):
+                if not free:
+                    break
+                x, y = free.pop()
+                specs.append((kind, x, y, pick_spawn(rng) if kind == "enemy" else None))
+        return rows, specs
+
+    def _load(self, key):
+        cx, cy = key
+        rows, specs = self.generate(cx, cy)
+        self.terrain.pop(key, None)
+        consumed = 0
+        diff = self.diffs.get(key)
+        if diff:
+            consumed = diff[0]
+            for (lx, ly), ch in diff[1].items():
+                rows[ly][lx] = ch
+        # enemies that wandered off into a still-resident chunk are not spawned twice
+        live = set(o["idx"] for o in map_objects if o.get("chunk") == key)
+        ox, oy = cx * self.size, cy * self.size
+        for idx, (kind, x, y, eid) in enumerate(specs):
+            if consumed >> idx & 1 or idx in live:
+                continue
+            pos = [ox + x, oy + y]
+            if kind == "enemy":
+                obj = new_enemy(eid, pos)
+            elif kind in ("potion", "superpotion"):
+                obj = {"type": kind, "heal": ITEM_HEAL[kind], "pos": pos}
+            elif kind == "coin":
+                obj = {"type": "coin", "value": 5, "pos": pos}
+            else:
+                obj = {"type": kind, "pos": pos}
+            obj["chunk"] = key
+            obj["idx"] = idx
+            map_objects.append(obj)
+            toggle_object_hash(obj)
+        ENEMY_SCHEDULER.mark_dirty()
+        self.generated += 1
+        self.chunks[key] = rows
+        return rows
+
+    def _evict(self, key):
+        """Forget a chunk and every unpinned object no longer standing in a resident chunk."""
+        del self.chunks[key]
+        n, chunks = self.size, self.chunks
+        map_objects[:] = [o for o in map_objects
+                          if o.get("pinned") or (o["pos"][0] // n, o["pos"][1] // n) in chunks]
+        rehash_objects()
+        ENEMY_SCHEDULER.mark_dirty()
+        if FOG is not None:
+            FOG.forget_chunk(key, n)
+        self.evicted += 1
+
+    def _diff(self, key):
+        diff = self.diffs.pop(key, None) or [0, {}]
+        self.diffs[key] = diff
+        while len(self.diffs) > self.max_diffs:
+            self.diffs.popitem(last=False)
+        return diff
+
+    def focus(self, x, y):
+        """Keep the chunks around (x, y) resident and evict the least recently used."""
+        n, r = self.size, self.radius
+        cx, cy = x // n, y // n
+        for dy in range(-r, r + 1):
+            for dx in range(-r, r + 1):
+                key = (cx + dx, cy + dy)
+                rows = self.chunks.pop(key, None)
+                if rows is None:
+                    self._load(key)
+                else:
+                    self.chunks[key] = rows
+        while len(self.chunks) > self.capacity:
+            self._evict(next(iter(self.chunks)))
+
+    def cell(self, x, y):
+        """Terrain char at (x, y); a chunk that is not resident is not loaded."""
+        n = self.size
+        key = (x // n, y // n)
+        rows = self.chunks.get(key)
+        if rows is None:
+            rows = self._terrain(key)
+        return rows[y % n][x % n]
+
+    def _terrain(self, key):
+        """Rows of a non-resident chunk (seed + diff), kept in a small LRU, no objects."""
+        rows = self.terrain.pop(key, None)
+        if rows is None:
+            rows = self.generate(key[0], key[1])[0]
+            diff = self.diffs.get(key)
+            if diff:
+                for (lx, ly), ch in diff[1].items():
+                    rows[ly][lx] = ch
+        self.terrain[key] = rows
+        while len(self.terrain) > self.capacity:
+            self.terrain.popitem(last=False)
+        return rows
+
+    def peek(self, x, y):
+        """Cell char, or None when its chunk is not resident (never loads)."""
+        n = self.size
+        rows = self.chunks.get((x // n, y // n))
+        return None if rows is None else rows[y % n][x % n]
+
+    def set_cell(self, x, y, ch):
+        n = self.size
+        key = (x // n, y // n)
+        if key not in self.chunks:
+            self._load(key)
+        self.chunks[key][y % n][x % n] = ch
+        self._diff((x // n, y // n))[1][(x % n, y % n)] = ch
+
+    def consume(self, obj):
+        """Remember that a generated object was picked up / defeated."""
+        key = obj.get("chunk")
+        if key is not None:
+            self._diff(key)[0] |= 1 << obj["idx"]
+
+    def rows(self, ox, oy, w, h):
+        cell = self.cell
+        return [[cell(x, y) for x in range(ox, ox + w)] for y in range(oy, oy + h)]
+
+    def chunk_cells(self, cx, cy):
+        """Walkable cells of one chunk (loading it if needed)."""
+        n = self.size
+        rows = self.chunks.get((cx, cy)) or self._load((cx, cy))
+        for ly in range(n):
+            for lx in range(n):
+                if rows[ly][lx] != "#":
+                    yield [cx * n + lx, cy * n + ly]
+
+def world_counts(enemies, potions, supers, antidotes, coins, mystery):
+    """Scale per-map object counts to per-chunk counts (same density as ASCII_MAP)."""
+    ensure_map()
+    area = float(CHUNK_SIZE * CHUNK_SIZE) / (MAP_WIDTH * MAP_HEIGHT)
+    return tuple(int(round(n * area)) for n in (enemies, potions, supers, antidotes, coins, mystery))
+
+def map_cell(x, y):
+    """Terrain char at (x, y) on whichever map is active."""
+    if WORLD is not None:
+        return WORLD.cell(x, y)
+    return obstacle_definition[y][x]
+
+STEPS = {"w": (0, -1), "s": (0, 1), "a": (-1, 0), "d": (1, 0)}
+
+def step_position(pos, step, wrap):
+    """Target cell of a step, or None when it leaves an unwrapped classic map."""
+    nx, ny = pos[POS_X] + step[0], pos[POS_Y] + step[1]
+    if WORLD is not None:
+        return [nx, ny]
+    if wrap:
+        return [nx % MAP_WIDTH, ny % MAP_HEIGHT]
+    if 0 <= nx < MAP_WIDTH and 0 <= ny < MAP_HEIGHT:
+        return [nx, ny]
+    return None
+
+# ---------------- Field of view (fog of war) ----------------
+FOV_RADIUS = 8
+FOV_CACHE_SIZE = 256
+
+FOG = None  # FieldOfView when --fog is on
+
+# (xx, xy, yx, yy) transforms mapping the first octant onto each of the eight
+_OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+class FieldOfView(object):
+    """
+    Recursive shadowcasting over the active map. Visible sets are cached per
+    (x, y, radius) in a small LRU and only dropped when walls change, so
+    walking back and forth costs a dict lookup. `seen` remembers every cell
+    that was ever visible (dimmed on screen).
+    """
+
+    def __init__(self, radius=FOV_RADIUS, wrap=False, capacity=FOV_CACHE_SIZE):
+        from collections import OrderedDict
+        self.radius = radius
+        self.wrap = wrap
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self.merged = set()  # cache keys already folded into `seen`
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _norm(self, x, y):
+        if WORLD is None and self.wrap:
+            return x % MAP_WIDTH, y % MAP_HEIGHT
+        return x, y
+
+    def _opaque(self, x, y):
+        if WORLD is not None:
+            return WORLD.cell(x, y) == "#"
+        if self.wrap:
+            return obstacle_definition[y % MAP_HEIGHT][x % MAP_WIDTH] == "#"
+        if x < 0 or y < 0 or x >= MAP_WIDTH or y >= MAP_HEIGHT:
+            return True
+        return obstacle_definition[y][x] == "#"
+
+    def _cast(self, cx, cy, row, start, end, xx, xy, yx, yy, out):
+        if start < end:
+            return
+        radius = self.radius
+        radius2 = radius * radius
+        new_start = start
+        for j in range(row, radius + 1):
+            dx, dy = -j - 1, -j
+            blocked = False
+            while dx <= 0:
+                dx += 1
+                x, y = cx + dx * xx + dy * xy, cy + dx * yx + dy * yy
+                l_slope = (dx - 0.5) / (dy + 0.5)
+                r_slope = (dx + 0.5) / (dy - 0.5)
+                if start < r_slope:
+                    continue
+                if end > l_slope:
+                    break
+                if dx * dx + dy * dy <= radius2:
+                    out.add(self._norm(x, y))
+                if blocked:
+                    if self._opaque(x, y):
+                        new_start = r_slope
+                    else:
+                        blocked = False
+                        start = new_start
+                elif self._opaque(x, y) and j < radius:
+                    blocked = True
+                    self._cast(cx, cy, j + 1, start, l_slope, xx, xy, yx, yy, out)
+                    new_start = r_slope
+            if blocked:
+                break
+
+    def compute(self, x, y):
+        """Uncached visible set from (x, y)."""
+        out = set([self._norm(x, y)])
+        for xx, xy, yx, yy in _OCTANTS:
+            self._cast(x, y, 1, 1.0, 0.0, xx, xy, yx, yy, out)
+        return frozenset(out)
+
+    def visible(self, pos):
+        key = (pos[POS_X], pos[POS_Y], self.radius)
+        vis = self.cache.pop(key, None)
+        if vis is None:
+            self.misses += 1
+            vis = self.compute(pos[POS_X], pos[POS_Y])
+            if len(self.cache) >= self.capacity:
+                self.merged.discard(self.cache.popitem(last=False)[0])
+        else:
+            self.hits += 1
+        self.cache[key] = vis
+        if key not in self.merged:
+            self.seen |= vis
+            self.merged.add(key)
+        return vis
+
+    def invalidate(self):
+        """Walls changed: every cached set may be wrong."""
+        self.cache.clear()
+        self.merged.clear()
+
+    def forget_chunk(self, key, size):
+        """Drop remembered cells of an evicted open-world chunk."""
+        self.seen = set(p for p in self.seen if (p[0] // size, p[1] // size) != key)
+        self.merged.clear()
+
+def set_cell(x, y, ch):
+    """Change terrain on the active map (keeps chunk diffs and FOV in sync)."""
+    if WORLD is not None:
+        WORLD.set_cell(x, y, ch)
+    else:
+        obstacle_definition[y][x] = ch
+        _COMPONENTS.clear()
+    if FOG is not None:
+        FOG.invalidate()
+
+# ---------------- Random streams ----------------
+# one independent generator per subsystem, so e.g. extra battle rolls never shift roaming
+RNG_STREAMS = ("map", "demo", "ai", "weather", "battle", "loot", "mystery")
+
+class RngStreams(object):
+    """
+    Seedable per-subsystem random.Random streams (RNG.map, RNG.battle, ...).
+    Every stream is derived from one root seed, so a run is reproducible from
+    it; split() hands out further independent streams (per worker, per
+    forked simulation) without drawing from, or disturbing, the parents.
+    """
+
+    def __init__(self, root=0):
+        self.seed(root)
+
+    @staticmethod
+    def derive(root, name, index=0):
+        import zlib
+        tag = zlib.crc32(name.encode("ascii")) & 0xffffffff
+        return (root * 0x9E3779B97F4A7C15 + tag * 0xBF58476D1CE4E5B9 +
+                index * 0x94D049BB133111EB) & _MASK64
+
+    def seed(self, root):
+        self.root = root & _MASK64
+        for name in RNG_STREAMS:
+            setattr(self, name, random.Random(self.derive(self.root, name)))
+
+    def split(self, name, index):
+        """Independent stream number `index` (>= 1) of subsystem `name`."""
+        return random.Random(self.derive(self.root, name, index))
+
+    def getstate(self):
+        return tuple(getattr(self, name).getstate() for name in RNG_STREAMS)
+
+    def setstate(self, state):
+        for name, s in zip(RNG_STREAMS, state):
+            getattr(self, name).setstate(s)
+
+RNG = RngStreams()
+
+def seed_streams(root=None):
+    """Re-seed every stream; by default from the global RNG (so random.seed(N) fixes a run)."""
+    RNG.seed(random.getrandbits(64) if root is None else root)
+
+# ---------------- Camera (viewport) ----------------
+VIEW_RESERVED_ROWS = 8  # HUD (2) + borders (2) + footer (1) + a few message lines
+
+def terminal_size():
+    """(columns, rows) of the terminal on stdout; (80, 24) when unknown."""
+    try:
+        import shutil
+        size = shutil.get_terminal_size()
+        return size.columns, size.lines
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:  # Python 2
+        import fcntl
+        import struct
+        import termios
+        rows, cols = struct.unpack("hh", fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b"1234"))
+        if rows > 0 and cols > 0:
+            return cols, rows
+    except Exception:
+        pass
+    return 80, 24
+
+class Camera(object):
+    """
+    Window of map cells that follows the player. Its size comes from the
+    terminal, queried once and again only after SIGWINCH; when stdout is not
+    a terminal (pipes, tests, demos) the whole map is drawn as before.
+    """
+
+    def __init__(self):
+        self.fixed = None  # (w, h) in cells, overriding the terminal
+        self.size = None
+        self.stale = True
+
+    def on_resize(self, *_):
+        self.stale = True  # signal handler: just flag it, query on next frame
+
+    def watch(self):
+        """Refresh the size on terminal resizes (main thread, POSIX only)."""
+        try:
+            import signal
+            signal.signal(signal.SIGWINCH, self.on_resize)
+        except (ImportError, AttributeError, ValueError):
+            pass
+
+    def cells(self):
+        """Window size in cells, or None to draw the whole map."""
+        if self.fixed:
+            return self.fixed
+        if self.stale:
+            self.stale = False
+            self.size = None
+            if hasattr(sys.stdout, "isatty") and sys.stdout.isatty():
+                cols, rows = terminal_size()
+                self.size = (max(5, (cols - 2) // 3), max(5, rows - VIEW_RESERVED_ROWS))
+        return self.size
+
+    def frame(self):
+        """(ox, oy, w, h): top-left map cell and size of the window to draw."""
+        px, py = my_position[POS_X], my_position[POS_Y]
+        size = self.cells()
+        if WORLD is not None:
+            # stay inside the resident chunks: drawing must never load (and populate) one
+            n, r = WORLD.size, WORLD.radius
+            span = n * (2 * r + 1)
+            w, h = size or (MAP_WIDTH, MAP_HEIGHT)
+            w, h = min(w, span), min(h, span)
+            lx, ly = (px // n - r) * n, (py // n - r) * n
+            ox = min(max(lx, px - w // 2), lx + span - w)
+            oy = min(max(ly, py - h // 2), ly + span - h)
+            return ox, oy, w, h
+        if size is None:
+            return 0, 0, MAP_WIDTH, MAP_HEIGHT
+        w, h = min(size[0], MAP_WIDTH), min(size[1], MAP_HEIGHT)
+        ox = min(max(0, px - w // 2), MAP_WIDTH - w)
+        oy = min(max(0, py - h // 2), MAP_HEIGHT - h)
+        return ox, oy, w, h
+
+CAMERA = Camera()
 
 # ---------------- Game content ----------------
 # Player BASE (scales with level)
@@ -273,17 +1345,19 @@ weather = {"state": "Clear", "turns": 0}
 
 def set_weather(state=None, turns=None):
     if state is None:
-        state = random.choice(WEATHER_STATES)
+        state = RNG.weather.choice(WEATHER_STATES)
     if turns is None:
-        turns = random.randint(8, 16)
+        turns = RNG.weather.randint(8, 16)
     weather["state"] = state
     weather["turns"] = int(turns)
+    if TELEMETRY:
+        TELEMETRY.emit("weather", state, weather["turns"])
 
 def tick_weather():
     if weather["turns"] > 0:
         weather["turns"] -= 1
         if weather["turns"] == 0:
-            weather["state"] = "Clear"
+            set_weather("Clear", 0)  # emits the change like any other
 
 # Enemies
 ENEMIES = {
@@ -319,6 +1393,214 @@ ENEMIES = {
     },
 }
 
+# Spawn table (ordered), surprise spawns from mystery tiles, boss, item stats
+SPAWN_WEIGHTS = [("Machop", 1), ("Geodude", 1), ("Zubat", 1), ("Onix", 1), ("Koffing", 1)]
+MYSTERY_SPAWNS = ["Zubat", "Koffing", "Machop"]
+BOSS_NAME = "Boss Onix"
+ITEM_HEAL = {"potion": 25, "superpotion": 50}
+POISON_WALK_STEPS = 0  # opt-in: poison also stings out of battle every N steps (0 = off)
+
+# ---------------- Content tables ----------------
+# ENEMIES & co. are compiled into flat per-attack / per-enemy lists so the
+# battle code indexes lists instead of doing dict lookups on every attack.
+ENEMY_NAMES = []
+ENEMY_ID = {}
+ENEMY_HP = []
+ENEMY_SPEED = []
+ENEMY_ATK_START = []
+ENEMY_ATK_COUNT = []
+ATK_NAME = []
+ATK_BASE = []
+ATK_MISS = []
+ATK_CRIT = []
+ATK_POISON = []
+SPAWN_IDS = []
+SPAWN_CUM = []
+SPAWN_UNIFORM = True
+MYSTERY_IDS = []
+BOSS_ID = 0
+
+def compile_content():
+    """Rebuild the flat tables from ENEMIES / SPAWN_WEIGHTS / MYSTERY_SPAWNS / BOSS_NAME."""
+    global SPAWN_UNIFORM, BOSS_ID
+    names = sorted(ENEMIES)
+    for table in (ENEMY_NAMES, ENEMY_HP, ENEMY_SPEED, ENEMY_ATK_START, ENEMY_ATK_COUNT, ATK_NAME,
+                  ATK_BASE, ATK_MISS, ATK_CRIT, ATK_POISON, SPAWN_IDS, SPAWN_CUM, MYSTERY_IDS):
+        del table[:]
+    ENEMY_ID.clear()
+    for eid, name in enumerate(names):
+        spec = ENEMIES[name]
+        ENEMY_NAMES.append(name)
+        ENEMY_ID[name] = eid
+        ENEMY_HP.append(int(spec["hp"]))
+        ENEMY_SPEED.append(float(spec.get("speed", 1.0)))
+        ENEMY_ATK_START.append(len(ATK_NAME))
+        ENEMY_ATK_COUNT.append(len(spec["attacks"]))
+        for atk_name, base, params in spec["attacks"]:
+            ATK_NAME.append(atk_name)
+            ATK_BASE.append(int(base))
+            ATK_MISS.append(float(params.get("miss", 0.05)))
+            ATK_CRIT.append(float(params.get("crit", 0.10)))
+            ATK_POISON.append(bool(params.get("poison", False)))
+    total = 0
+    for name, weight in SPAWN_WEIGHTS:
+        if weight > 0:
+            total += weight
+            SPAWN_IDS.append(ENEMY_ID[name])
+            SPAWN_CUM.append(total)
+    SPAWN_UNIFORM = len(set(w for _n, w in SPAWN_WEIGHTS if w > 0)) <= 1
+    MYSTERY_IDS.extend(ENEMY_ID[n] for n in MYSTERY_SPAWNS)
+    BOSS_ID = ENEMY_ID[BOSS_NAME]
+
+_TEXT = (str, type(u""))  # JSON strings are unicode on Python 2
+
+def _is_number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def _is_count(v):
+    return isinstance(v, int) and not isinstance(v, bool)
+
+def validate_content(data):
+    """Check a content dict (see --dump-content); raise ValueError listing every problem."""
+    errors = []
+    if not isinstance(data, dict):
+        raise ValueError("content: top level must be an object")
+    enemies = data.get("enemies")
+    if not isinstance(enemies, dict) or not enemies:
+        raise ValueError("content: 'enemies' must be a non-empty object")
+
+    def enemy_name(v):
+        return isinstance(v, _TEXT) and v in enemies
+
+    for name, spec in enemies.items():
+        where = "enemies.%s" % name
+        if not isinstance(spec, dict):
+            errors.append("%s: must be an object" % where)
+            continue
+        hp = spec.get("hp")
+        if not _is_count(hp) or hp <= 0:
+            errors.append("%s.hp: positive integer required" % where)
+        speed = spec.get("speed", 1.0)
+        if not _is_number(speed) or not 0.1 <= speed <= 12:
+            errors.append("%s.speed: number in [0.1, 12] required" % where)
+        attacks = spec.get("attacks")
+        if not isinstance(attacks, list) or not attacks:
+            errors.append("%s.attacks: non-empty list required" % where)
+            continue
+        for i, atk in enumerate(attacks):
+            at = "%s.attacks[%d]" % (where, i)
+            if not isinstance(atk, dict) or not isinstance(atk.get("name"), _TEXT) or not atk["name"]:
+                errors.append("%s: object with a 'name' required" % at)
+                continue
+            base = atk.get("base", 0)
+            if not _is_count(base) or base < 0:
+                errors.append("%s.base: non-negative integer required" % at)
+            probs = []
+            for key in ("miss", "crit"):
+                v = atk.get(key, 0.0)
+                if not _is_number(v) or not 0.0 <= v <= 1.0:
+                    errors.append("%s.%s: probability in [0, 1] required" % (at, key))
+                else:
+                    probs.append(v)
+            if len(probs) == 2 and sum(probs) > 1.0:
+                errors.append("%s: miss + crit exceeds 1" % at)
+    spawn = data.get("spawn", [])
+    if not isinstance(spawn, list):
+        errors.append("spawn: list of [name, weight] required")
+        spawn = []
+    positive = False
+    for i, entry in enumerate(spawn):
+        if not isinstance(entry, list) or len(entry) != 2:
+            errors.append("spawn[%d]: [name, weight] pair required" % i)
+            continue
+        if not enemy_name(entry[0]):
+            errors.append("spawn: unknown enemy %r" % (entry[0],))
+        if not _is_number(entry[1]) or entry[1] < 0:
+            errors.append("spawn: weight for %r must be a number >= 0" % (entry[0],))
+        elif entry[1] > 0:
+            positive = True
+    if not positive:
+        errors.append("spawn: list of [name, weight] with at least one positive weight required")
+    mystery = data.get("mystery_spawns", [])
+    if not isinstance(mystery, list):
+        errors.append("mystery_spawns: list of enemy names required")
+        mystery = []
+    for name in mystery:
+        if not enemy_name(name):
+            errors.append("mystery_spawns: unknown enemy %r" % (name,))
+    if not enemy_name(data.get("boss")):
+        errors.append("boss: must name an enemy")
+    walk = data.get("poison_walk_steps", 0)
+    if not _is_count(walk) or walk < 0:
+        errors.append("poison_walk_steps: non-negative integer required")
+    items = data.get("items", {})
+    if not isinstance(items, dict):
+        errors.append("items: object required")
+        items = {}
+    for item in sorted(set(("potion", "superpotion")) | set(items)):
+        spec = items.get(item, {})
+        heal = spec.get("heal") if isinstance(spec, dict) else None
+        if not _is_count(heal) or heal < 0:
+            errors.append("items.%s.heal: non-negative integer required" % item)
+    if errors:
+        raise ValueError("invalid content:\n  " + "\n  ".join(errors))
+
+def content_dict():
+    """Current content in the JSON file format."""
+    return {
+        "enemies": dict((name, {"hp": spec["hp"], "speed": spec.get("speed", 1.0), "attacks": [
+            dict(params, name=atk_name, base=base) for atk_name, base, params in spec["attacks"]]})
+            for name, spec in ENEMIES.items()),
+        "spawn": [[name, weight] for name, weight in SPAWN_WEIGHTS],
+        "mystery_spawns": list(MYSTERY_SPAWNS),
+        "boss": BOSS_NAME,
+        "items": dict((item, {"heal": heal}) for item, heal in ITEM_HEAL.items()),
+        "poison_walk_steps": POISON_WALK_STEPS,
+    }
+
+def apply_content(data):
+    """Validate a content dict, install it and recompile the tables."""
+    global ENEMIES, SPAWN_WEIGHTS, MYSTERY_SPAWNS, BOSS_NAME, ITEM_HEAL, POISON_WALK_STEPS
+    validate_content(data)
+    ENEMIES = dict((name, {"hp": spec["hp"], "speed": spec.get("speed", 1.0), "attacks": [
+        (atk["name"], atk.get("base", 0), dict((k, v) for k, v in atk.items() if k not in ("name", "base")))
+        for atk in spec["attacks"]]}) for name, spec in data["enemies"].items())
+    SPAWN_WEIGHTS = [(name, weight) for name, weight in data["spawn"]]
+    MYSTERY_SPAWNS = list(data.get("mystery_spawns", []))
+    BOSS_NAME = data["boss"]
+    ITEM_HEAL = dict((item, spec["heal"]) for item, spec in data["items"].items())
+    POISON_WALK_STEPS = data.get("poison_walk_steps", 0)
+    compile_content()
+
+_CONTENT_PATH = None
+
+def load_content(path):
+    """Load --content FILE once (repeat calls with the same path are free)."""
+    global _CONTENT_PATH
+    if path == _CONTENT_PATH:
+        return
+    import json
+    with open(path) as fh:
+        apply_content(json.load(fh))
+    _CONTENT_PATH = path
+
+HP_SCALE = 1.0  # --hp-scale / tuned presets: multiplier on every enemy's HP
+
+def new_enemy(eid, pos):
+    """Map object for enemy table index `eid`."""
+    hp = ENEMY_HP[eid] if HP_SCALE == 1.0 else max(1, int(round(ENEMY_HP[eid] * HP_SCALE)))
+    return {"type": "enemy", "name": ENEMY_NAMES[eid], "eid": eid, "hp": hp, "pos": pos}
+
+def pick_spawn(rng=None):
+    """Random enemy id from the spawn table (uniform tables keep random.choice's RNG use)."""
+    rng = rng or RNG.map
+    if SPAWN_UNIFORM:
+        return SPAWN_IDS[rng.randrange(len(SPAWN_IDS))]
+    import bisect
+    return SPAWN_IDS[bisect.bisect_right(SPAWN_CUM, rng.random() * SPAWN_CUM[-1])]
+
+compile_content()
+
 # ---------------- Game utilities ----------------
 
 def draw_bar(current, total, size=HP_BAR_SIZE):
@@ -336,51 +1618,123 @@ def draw_bar(current, total, size=HP_BAR_SIZE):
         color = "bar_low"
     return c("[" + ("*" * filled) + (" " * empty) + "]", color) + " ({}/{})".format(current, total)
 
-def all_free_cells():
-    """Yield all walkable cells (no wall, not player)."""
+def map_components(wrap):
+    """
+    Connected regions of the classic map as (labels, cells): labels[y][x] is
+    the region id of a walkable cell (-1 for walls) and cells[id] its cells in
+    row-major order. Flood fill follows player moves (edges wrap unless
+    --no-wrap); cached per wrap mode until the map changes.
+    """
+    cached = _COMPONENTS.get(wrap)
+    if cached is not None:
+        return cached
+    labels = [[-1] * MAP_WIDTH for _ in range(MAP_HEIGHT)]
+    count = 0
+    for y in range(MAP_HEIGHT):
+        for x in range(MAP_WIDTH):
+            if labels[y][x] != -1 or obstacle_definition[y][x] == "#":
+                continue
+            labels[y][x] = count
+            stack = [(x, y)]
+            while stack:
+                cell = stack.pop()
+                for step in STEPS.values():
+                    nxt = step_position(cell, step, wrap)
+                    if nxt is None:
+                        continue
+                    nx, ny = nxt
+                    if labels[ny][nx] == -1 and obstacle_definition[ny][nx] != "#":
+                        labels[ny][nx] = count
+                        stack.append((nx, ny))
+            count += 1
+    cells = [[] for _ in range(count)]
     for y in range(MAP_HEIGHT):
+        row = labels[y]
         for x in range(MAP_WIDTH):
-            if obstacle_definition[y][x] != "#" and [x, y] != my_position:
-                yield [x, y]
+            if row[x] != -1:
+                cells[row[x]].append((x, y))
+    _COMPONENTS[wrap] = (labels, cells)
+    return labels, cells
+
+def reachable_cells():
+    """Walkable cells of the player's region (every walkable cell if the player is off it)."""
+    labels, cells = map_components(MAP_WRAP)
+    x, y = my_position
+    label = labels[y][x] if 0 <= x < MAP_WIDTH and 0 <= y < MAP_HEIGHT else -1
+    if label == -1:
+        return [cell for region in cells for cell in region]
+    return cells[label]
 
-def random_free_cell():
-    """Pick a random free cell (no wall, not player, not occupied)."""
-    free = [cell for cell in all_free_cells()
-            if all(obj["pos"] != cell for obj in map_objects)]
+def all_free_cells():
+    """
+    Yield the walkable cells the player can reach (not the player's own);
+    the player's chunk in --open-world.
+    """
+    if WORLD is not None:
+        n = WORLD.size
+        for cell in WORLD.chunk_cells(my_position[POS_X] // n, my_position[POS_Y] // n):
+            if cell != my_position:
+                yield cell
+        return
+    me = tuple(my_position)
+    for cell in reachable_cells():
+        if cell != me:
+            yield [cell[0], cell[1]]
+
+def random_free_cell(rng=None):
+    """Pick a random free cell (reachable, no wall, not player, not occupied)."""
+    rng = rng or RNG.map
+    me = tuple(my_position)
+    occupied = ENEMY_SCHEDULER.occupied  # one bucket per probe, no pass over map_objects
+    if WORLD is None:
+        # O(1) draws from the player's region; fall back to a scan when crowded
+        region = reachable_cells()
+        for _ in range(16):
+            cell = region[rng.randrange(len(region))]
+            if cell != me and not occupied(cell[0], cell[1]):
+                return [cell[0], cell[1]]
+    free = [cell for cell in all_free_cells() if not occupied(cell[0], cell[1])]
     if not free:
         raise RuntimeError("No free cells available")
-    return random.choice(free)
+    return rng.choice(free)
 
 def populate_map(num_enemies, num_potions, num_super, num_antidotes, num_coins, num_mystery):
     """Place enemies and items without overlaps."""
-    map_objects[:] = []
+    objs = []
     free = [cell for cell in all_free_cells()]
-    random.shuffle(free)
+    RNG.map.shuffle(free)
 
     def take_cell():
         if not free:
             raise RuntimeError("Not enough free cells")
         return free.pop()
 
-    enemy_names = ["Machop", "Geodude", "Zubat", "Onix", "Koffing"]
     for _ in range(num_enemies):
-        name = random.choice(enemy_names)
-        map_objects.append({
-            "type": "enemy",
-            "name": name,
-            "hp": ENEMIES[name]["hp"],
-            "pos": take_cell(),
-        })
+        objs.append(new_enemy(pick_spawn(), take_cell()))
     for _ in range(num_potions):
-        map_objects.append({"type": "potion", "heal": 25, "pos": take_cell()})
+        objs.append({"type": "potion", "heal": ITEM_HEAL["potion"], "pos": take_cell()})
     for _ in range(num_super):
-        map_objects.append({"type": "superpotion", "heal": 50, "pos": take_cell()})
+        objs.append({"type": "superpotion", "heal": ITEM_HEAL["superpotion"], "pos": take_cell()})
     for _ in range(num_antidotes):
-        map_objects.append({"type": "antidote", "pos": take_cell()})
+        objs.append({"type": "antidote", "pos": take_cell()})
     for _ in range(num_coins):
-        map_objects.append({"type": "coin", "value": 5, "pos": take_cell()})
+        objs.append({"type": "coin", "value": 5, "pos": take_cell()})
     for _ in range(num_mystery):
-        map_objects.append({"type": "mystery", "pos": take_cell()})
+        objs.append({"type": "mystery", "pos": take_cell()})
+    replace_objects(objs)
+
+def remove_object(obj):
+    """Take an object off the map (picked up / defeated)."""
+    if TIMELINE is not None:
+        idx = next(i for i, o in enumerate(map_objects) if o is obj)
+        TIMELINE.log.append(("del", idx, obj))
+        del map_objects[idx]
+    else:
+        map_objects.remove(obj)
+    toggle_object_hash(obj)
+    ENEMY_SCHEDULER.mark_dirty()
+    if WORLD is not None:
+        WORLD.consume(obj)
 
 def occupancy_index():
     """O(1) index for rendering."""
@@ -388,7 +1742,7 @@ def occupancy_index():
 
 def apply_variance(base, miss=0.05, crit=0.10, crit_mult=1.5):
     """Return damage with miss/crit variance (legacy helper)."""
-    r = random.random()
+    r = RNG.battle.random()
     if r < miss:
         return 0
     if r < miss + crit:
@@ -400,7 +1754,7 @@ def roll_damage(base, miss=0.05, crit=0.10, crit_mult=1.5):
     Roll an attack once and return (damage, missed, critical).
     Status-only moves (base==0) apply status only if not missed.
     """
-    r = random.random()
+    r = RNG.battle.random()
     if r < miss:
         return 0, True, False
     critical = (r < miss + crit)
@@ -411,10 +1765,12 @@ def enemy_turn(enemy):
     """Return (damage, effects, message) for a randomly chosen enemy attack.
        Weather adjustments applied after roll.
     """
-    atk_name, base, params = random.choice(ENEMIES[enemy["name"]]["attacks"])
-    miss_p = params.get("miss", 0.05)
-    crit_p = params.get("crit", 0.10)
-    dmg, missed, critical = roll_damage(base, miss_p, crit_p, 1.5)
+    eid = enemy.get("eid")
+    if eid is None:
+        eid = ENEMY_ID[enemy["name"]]
+    a = ENEMY_ATK_START[eid] + RNG.battle.randrange(ENEMY_ATK_COUNT[eid])
+    base = ATK_BASE[a]
+    dmg, missed, critical = roll_damage(base, ATK_MISS[a], ATK_CRIT[a], 1.5)
 
     # Weather tweaks (affect final damage or miss message)
     if not missed:
@@ -424,17 +1780,17 @@ def enemy_turn(enemy):
         # Sunny/Rain don't affect enemy by default
 
     effects = {}
-    if params.get("poison") and not missed:
+    if ATK_POISON[a] and not missed:
         effects["poison"] = True
 
     if missed:
-        msg = "%s used %s (missed)" % (enemy["name"], atk_name)
+        msg = lazyf("%s used %s (missed)", enemy["name"], ATK_NAME[a])
     else:
         if base > 0:
             extra = " (CRIT!)" if critical else ""
-            msg = "%s used %s (-%d HP)%s" % (enemy["name"], atk_name, dmg, extra)
+            msg = lazyf("%s used %s (-%d HP)%s", enemy["name"], ATK_NAME[a], dmg, extra)
         else:
-            msg = "%s used %s (status)" % (enemy["name"], atk_name)
+            msg = lazyf("%s used %s (status)", enemy["name"], ATK_NAME[a])
     return dmg, effects, msg
 
 def use_item(kind):
@@ -444,10 +1800,10 @@ def use_item(kind):
         if inventory["potion"] > 0:
             inventory["potion"] -= 1
             potions_used += 1
-            heal = 25
+            heal = ITEM_HEAL["potion"]
             before = current_hp
             current_hp = min(char_max_hp, current_hp + heal)
-            log("Used Potion (+%d). HP: %d/%d" % (current_hp - before, current_hp, char_max_hp))
+            logf("Used Potion (+%d). HP: %d/%d", current_hp - before, current_hp, char_max_hp)
             return True
         log("You have no Potions left.")
         return False
@@ -455,10 +1811,10 @@ def use_item(kind):
         if inventory["superpotion"] > 0:
             inventory["superpotion"] -= 1
             superpotions_used += 1
-            heal = 50
+            heal = ITEM_HEAL["superpotion"]
             before = current_hp
             current_hp = min(char_max_hp, current_hp + heal)
-            log("Used Super Potion (+%d). HP: %d/%d" % (current_hp - before, current_hp, char_max_hp))
+            logf("Used Super Potion (+%d). HP: %d/%d", current_hp - before, current_hp, char_max_hp)
             return True
         log("You have no Super Potions left.")
         return False
@@ -482,21 +1838,22 @@ def get_player_choice(enemy_name):
     global flame_pp, player_poisoned
     if DEMO_MODE:
         # very light-weight demo logic
-        if player_poisoned and inventory.get("antidote", 0) > 0 and random.random() < 0.75:
+        rng = RNG.demo
+        if player_poisoned and inventory.get("antidote", 0) > 0 and rng.random() < 0.75:
             return 'D'
         if current_hp <= int(0.35 * char_max_hp):
-            if inventory.get("superpotion", 0) > 0 and random.random() < 0.7:
+            if inventory.get("superpotion", 0) > 0 and rng.random() < 0.7:
                 return 'U'
-            if inventory.get("potion", 0) > 0 and random.random() < 0.8:
+            if inventory.get("potion", 0) > 0 and rng.random() < 0.8:
                 return 'P'
-        if flame_pp > 0 and random.random() < 0.66:
+        if flame_pp > 0 and rng.random() < 0.66:
             return 'L'
-        return 'A' if random.random() < 0.85 else 'N'
+        return 'A' if rng.random() < 0.85 else 'N'
 
     while True:
         log("\nAction:")
-        log("  [A] Ember (-10)   [L] Flamethrower (-12, PP left: %d)" % flame_pp)
-        log("  [N] Nothing       [P] Potion (+25)  [U] Super Potion (+50)  [D] Antidote  [R] Run (50%%)")
+        logf("  [A] Ember (-10)   [L] Flamethrower (-12, PP left: %d)", flame_pp)
+        logf("  [N] Nothing       [P] Potion (+25)  [U] Super Potion (+50)  [D] Antidote  [R] Run (50%%)")
         choice = safe_input("> ")
         if not choice:
             # Empty input: default to 'A' to keep the game moving
@@ -504,6 +1861,9 @@ def get_player_choice(enemy_name):
         choice = choice.strip().upper()[:1]
         if choice in {'A', 'L', 'N', 'P', 'U', 'D', 'R'}:
             return choice
+        if scripted_input():
+            # An exhausted replay yields "q" forever; never spin on it
+            return 'A'
 
 def add_xp(n):
     """Award XP; handle level-ups with small bonuses."""
@@ -520,7 +1880,9 @@ def add_xp(n):
         current_hp = min(char_max_hp, current_hp + 10)
         if level % 2 == 0:
             flame_pp += 1
-        log(c("LEVEL UP! → Lv.%d  Max HP %d→%d, Flamethrower PP:%d" % (level, old_max, char_max_hp, flame_pp), "status"))
+        logc("status", "LEVEL UP! → Lv.%d  Max HP %d→%d, Flamethrower PP:%d", level, old_max, char_max_hp, flame_pp)
+        if TELEMETRY:
+            TELEMETRY.emit("level_up", level, char_max_hp, flame_pp)
         leveled = True
     return leveled
 
@@ -534,7 +1896,7 @@ def player_turn(enemy):
         dmg = 5
         current_hp = max(0, current_hp - dmg)
         total_damage_taken += dmg
-        log(c("Poison hurts you! (-5)", "status"))
+        logc("status", "Poison hurts you! (-5)")
 
     choice = get_player_choice(enemy["name"])
     dmg = 0
@@ -561,8 +1923,8 @@ def player_turn(enemy):
             hit_streak += 1
             best_streak = max(best_streak, hit_streak)
             if combo_bonus > 0:
-                log(c("COMBO +%d!" % combo_bonus, "status"))
-            log("Charmander used Ember! " + ("(-%d enemy HP)" % dmg))
+                logc("status", "COMBO +%d!", combo_bonus)
+            logf("Charmander used Ember! (-%d enemy HP)", dmg)
         else:
             hit_streak = 0
             log("Charmander used Ember! (missed)")
@@ -576,8 +1938,8 @@ def player_turn(enemy):
                 hit_streak += 1
                 best_streak = max(best_streak, hit_streak)
                 if combo_bonus > 0:
-                    log(c("COMBO +%d!" % combo_bonus, "status"))
-                log("Charmander used Flamethrower! " + ("(-%d enemy HP)" % dmg))
+                    logc("status", "COMBO +%d!", combo_bonus)
+                logf("Charmander used Flamethrower! (-%d enemy HP)", dmg)
             else:
                 hit_streak = 0
                 log("Charmander used Flamethrower! (missed)")
@@ -604,8 +1966,8 @@ def player_turn(enemy):
         hit_streak = 0
     elif choice == 'R':
         # 50% chance to run away
-        if random.random() < 0.5:
-            log(c("You successfully ran away!", "status"))
+        if RNG.battle.random() < 0.5:
+            logc("status", "You successfully ran away!")
             escaped = True
         else:
             log("You failed to escape!")
@@ -616,7 +1978,9 @@ def player_turn(enemy):
 
 def draw_map():
     """Draw HUD + map."""
-    enemies_left = sum(1 for o in map_objects if o["type"] == "enemy")
+    if not LOGGER.has_screen:
+        return
+    enemies_left = ENEMY_SCHEDULER.enemy_count()
     hud1 = (c("HP ", "hud") + draw_bar(current_hp, char_max_hp) +
             "  " + c("Pot:%d Sup:%d Ant:%d" % (inventory['potion'], inventory['superpotion'], inventory['antidote']), "hud") +
             "  " + c("Enemies:%d" % enemies_left, "hud") +
@@ -628,52 +1992,79 @@ def draw_map():
            % (level, xp, xp_to_next, score, steps_taken, hit_streak, best_streak,
               weather["state"],
               ("[%d]" % weather["turns"]) if weather["state"] != "Clear" else ""), "hud"))
+    ox, oy, w, h = CAMERA.frame()
+    whole = WORLD is None and w == MAP_WIDTH and h == MAP_HEIGHT
+    if not whole:
+        hud2 += "  " + c("Pos:%d,%d" % (my_position[POS_X], my_position[POS_Y]), "hud")
 
     log(hud1 + "  " + c("(@=you, E=enemies, $=coins, ?=mystery, *=items)", "hud"))
     log(hud2)
 
-    occ = occupancy_index()
-
-    print("+" + "-" * (MAP_WIDTH * 3) + "+")
-    for y in range(MAP_HEIGHT):
-        out("|")
-        for x in range(MAP_WIDTH):
+    if whole:
+        occ = occupancy_index()
+        rows = obstacle_definition
+    else:
+        # only the objects and cells inside the camera window
+        occ = ENEMY_SCHEDULER.window(ox, oy, w, h)
+        if WORLD is not None:
+            rows = WORLD.rows(ox, oy, w, h)
+        else:
+            rows = [r[ox:ox + w] for r in obstacle_definition[oy:oy + h]]
+    vis = FOG.visible(my_position) if FOG is not None else None
+    seen = FOG.seen if FOG is not None else None
+
+    atlas = glyph_atlas()
+    player, wall, blank = atlas["player"], atlas["wall"], atlas["blank"]
+    fog_wall, fog_floor = atlas["fog_wall"], atlas["fog_floor"]
+    out("+" + "-" * (w * 3) + "+\n")
+    for j in range(h):
+        cells = ["|"]  # one out() per row
+        cell = cells.append
+        cur = RESET  # rows start and end uncolored
+        row = rows[j]
+        y = oy + j
+        for i in range(w):
+            x = ox + i
             pos = (x, y)
             if my_position[POS_X] == x and my_position[POS_Y] == y:
-                out(c(" @ ", "player"))
-            elif obstacle_definition[y][x] == "#":
-                out(c("###", "wall"))
+                g = player
+            elif vis is not None and pos not in vis:
+                # fog: remembered terrain is dimmed, objects stay hidden
+                if pos not in seen:
+                    g = blank
+                elif row[i] == "#":
+                    g = fog_wall
+                else:
+                    g = fog_floor
+            elif row[i] == "#":
+                g = wall
             else:
                 obj = occ.get(pos)
-                if obj:
-                    t = obj.get("type")
-                    if t == "enemy":
-                        out(c(" E ", "enemy"))
-                    elif t in ("potion", "superpotion", "antidote"):
-                        out(c(" * ", "potion"))
-                    elif t == "coin":
-                        out(c(" $ ", "coin"))
-                    elif t == "mystery":
-                        out(c(" ? ", "mystery"))
-                    else:
-                        out(" * ")
-                else:
-                    out("   ")
-        out("|\n")
-    print("+" + "-" * (MAP_WIDTH * 3) + "+")
-    print("Move: w/a/s/d | Help: h | Quit: q")
+                g = atlas[_OBJECT_GLYPHS.get(obj.get("type"), "other")] if obj else blank
+            sgr = g[0]
+            if sgr is not None and sgr != cur:
+                cell(sgr)
+                cur = sgr
+            cell(g[1])
+        if cur != RESET:
+            cell(RESET)
+        cell("|\n")
+        out("".join(cells))
+    out("+" + "-" * (w * 3) + "+\n")
+    out("Move: w/a/s/d | Help: h | Quit: q\n")
+    flush_log()  # one terminal write per frame
 
 def print_help():
     log("\n" + c("Help:", "hud"))
     log("  - Move with WASD. @ is you. E are enemies. $ are coins. ? are mystery tiles. * are items.")
     log("  - Items: Potion (+25), Super Potion (+50), Antidote (cures poison).")
     log("  - Defeat all enemies… then face the Boss!")
+    log("  - With --undo, press U on the map to take back your last step.")
     log("  - Weather cycles: Sunny (+fire dmg), Rain (-fire dmg), Fog (more misses), Clear (neutral).")
     log("  - In battle:")
     log("      [A] Ember  [L] Flamethrower (limited PP)  [R] Run (50%)")
     log("      [P] Potion  [U] Super Potion  [D] Antidote  [N] Nothing")
-    if is_interactive_stdin():
-        safe_input("\nPress ENTER to continue…")
+    pause("\nPress ENTER to continue…")
     safe_clear()
 
 # ---------------- Enemy movement ----------------
@@ -683,6 +2074,10 @@ def neighbors4(x, y):
         yield x+dx, y+dy
 
 def can_walk(x, y):
+    if WORLD is not None:
+        # only resident chunks: enemies never wander into unloaded terrain
+        ch = WORLD.peek(x, y)
+        return ch is not None and ch != "#" and [x, y] != my_position
     if x < 0 or y < 0 or x >= MAP_WIDTH or y >= MAP_HEIGHT:
         return False
     if obstacle_definition[y][x] == "#":
@@ -691,64 +2086,577 @@ def can_walk(x, y):
         return False
     return True
 
-def move_enemies():
-    """Each enemy tries to step randomly to a neighboring free cell (no collisions)."""
-    occ = set(tuple(o["pos"]) for o in map_objects if o["type"] == "enemy")
-    taken = set(tuple(o["pos"]) for o in map_objects)  # avoid stacking with items for clarity
-    new_positions = {}
-    for idx, obj in enumerate(map_objects):
-        if obj["type"] != "enemy":
-            continue
+def move_enemies(eids=None):
+    """
+    Each enemy tries to step randomly to a neighboring free cell (no collisions).
+    With `eids`, only enemies of those species move (speed classes).
+    """
+    global OBJECTS_HASH
+    sched = ENEMY_SCHEDULER
+    if not sched.covers_map():
+        sched.step(eids)
+        return
+    rng = RNG.ai
+    if eids is None:
+        movers = [o for o in map_objects if o["type"] == "enemy"]
+    else:
+        # only this speed class: its enemies come from the per-species index
+        if sched.indexed != len(map_objects):
+            sched._rebuild()
+        by_eid = sched.by_eid
+        movers = [o for eid in sorted(eids) for o in by_eid.get(eid, ())]
+    taken = sched.occupancy()  # avoid stacking with items for clarity
+    new_positions = []
+    for obj in movers:
         x, y = obj["pos"]
         candidates = []
         for nx, ny in neighbors4(x, y):
             if can_walk(nx, ny) and (nx, ny) not in taken:
                 candidates.append((nx, ny))
-        if candidates and random.random() < 0.75:  # 75% chance to roam
-            chosen = random.choice(candidates)
-            new_positions[idx] = [chosen[0], chosen[1]]
+        if candidates and rng.random() < 0.75:  # 75% chance to roam
+            chosen = rng.choice(candidates)
+            new_positions.append((obj, [chosen[0], chosen[1]]))
             taken.add(chosen)
-        else:
-            new_positions[idx] = [x, y]
-            taken.add((x, y))
-    # commit
-    for idx, newp in new_positions.items():
-        map_objects[idx]["pos"] = newp
+    # commit (keeping the bucket grid and the tick's occupancy current)
+    trail = TIMELINE.log if TIMELINE is not None else None
+    relocate = sched.relocate
+    h = 0
+    for o, newp in new_positions:
+        x, y = o["pos"]
+        if trail is not None:
+            trail.append(("pos", o, o["pos"]))
+        h ^= object_key(o)
+        relocate(o, x, y, newp[0], newp[1])
+        taken.discard((x, y))
+        o["pos"] = newp
+        h ^= object_key(o)
+    OBJECTS_HASH ^= h
+
+ACTIVE_RADIUS = 16  # enemies farther than this (Chebyshev) from you sleep
+ACTIVE_BUCKET = 8   # side of a spatial-grid bucket, in cells
+
+class EnemyScheduler(object):
+    """
+    Active-region roaming for big maps: map objects live in a bucket grid and
+    each turn only the buckets around the player are visited, so the cost is
+    proportional to nearby objects. Far enemies sleep where they are. Maps
+    that fit inside the active square keep the plain every-enemy update.
+    """
+
+    def __init__(self, radius=ACTIVE_RADIUS, bucket=ACTIVE_BUCKET):
+        self.radius = radius
+        self.bucket = bucket
+        self.buckets = {}
+        self.indexed = -1
+        self.enemies = 0
+        self.by_eid = {}  # enemy table id -> that species' enemies, in map order
+        self.active = 0  # enemies updated on the last step
+        self.tick = False
+        self.taken = None  # object positions shared by the actors of one tick
+
+    def mark_dirty(self):
+        """map_objects changed outside move_enemies(): rebuild before next step."""
+        self.indexed = -1
+        self.taken = None
+
+    def begin_tick(self):
+        self.tick, self.taken = True, None
+
+    def end_tick(self):
+        self.tick, self.taken = False, None
+
+    def occupancy(self):
+        """Set of object positions: built once per tick, per call outside one."""
+        taken = self.taken
+        if taken is None:
+            taken = set(tuple(o["pos"]) for o in map_objects)
+            if self.tick:
+                self.taken = taken
+        return taken
+
+    def covers_map(self):
+        r = self.radius
+        return r <= 0 or (WORLD is None and MAP_WIDTH <= 2 * r + 1 and MAP_HEIGHT <= 2 * r + 1)
+
+    def _rebuild(self):
+        b = self.bucket
+        buckets = {}
+        by_eid = {}
+        for o in map_objects:
+            buckets.setdefault((o["pos"][0] // b, o["pos"][1] // b), []).append(o)
+            if o["type"] == "enemy":
+                by_eid.setdefault(o.get("eid", ENEMY_ID.get(o["name"])), []).append(o)
+        self.buckets = buckets
+        self.by_eid = by_eid
+        self.enemies = sum(len(v) for v in by_eid.values())
+        self.indexed = len(map_objects)
+
+    def enemy_count(self):
+        """Enemies on the map (recounted only after objects were added or removed)."""
+        if self.indexed != len(map_objects):
+            self._rebuild()
+        return self.enemies
+
+    def window(self, x0, y0, w, h):
+        """occupancy_index() restricted to a w*h window: visits only its buckets."""
+        if self.indexed != len(map_objects):
+            self._rebuild()
+        b = self.bucket
+        buckets = self.buckets
+        occ = {}
+        for by in range(y0 // b, (y0 + h - 1) // b + 1):
+            for bx in range(x0 // b, (x0 + w - 1) // b + 1):
+                for o in buckets.get((bx, by), ()):
+                    x, y = o["pos"]
+                    if x0 <= x < x0 + w and y0 <= y < y0 + h:
+                        occ[(x, y)] = o
+        return occ
+
+    def occupied(self, x, y):
+        """True when some map object sits on (x, y); scans a single bucket."""
+        if self.indexed != len(map_objects):
+            self._rebuild()
+        for o in self.buckets.get((x // self.bucket, y // self.bucket), ()):
+            if o["pos"][0] == x and o["pos"][1] == y:
+                return True
+        return False
+
+    def relocate(self, o, x, y, nx, ny):
+        """Keep the grid in step with an object that moved from (x, y) to (nx, ny)."""
+        b = self.bucket
+        old, new = (x // b, y // b), (nx // b, ny // b)
+        if old != new and self.indexed >= 0:
+            self.buckets[old].remove(o)
+            self.buckets.setdefault(new, []).append(o)
+
+    def step(self, eids=None):
+        global OBJECTS_HASH
+        if self.indexed != len(map_objects):
+            self._rebuild()
+        b, r = self.bucket, self.radius
+        px, py = my_position[POS_X], my_position[POS_Y]
+        buckets = self.buckets
+        taken = set()
+        trail = TIMELINE.log if TIMELINE is not None else None
+        rng = RNG.ai
+        h = 0
+        active = []
+        # one extra cell of margin so sleepers next to the region still block
+        for by in range((py - r - 1) // b, (py + r + 1) // b + 1):
+            for bx in range((px - r - 1) // b, (px + r + 1) // b + 1):
+                for o in buckets.get((bx, by), ()):
+                    x, y = o["pos"]
+                    taken.add((x, y))
+                    if o["type"] == "enemy" and abs(x - px) <= r and abs(y - py) <= r and (
+                            eids is None or o.get("eid", ENEMY_ID.get(o["name"])) in eids):
+                        active.append(o)
+        for o in active:
+            x, y = o["pos"]
+            candidates = []
+            for nx, ny in neighbors4(x, y):
+                if can_walk(nx, ny) and (nx, ny) not in taken:
+                    candidates.append((nx, ny))
+            if candidates and rng.random() < 0.75:  # 75% chance to roam
+                nx, ny = rng.choice(candidates)
+                if trail is not None:
+                    trail.append(("pos", o, o["pos"]))
+                h ^= object_key(o)
+                o["pos"] = [nx, ny]
+                h ^= object_key(o)
+                taken.add((nx, ny))
+                self.relocate(o, x, y, nx, ny)
+        OBJECTS_HASH ^= h
+        self.active = len(active)
+
+ENEMY_SCHEDULER = EnemyScheduler()
+
+# ---------------- Turn scheduler ----------------
+TURN_TICKS = 12           # clock ticks per player step; speed 1.0 acts once per step
+
+class TurnScheduler(object):
+    """
+    Discrete-event turn order: a heap of (time, seq, actor). Each player step
+    advances the clock by TURN_TICKS and runs only the actors that are due;
+    an actor returns the delay until its next action, or None to drop out
+    (idle actors are simply not in the heap). Equal times run in scheduling
+    order, so speed-1 actors keep the classic player -> enemies -> weather order.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.now = 0
+        self.seq = 0
+        self.acted = 0  # actor runs during the last advance()
+
+    def schedule(self, delay, actor):
+        heapq.heappush(self.heap, (self.now + delay, self.seq, actor))
+        self.seq += 1
+
+    def advance(self, ticks=TURN_TICKS):
+        end = self.now + ticks
+        heap = self.heap
+        acted = 0
+        while heap and heap[0][0] <= end:
+            when, _seq, actor = heapq.heappop(heap)
+            self.now = when
+            delay = actor()
+            acted += 1
+            if delay:
+                self.schedule(delay, actor)
+        self.now = end
+        self.acted = acted
+
+def _enemy_actor(eids, interval):
+    """Actor moving every enemy of one speed class; None filter when it is the only class."""
+    def act():
+        t0 = _clock() if PROFILING else 0
+        move_enemies(eids)
+        if PROFILING:
+            PROFILER.add("enemies", t0)
+        return interval
+    return act
+
+def _weather_actor():
+    t0 = _clock() if PROFILING else 0
+    rng = RNG.weather
+    if steps_taken % 6 == 0 and rng.random() < 0.25:
+        # 25% chance to (re-)set a non-clear weather
+        set_weather(rng.choice(["Sunny", "Rain", "Fog"]), rng.randint(8, 14))
+    tick_weather()
+    if PROFILING:
+        PROFILER.add("weather", t0)
+    return TURN_TICKS
+
+def _poison_bite():
+    global current_hp, total_damage_taken
+    if current_hp > 1:
+        current_hp -= 1
+        total_damage_taken += 1
+        logc("status", "The poison stings… (-1)")
+
+def new_turn_scheduler():
+    """
+    Scheduler with one actor per enemy speed class plus weather; with
+    poison_walk_steps content, poison joins while the player is poisoned.
+    """
+    turns = TurnScheduler()
+    classes = {}
+    for eid, speed in enumerate(ENEMY_SPEED):
+        classes.setdefault(speed, set()).add(eid)
+    for speed in sorted(classes, reverse=True):
+        interval = max(1, int(round(TURN_TICKS / speed)))
+        turns.schedule(interval, _enemy_actor(classes[speed] if len(classes) > 1 else None, interval))
+    turns.schedule(TURN_TICKS, _weather_actor)
+    turns.poison_due = False
+    turns.poison_ticks = POISON_WALK_STEPS * TURN_TICKS
+
+    def poison():
+        if not player_poisoned:
+            turns.poison_due = False
+            return None  # cured: leave the heap until poisoned again
+        _poison_bite()
+        return turns.poison_ticks
+    turns.poison = poison
+    return turns
+
+def end_of_step(turns):
+    """Run every actor due before the player's next step."""
+    if player_poisoned and turns.poison_ticks and not turns.poison_due:
+        turns.poison_due = True
+        turns.schedule(turns.poison_ticks, turns.poison)
+    ENEMY_SCHEDULER.begin_tick()
+    try:
+        turns.advance()
+    finally:
+        ENEMY_SCHEDULER.end_tick()
+
+# ---------------- State hashing ----------------
+ZOBRIST_MASK = (1 << 64) - 1
+ZOBRIST_CACHE = 1 << 18  # cached keys before the cache starts over (open world never repeats)
+_ZKEYS = {}       # feature tuple -> 64-bit key (derived from the feature, never from the game RNG)
+OBJECTS_HASH = 0  # XOR of object_key() over map_objects, kept up to date by every mutation
+
+def _splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & ZOBRIST_MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & ZOBRIST_MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & ZOBRIST_MASK
+    return x ^ (x >> 31)
+
+def zobrist_key(*feature):
+    """
+    Random-looking 64-bit key for a state feature, e.g. ("enemy", "Zubat", x, y, hp).
+    Keys are a pure function of the feature, so hashes match across processes
+    and runs; they are cached, so each lookup after the first is one dict hit.
+    """
+    key = _ZKEYS.get(feature)
+    if key is None:
+        import zlib
+        if len(_ZKEYS) >= ZOBRIST_CACHE:
+            _ZKEYS.clear()
+        key = 0
+        for v in feature:
+            if not isinstance(v, int):
+                v = zlib.crc32(str(v).encode("utf-8")) & 0xffffffff
+            key = _splitmix64(key ^ (v & ZOBRIST_MASK))
+        _ZKEYS[feature] = key
+    return key
+
+def object_key(o):
+    p = o["pos"]
+    return zobrist_key(o["type"], o.get("name"), p[0], p[1], o.get("hp", 0))
+
+def toggle_object_hash(o):
+    """XOR an object in or out of OBJECTS_HASH (the same call adds and removes)."""
+    global OBJECTS_HASH
+    OBJECTS_HASH ^= object_key(o)
+
+def rehash_objects():
+    """Recompute OBJECTS_HASH from scratch (after the whole object list is swapped)."""
+    global OBJECTS_HASH
+    h = 0
+    for o in map_objects:
+        h ^= object_key(o)
+    OBJECTS_HASH = h
+
+def state_hash():
+    """
+    64-bit Zobrist hash of the game state: every object's type/position/HP
+    (maintained incrementally in OBJECTS_HASH) plus the player's position,
+    HP, PP, poison, inventory and weather (a constant handful of keys).
+    Equal states hash equal whatever path led to them.
+    """
+    h = OBJECTS_HASH ^ zobrist_key("@", my_position[POS_X], my_position[POS_Y])
+    h ^= zobrist_key("hp", current_hp, char_max_hp) ^ zobrist_key("pp", flame_pp, player_poisoned)
+    for item, count in inventory.items():
+        h ^= zobrist_key("inv", item, count)
+    return h ^ zobrist_key("weather", weather["state"], weather["turns"])
+
+# ---------------- Snapshots (undo / search) ----------------
+UNDO_DEPTH = 200  # turns of history kept by --undo
+
+# Player/meta globals a checkpoint restores (constant size, whatever the map holds)
+SNAPSHOT_GLOBALS = ("char_max_hp", "current_hp", "flame_pp", "player_poisoned", "level", "xp",
+                    "xp_to_next", "score", "steps_taken", "enemies_defeated", "potions_used",
+                    "superpotions_used", "antidotes_used", "total_damage_dealt",
+                    "total_damage_taken", "hit_streak", "best_streak")
+
+TIMELINE = None  # active Timeline, or None (mutation sites then skip journaling)
+
+class Checkpoint(object):
+    """A forked game state: the scalars plus a position in the Timeline's journal."""
+    __slots__ = ("mark", "scalars", "pos", "inventory", "weather", "rng", "turns", "extra")
+
+class Timeline(object):
+    """
+    Copy-on-write game state. fork() costs the same for 10 or 100k objects: it
+    copies the player scalars and remembers the journal length. Every change to
+    map_objects after that appends its old value to the journal (a moved
+    enemy's previous pos, a removed object and its index, ...), so rewinding
+    undoes only what was touched. checkpoint()/rewind(n) keep a per-turn
+    history for in-game undo; fork()/rewind_to() serve lookahead search.
+    """
+
+    def __init__(self, depth=UNDO_DEPTH):
+        self.depth = depth
+        # ("pos", obj, old) / ("add", obj) / ("del", idx, obj) / ("all", old_list, new_list)
+        self.log = []
+        self.base = 0      # journal index of log[0] (older entries are trimmed)
+        self.history = []  # checkpoints, oldest first
+
+    def fork(self, turns=None, **extra):
+        cp = Checkpoint()
+        cp.mark = self.base + len(self.log)
+        g = globals()
+        cp.scalars = tuple(g[name] for name in SNAPSHOT_GLOBALS)
+        cp.pos = my_position[:]
+        cp.inventory = dict(inventory)
+        cp.weather = dict(weather)
+        cp.rng = RNG.getstate()
+        cp.turns = None if turns is None else (turns, list(turns.heap), turns.now, turns.seq,
+                                               turns.poison_due)
+        cp.extra = extra
+        return cp
+
+    def checkpoint(self, turns=None, **extra):
+        """fork() and push it on the undo history (dropping the oldest past `depth`)."""
+        self.history.append(self.fork(turns, **extra))
+        if len(self.history) > self.depth:
+            del self.history[0]
+            keep = self.history[0].mark - self.base
+            del self.log[:keep]
+            self.base += keep
+
+    def rewind_to(self, cp):
+        """Restore the state captured by `cp` (a fork from this timeline)."""
+        if cp.mark < self.base:
+            raise ValueError("checkpoint is older than the kept history")
+        log_ = self.log
+        stop = cp.mark - self.base
+        relocate = ENEMY_SCHEDULER.relocate
+        while len(log_) > stop:
+            entry = log_.pop()
+            kind = entry[0]
+            if kind == "pos":
+                o, old = entry[1], entry[2]
+                if relocate is not None:
+                    relocate(o, o["pos"][0], o["pos"][1], old[0], old[1])
+                toggle_object_hash(o)
+                o["pos"] = old
+                toggle_object_hash(o)
+                continue
+            if relocate is not None:
+                # older moves may belong to objects the grid no longer holds
+                ENEMY_SCHEDULER.mark_dirty()
+                relocate = None
+            if kind == "add":
+                toggle_object_hash(map_objects.pop())
+            elif kind == "del":
+                map_objects.insert(entry[1], entry[2])
+                toggle_object_hash(entry[2])
+            else:
+                map_objects[:] = entry[1]
+                rehash_objects()
+        globals().update(zip(SNAPSHOT_GLOBALS, cp.scalars))
+        my_position[:] = cp.pos
+        inventory.clear()
+        inventory.update(cp.inventory)
+        weather.clear()
+        weather.update(cp.weather)
+        RNG.setstate(cp.rng)
+        if cp.turns is not None:
+            turns, heap, turns.now, turns.seq, turns.poison_due = cp.turns
+            turns.heap = list(heap)  # the same fork may be rewound to again
+
+    def rewind(self, n=1):
+        """Undo the last n checkpointed turns; return that checkpoint (None if too few)."""
+        if n < 1 or n > len(self.history):
+            return None
+        cp = self.history[-n]
+        del self.history[-n:]
+        self.rewind_to(cp)
+        return cp
+
+    def diff(self, a, b=None):
+        """
+        What changed from checkpoint a to b (default: now): player fields that
+        differ, plus objects moved/added/removed, from the journal between them.
+        """
+        b = b or self.fork()
+        out = {}
+        for name, old, new in zip(SNAPSHOT_GLOBALS, a.scalars, b.scalars):
+            if old != new:
+                out[name] = (old, new)
+        for name, old, new in (("pos", a.pos, b.pos), ("inventory", a.inventory, b.inventory),
+                               ("weather", a.weather, b.weather)):
+            if old != new:
+                out[name] = (old, new)
+        from collections import OrderedDict
+        moved, added, removed = OrderedDict(), OrderedDict(), OrderedDict()
+
+        def gone(o):
+            if id(o) in added:
+                del added[id(o)]
+            else:
+                removed[id(o)] = o
+        for entry in self.log[a.mark - self.base:b.mark - self.base]:
+            kind = entry[0]
+            if kind == "pos":
+                if id(entry[1]) not in moved:
+                    moved[id(entry[1])] = (entry[1], entry[2])
+            elif kind == "add":
+                added[id(entry[1])] = entry[1]
+            elif kind == "del":
+                gone(entry[2])
+            else:
+                kept = set(id(o) for o in entry[2])
+                for o in entry[1]:
+                    if id(o) not in kept:
+                        gone(o)
+                old_ids = set(id(o) for o in entry[1])
+                for o in entry[2]:
+                    if id(o) not in old_ids:
+                        added[id(o)] = o
+        out["moved"] = [(o.get("name", o["type"]), old, o["pos"]) for o, old in moved.values()
+                        if id(o) not in removed and id(o) not in added and old != o["pos"]]
+        out["added"] = [(o.get("name", o["type"]), o["pos"]) for o in added.values()]
+        out["removed"] = [(o.get("name", o["type"]), o["pos"]) for o in removed.values()]
+        return out
+
+def add_object(obj):
+    """Put a new object on the map (journaled when a Timeline is active)."""
+    if TIMELINE is not None:
+        TIMELINE.log.append(("add", obj))
+    map_objects.append(obj)
+    toggle_object_hash(obj)
+    ENEMY_SCHEDULER.mark_dirty()
+
+def move_object(obj, pos):
+    """Set an object's position (journaled when a Timeline is active)."""
+    if TIMELINE is not None:
+        TIMELINE.log.append(("pos", obj, obj["pos"]))
+    ENEMY_SCHEDULER.relocate(obj, obj["pos"][0], obj["pos"][1], pos[0], pos[1])
+    toggle_object_hash(obj)
+    obj["pos"] = pos
+    toggle_object_hash(obj)
+
+def replace_objects(objs):
+    """Swap the whole object list in place (journaled when a Timeline is active)."""
+    if TIMELINE is not None:
+        TIMELINE.log.append(("all", map_objects[:], objs))
+    map_objects[:] = objs
+    rehash_objects()
+    ENEMY_SCHEDULER.mark_dirty()
 
 # ---------------- Mystery resolution ----------------
 
 def resolve_mystery():
     """Trigger a random effect for the player."""
     global current_hp, flame_pp, score, player_poisoned
-    roll = random.random()
+    rng = RNG.mystery
+    roll = rng.random()
     if roll < 0.20:
         heal = 20
         before = current_hp
         current_hp = min(char_max_hp, current_hp + heal)
-        log(c("Mystery healed you +%d!" % (current_hp - before), "status"))
+        logc("status", "Mystery healed you +%d!", current_hp - before)
+        if TELEMETRY:
+            TELEMETRY.emit("mystery", "heal", current_hp - before)
     elif roll < 0.40:
         if not player_poisoned:
             player_poisoned = True
-            log(c("Mystery… uh oh, you got poisoned!", "status"))
+            logc("status", "Mystery… uh oh, you got poisoned!")
+            if TELEMETRY:
+                TELEMETRY.emit("mystery", "poison", 0)
         else:
             score += 3
             log("Mystery fizzles. Consolation +3 score.")
+            if TELEMETRY:
+                TELEMETRY.emit("mystery", "fizzle", 3)
     elif roll < 0.60:
         flame_pp += 1
-        log(c("Mystery granted +1 Flamethrower PP!", "status"))
+        logc("status", "Mystery granted +1 Flamethrower PP!")
+        if TELEMETRY:
+            TELEMETRY.emit("mystery", "pp", 1)
     elif roll < 0.80:
-        bonus = random.randint(5, 15)
+        bonus = rng.randint(5, 15)
         score += bonus
-        log(c("Mystery rain of coins! +%d score" % bonus, "status"))
+        logc("status", "Mystery rain of coins! +%d score", bonus)
+        if TELEMETRY:
+            TELEMETRY.emit("mystery", "coins", bonus)
     else:
         # Surprise enemy spawn nearby if possible
         try:
-            pos = random_free_cell()
-            name = random.choice(["Zubat", "Koffing", "Machop"])
-            map_objects.append({"type": "enemy", "name": name, "hp": ENEMIES[name]["hp"], "pos": pos})
-            log(c("Mystery spawned a wild %s!" % name, "status"))
+            pos = random_free_cell(rng)
+            enemy = new_enemy(MYSTERY_IDS[rng.randrange(len(MYSTERY_IDS))], pos)
+            name = enemy["name"]
+            add_object(enemy)
+            logc("status", "Mystery spawned a wild %s!", name)
+            if TELEMETRY:
+                TELEMETRY.emit("mystery", "spawn", name)
         except Exception:
             log("Mystery tried to spawn an enemy, but there is no space.")
+            if TELEMETRY:
+                TELEMETRY.emit("mystery", "spawn_failed", None)
 
 # ---------------- Battle loop ----------------
 
@@ -757,65 +2665,131 @@ def do_battle(enemy):
     global current_hp, player_poisoned, total_damage_taken, enemies_defeated, score
     safe_clear()
     # --- Title line printed before each battle contextually ---
-    log(c("The battle begins!", "hud"), "(Charmander vs %s)" % enemy['name'])
+    log(Lazy(c, "The battle begins!", "hud"), lazyf("(Charmander vs %s)", enemy['name']))
     enemy_hp = int(enemy["hp"])
     base_hp = enemy_hp
-
-    while enemy_hp > 0 and current_hp > 0:
-        # Enemy turn
-        log("\nEnemy turn:")
-        dmg, effects, msg = enemy_turn(enemy)
-        log(msg)
-        current_hp = max(0, current_hp - dmg)
-        total_damage_taken += dmg
-        if effects.get("poison") and not player_poisoned:
-            player_poisoned = True
-            log(c("You are poisoned!", "status"))
-
-        log("Charmander:", draw_bar(current_hp, char_max_hp))
-        log("%s:" % enemy['name'], draw_bar(enemy_hp, base_hp))
-        if is_interactive_stdin():
-            safe_input("\nPress ENTER to continue…")
-        safe_clear()
-        if current_hp <= 0:
-            break
-
-        # Player turn
-        log("Your turn!")
-        dmg, escaped = player_turn(enemy)
-        if escaped:
-            log(c("You fled the battle!", "status"))
-            return 'escape'
-        enemy_hp = max(0, enemy_hp - dmg)
-        log("Charmander:", draw_bar(current_hp, char_max_hp))
-        log("%s:" % enemy['name'], draw_bar(enemy_hp, base_hp))
-        if is_interactive_stdin():
-            safe_input("\nPress ENTER to continue…")
-        safe_clear()
+    if TELEMETRY:
+        TELEMETRY.emit("battle_start", enemy["name"], enemy_hp, current_hp)
+
+    # Turbo: one screen per battle. Scripted runs also hide the round details
+    # (shown at --log-level debug); a human still needs the menu to choose.
+    quick = TURBO
+    saved_level = None
+    if quick and scripted_input() and LOGGER.level > DEBUG:
+        saved_level = LOGGER.level
+        LOGGER.level = WARN
+    dealt_before = total_damage_dealt
+    taken_before = total_damage_taken
+    rounds = 0
+    result = None
+    try:
+        while enemy_hp > 0 and current_hp > 0:
+            rounds += 1
+            t_round = _clock() if PROFILING else 0
+            # Enemy turn
+            log("\nEnemy turn:")
+            dmg, effects, msg = enemy_turn(enemy)
+            log(msg)
+            current_hp = max(0, current_hp - dmg)
+            total_damage_taken += dmg
+            if effects.get("poison") and not player_poisoned:
+                player_poisoned = True
+                logc("status", "You are poisoned!")
+
+            log("Charmander:", Lazy(draw_bar, current_hp, char_max_hp))
+            log(lazyf("%s:", enemy['name']), Lazy(draw_bar, enemy_hp, base_hp))
+            pause("\nPress ENTER to continue…")
+            if not quick:
+                safe_clear()
+            if current_hp <= 0:
+                if TELEMETRY:
+                    TELEMETRY.emit("battle_turn", enemy["name"], rounds, dmg, 0, current_hp, enemy_hp)
+                if PROFILING:
+                    PROFILER.add("battle_round", t_round)
+                break
+            taken = dmg
+
+            # Player turn
+            log("Your turn!")
+            dmg, escaped = player_turn(enemy)
+            if escaped:
+                logc("status", "You fled the battle!")
+                result = 'escape'
+                if TELEMETRY:
+                    TELEMETRY.emit("battle_turn", enemy["name"], rounds, taken, 0, current_hp, enemy_hp)
+                if PROFILING:
+                    PROFILER.add("battle_round", t_round)
+                break
+            enemy_hp = max(0, enemy_hp - dmg)
+            log("Charmander:", Lazy(draw_bar, current_hp, char_max_hp))
+            log(lazyf("%s:", enemy['name']), Lazy(draw_bar, enemy_hp, base_hp))
+            pause("\nPress ENTER to continue…")
+            if not quick:
+                safe_clear()
+            if TELEMETRY:
+                TELEMETRY.emit("battle_turn", enemy["name"], rounds, taken, dmg, current_hp, enemy_hp)
+            if PROFILING:
+                PROFILER.add("battle_round", t_round)
+    finally:
+        if saved_level is not None:
+            LOGGER.level = saved_level
+
+    if result is None:
+        result = 'lose' if current_hp <= 0 else 'win'
+    if TELEMETRY:
+        TELEMETRY.emit("battle_end", enemy["name"], result, rounds)
+    if quick:
+        logf("Battle vs %s: %s after %d rounds (dealt %d, took %d, HP %d/%d)",
+             enemy['name'], result, rounds, total_damage_dealt - dealt_before,
+             total_damage_taken - taken_before, current_hp, char_max_hp)
+    if result == 'escape':
+        return result
 
     if current_hp <= 0:
-        log(c("You lost the battle!", "bar_low"))
+        logc("bar_low", "You lost the battle!")
         return 'lose'
-    log(c("You won the battle!", "bar_ok"))
+    logc("bar_ok", "You won the battle!")
     # Soft loot
     enemies_defeated += 1
     score_gain = 20
     score += score_gain
-    log("You gained +%d score." % score_gain)
-    if random.random() < 0.3:
+    logf("You gained +%d score.", score_gain)
+    loot = RNG.loot
+    if loot.random() < 0.3:
         before = current_hp
         current_hp = min(char_max_hp, current_hp + 10)
-        log("You recovered +%d HP." % (current_hp - before))
-    if random.random() < 0.2:
+        logf("You recovered +%d HP.", current_hp - before)
+    if loot.random() < 0.2:
         inventory["potion"] += 1
         log("The enemy dropped a Potion (+1).")
     # XP
-    gained = random.randint(30, 45)
-    log("Gained %d XP." % gained)
+    gained = loot.randint(30, 45)
+    logf("Gained %d XP.", gained)
     add_xp(gained)
     return 'win'
 
+# ---------------- Presets ----------------
+TUNE_TARGETS = "normal=0.12,hard=0.05"  # --tune default: survival rate per tier (demo policy)
+TUNE_KNOBS = ("enemies", "potions", "superpotions", "antidotes", "hp_scale")
+
+def apply_preset(args):
+    """
+    Overwrite counts / HP scale in args with the preset tier (`--tier`, else
+    by --hard), and the difficulty flags the tier was tuned with.
+    """
+    import json
+    with open(args.preset) as fh:
+        tiers = json.load(fh)["tiers"]
+    tier = args.tier or ("hard" if args.hard else "normal")
+    if tier not in tiers:
+        raise ValueError("preset %s has no tier %r (has: %s)" % (args.preset, tier, ", ".join(sorted(tiers))))
+    for knob in TUNE_KNOBS:
+        setattr(args, knob, tiers[tier][knob])
+    args.hard = tiers[tier].get("hard", args.hard)
+    args.no_wrap = not tiers[tier].get("wrap", not args.no_wrap)
+
 # ---------------- Main loop ----------------
+STEP_HOOK = None  # called at the top of every main-loop turn when set (--stress)
 
 def title_splash():
     safe_clear()
@@ -833,52 +2807,81 @@ def title_splash():
     ]
     for line in banner:
         log(c(line, "hud"))
-        time.sleep(0.02 if is_interactive_stdin() else 0)
-    if is_interactive_stdin():
-        safe_input("\nPress ENTER to start…")
+        flush_log()
+        if not TURBO and is_interactive_stdin():
+            time.sleep(0.02)
+    pause("\nPress ENTER to start…")
     safe_clear()
 
 def main(args):
-    global DEMO_MODE, ENABLE_COLOR, current_hp, flame_pp, player_poisoned
-    global inventory, my_position, QUIET, char_max_hp
-    global steps_taken, score, hit_streak, best_streak
+    """Play one run configured by parsed CLI args; return run_summary()."""
+    global DEMO_MODE, TURBO, PROFILING, PROFILE_JSON, ENABLE_COLOR, QUIET, DEMO_STEPS
 
     if args.no_color:
         os.environ["NO_COLOR"] = "1"
         ENABLE_COLOR = False
 
     QUIET = False
+    configure_logging(args.log_level, args.log_file, null=args.headless)
 
     # DEMO only if explicitly requested
     DEMO_MODE = bool(args.demo)
-
-    # Difficulty tweaks
+    DEMO_STEPS = args.demo_steps
+    TURBO = bool(args.turbo)
+    PROFILING = bool(args.profile or args.profile_json)
+    PROFILE_JSON = args.profile_json
+    PROFILER.reset()
+
+    if args.preset:
+        apply_preset(args)
+
+    if not args.cast:
+        return _run_with_telemetry(args)
+    # export: a scripted game rendered into a .cast file, as fast as it can run
+    TURBO = True
+    DEMO_MODE = DEMO_MODE or _REPLAY is None
+    sink = CastSink(args.cast, title="PokeMaze seed %s" % args.seed)
+    LOGGER.set_sinks([sink])
+    t0 = _clock()
+    try:
+        return _run_with_telemetry(args)
+    finally:
+        LOGGER.close()  # writes the header and the last frame
+        LOGGER.set_sinks([NullSink()])
+        if not args.headless:
+            sys.stderr.write("%d frames (%.1f KB of events) -> %s in %.2f s\n"
+                             % (sink.frames, sink.bytes / 1024.0, args.cast, _clock() - t0))
+
+def _run_with_telemetry(args):
+    if args.telemetry:
+        start_telemetry(args.telemetry, threaded=args.telemetry_thread)
+    try:
+        return _run_game(args)
+    finally:
+        if args.telemetry:
+            stop_telemetry()
+        if PROFILING:  # also on a quit, a headless run or Ctrl-C
+            profile_report()
+
+def difficulty_counts(args):
+    """(enemies, potions, supers, antidotes, coins, mystery) for the CLI flags."""
     enemies_n = args.enemies
     potions_n = args.potions
     supers_n = args.superpotions
     antidotes_n = args.antidotes
     coins_n = args.coins
     mystery_n = args.mystery
-    if args.hard:
+    if args.hard:  # preset tiers were tuned with these multipliers applied too
         enemies_n = max(1, int(enemies_n * 1.3))
         potions_n = max(0, int(potions_n * 0.6))
         supers_n = max(0, int(supers_n * 0.5))
         antidotes_n = max(0, int(antidotes_n * 0.5))
         coins_n = max(0, int(coins_n * 0.8))
         mystery_n = max(0, int(mystery_n * 1.2))
+    return enemies_n, potions_n, supers_n, antidotes_n, coins_n, mystery_n
 
-    # Initial state
-    char_max_hp = BASE_MAX_HP
-    current_hp = char_max_hp
-    flame_pp = 3
-    player_poisoned = False
-    inventory = {"potion": 0, "superpotion": 0, "antidote": 0}
-    my_position = [0, 1]
-
-    # meta reset
-    reset_meta()
-
-    # Safer map population (auto-shrink on failure, retry once)
+def populate_with_retry(enemies_n, potions_n, supers_n, antidotes_n, coins_n, mystery_n):
+    """Safer map population (auto-shrink on failure, retry once)."""
     try:
         populate_map(enemies_n, potions_n, supers_n, antidotes_n, coins_n, mystery_n)
     except RuntimeError:
@@ -891,58 +2894,103 @@ def main(args):
         mystery_n = max(0, mystery_n - 1)
         populate_map(enemies_n, potions_n, supers_n, antidotes_n, coins_n, mystery_n)
 
+def apply_game_flags(args):
+    """Set the globals a run reads from its CLI flags (also used by tool workers)."""
+    global HP_SCALE, MAP_WRAP
+    HP_SCALE = args.hp_scale
+    MAP_WRAP = not args.no_wrap
+    ENEMY_SCHEDULER.radius = args.active_radius
+
+def _run_game(args):
+    global current_hp, flame_pp, player_poisoned
+    global inventory, my_position, char_max_hp
+    global steps_taken, score, hit_streak, best_streak, WORLD, FOG, TIMELINE
+
+    ensure_map()
+    if args.content:
+        load_content(args.content)
+
+    enemies_n, potions_n, supers_n, antidotes_n, coins_n, mystery_n = difficulty_counts(args)
+    seed_streams()  # every subsystem's stream follows from the --seed / random.seed() state
+
+    # Initial state
+    char_max_hp = BASE_MAX_HP
+    current_hp = char_max_hp
+    flame_pp = 3
+    player_poisoned = False
+    inventory = {"potion": 0, "superpotion": 0, "antidote": 0}
+    my_position = [0, 1]
+
+    # meta reset
+    reset_meta()
+
+    apply_game_flags(args)
+    WORLD = None
+    TIMELINE = None
+    FOG = FieldOfView(args.fog, wrap=not args.no_wrap) if args.fog else None
+    if args.open_world:
+        # chunks bring their own objects; the boss comes after `enemies_n` wins
+        WORLD = ChunkWorld(RNG.map.getrandbits(32),
+                           world_counts(enemies_n, potions_n, supers_n, antidotes_n, coins_n, mystery_n))
+        my_position = [0, 0]
+        replace_objects([])
+        WORLD.focus(0, 0)
+    else:
+        populate_with_retry(enemies_n, potions_n, supers_n, antidotes_n, coins_n, mystery_n)
+        if args.undo:
+            TIMELINE = Timeline()
+
     boss_spawned = False
-    wrap_moves = not args.no_wrap
+    wrap_moves = MAP_WRAP
+    turns = new_turn_scheduler()
 
     if not args.quiet_title:
         title_splash()
 
     set_weather("Clear", 0)  # start neutral
+    CAMERA.stale = True
+    CAMERA.watch()
 
     end_game = False
     while not end_game:
+        if STEP_HOOK is not None:
+            STEP_HOOK()
+        t0 = _clock() if PROFILING else 0
         draw_map()
+        if PROFILING:
+            PROFILER.add("draw", t0)
+            t0 = _clock()
+        if args.first_frame_exit:
+            sys.stderr.write("first_frame_ms %.3f\n" % ((_clock() - _T_START) * 1e3))
+            return run_summary("first_frame")
         direction = read_key("Move (w/a/s/d, h help, q quit): ")
+        if PROFILING:
+            PROFILER.add("input", t0)
         new_position = None
 
-        if direction == "w":
-            ny = my_position[POS_Y] - 1
-            if wrap_moves:
-                ny = ny % MAP_HEIGHT
-                new_position = [my_position[POS_X], ny]
-            elif ny >= 0:
-                new_position = [my_position[POS_X], ny]
-        elif direction == "s":
-            ny = my_position[POS_Y] + 1
-            if wrap_moves:
-                ny = ny % MAP_HEIGHT
-                new_position = [my_position[POS_X], ny]
-            elif ny < MAP_HEIGHT:
-                new_position = [my_position[POS_X], ny]
-        elif direction == "a":
-            nx = my_position[POS_X] - 1
-            if wrap_moves:
-                nx = nx % MAP_WIDTH
-                new_position = [nx, my_position[POS_Y]]
-            elif nx >= 0:
-                new_position = [nx, my_position[POS_Y]]
-        elif direction == "d":
-            nx = my_position[POS_X] + 1
-            if wrap_moves:
-                nx = nx % MAP_WIDTH
-                new_position = [nx, my_position[POS_Y]]
-            elif nx < MAP_WIDTH:
-                new_position = [nx, my_position[POS_Y]]
+        if direction in STEPS:
+            new_position = step_position(my_position, STEPS[direction], wrap_moves)
         elif direction == "h":
             print_help()
             continue
+        elif direction == "u" and TIMELINE is not None:
+            cp = TIMELINE.rewind(1)
+            if cp is not None:
+                boss_spawned = cp.extra["boss_spawned"]
+            safe_clear()
+            continue
         elif direction == "q":
+            if scripted_input() and not _REPLAY:
+                # DEMO walked its course or the replay ran out
+                safe_clear()
+                log("Demo over." if DEMO_MODE else "Replay over.")
+                return finish_run("quit")
             # Only allow quitting if stdin is interactive AND user confirms.
-            if is_interactive_stdin():
+            if _REPLAY or is_interactive_stdin():
                 ans = safe_input("Quit? (y/N): ").strip().lower()
                 if ans == "y":
                     log("Goodbye!")
-                    break
+                    return finish_run("quit", show=False)
                 else:
                     safe_clear()
                     continue
@@ -956,21 +3004,32 @@ def main(args):
             continue
 
         if new_position:
-            if obstacle_definition[new_position[POS_Y]][new_position[POS_X]] != "#":
+            t0 = _clock() if PROFILING else 0
+            if map_cell(new_position[POS_X], new_position[POS_Y]) != "#":
+                if TIMELINE is not None:
+                    TIMELINE.checkpoint(turns, boss_spawned=boss_spawned)
                 steps_taken += 1
                 my_position[:] = new_position
+                if WORLD is not None:
+                    WORLD.focus(my_position[POS_X], my_position[POS_Y])
+                if TELEMETRY:
+                    TELEMETRY.emit("step", steps_taken, new_position[POS_X], new_position[POS_Y])
                 # Object in the cell?
                 for obj in list(map_objects):
                     if obj["pos"] == my_position:
                         if obj["type"] == "enemy":
+                            if PROFILING:
+                                # battles are timed per round, not as movement
+                                PROFILER.add("move", t0)
+                                t0 = 0
                             result = do_battle(obj)
                             if result == 'win':
-                                map_objects.remove(obj)
+                                remove_object(obj)
                                 hit_streak = 0  # reset between battles
                             elif result == 'escape':
                                 # Nudge the enemy away a bit to avoid immediate re-trigger
                                 try:
-                                    obj["pos"] = random_free_cell()
+                                    move_object(obj, random_free_cell(RNG.battle))
                                 except Exception:
                                     pass
                                 hit_streak = 0
@@ -978,77 +3037,87 @@ def main(args):
                                 end_game = True
                                 safe_clear()
                                 log("You were defeated. Game Over.")
-                                summary_screen()
-                                return
-                        elif obj["type"] == "potion":
+                                return finish_run("lose")
+                            break
+                        if TELEMETRY:
+                            TELEMETRY.emit("pickup", obj["type"], my_position[POS_X], my_position[POS_Y])
+                        if obj["type"] == "potion":
                             inventory["potion"] += 1
-                            log(c("You found a Potion! (+1)", "potion"))
-                            map_objects.remove(obj)
-                            if is_interactive_stdin():
-                                safe_input("ENTER…")
+                            logc("potion", "You found a Potion! (+1)")
+                            remove_object(obj)
+                            pause()
                         elif obj["type"] == "superpotion":
                             inventory["superpotion"] += 1
-                            log(c("You found a Super Potion! (+1)", "potion"))
-                            map_objects.remove(obj)
-                            if is_interactive_stdin():
-                                safe_input("ENTER…")
+                            logc("potion", "You found a Super Potion! (+1)")
+                            remove_object(obj)
+                            pause()
                         elif obj["type"] == "antidote":
                             inventory["antidote"] += 1
-                            log(c("You found an Antidote! (+1)", "potion"))
-                            map_objects.remove(obj)
-                            if is_interactive_stdin():
-                                safe_input("ENTER…")
+                            logc("potion", "You found an Antidote! (+1)")
+                            remove_object(obj)
+                            pause()
                         elif obj["type"] == "coin":
                             val = obj.get("value", 5)
                             score += val
-                            log(c("You picked up %d coins!" % val, "coin"))
-                            map_objects.remove(obj)
-                            if is_interactive_stdin():
-                                safe_input("ENTER…")
+                            logc("coin", "You picked up %d coins!", val)
+                            remove_object(obj)
+                            pause()
                         elif obj["type"] == "mystery":
-                            log(c("You step onto a mysterious tile…", "mystery"))
+                            logc("mystery", "You step onto a mysterious tile…")
                             resolve_mystery()
-                            map_objects.remove(obj)
-                            if is_interactive_stdin():
-                                safe_input("ENTER…")
+                            remove_object(obj)
+                            pause()
                         break
 
-                # Enemies roam after your move
-                move_enemies()
+                if PROFILING and t0:
+                    PROFILER.add("move", t0)
 
-                # Weather countdown
-                if steps_taken % 6 == 0 and random.random() < 0.25:
-                    # 25% chance to (re-)set a non-clear weather
-                    set_weather(random.choice(["Sunny", "Rain", "Fog"]), random.randint(8, 14))
-                tick_weather()
+                # Enemies roam, weather counts down, poison stings: whoever is due
+                end_of_step(turns)
 
             safe_clear()
 
         # Boss spawn logic
-        if not boss_spawned and all(o["type"] != "enemy" for o in map_objects):
+        if WORLD is not None:
+            boss_due = enemies_defeated >= enemies_n
+        else:
+            boss_due = all(o["type"] != "enemy" for o in map_objects)
+        if not boss_spawned and boss_due:
             boss_spawned = True
             try:
                 pos = random_free_cell()
-                map_objects.append({"type": "enemy", "name": "Boss Onix", "hp": ENEMIES["Boss Onix"]["hp"], "pos": pos})
+                boss = new_enemy(BOSS_ID, pos)
+                boss["pinned"] = True  # never evicted with its chunk
+                add_object(boss)
                 log(c("The ground trembles… A BOSS appears!", "status"))
             except Exception:
                 # If for some reason no space, directly start fight at current pos
-                enemy = {"type": "enemy", "name": "Boss Onix", "hp": ENEMIES["Boss Onix"]["hp"], "pos": my_position[:]}
+                enemy = new_enemy(BOSS_ID, my_position[:])
                 result = do_battle(enemy)
                 if result != 'win':
                     end_game = True
                     safe_clear()
                     log("You were defeated. Game Over.")
-                    summary_screen()
-                    return
+                    return finish_run("lose")
 
         # Victory?
-        if boss_spawned and all((o["type"] != "enemy") for o in map_objects):
+        if WORLD is not None:
+            won = boss_spawned and all(not o.get("pinned") for o in map_objects)
+        else:
+            won = boss_spawned and all((o["type"] != "enemy") for o in map_objects)
+        if won:
             safe_clear()
             log(c("Congratulations! You defeated ALL enemies and the Boss.", "bar_ok"))
             log("The end.")
-            summary_screen()
-            break
+            return finish_run("win")
+
+def play_headless(argv=()):
+    """Run one silent turbo DEMO game with extra CLI args; return run_summary().
+    Seed the RNG first for reproducible results."""
+    global _DEMO_STEP_COUNT
+    _DEMO_STEP_COUNT = 0
+    args = parse_args(["--demo", "--turbo", "--quiet-title", "--headless"] + list(argv))
+    return main(args)
 
 def reset_meta():
     global level, xp, xp_to_next, score, steps_taken, enemies_defeated
@@ -1068,6 +3137,36 @@ def reset_meta():
     hit_streak = 0
     best_streak = 0
 
+def run_summary(outcome=None):
+    """The counters summary_screen() prints, as a plain dict."""
+    return {
+        "outcome": outcome,
+        "level": level,
+        "xp": xp,
+        "score": score,
+        "steps": steps_taken,
+        "enemies_defeated": enemies_defeated,
+        "damage_dealt": total_damage_dealt,
+        "damage_taken": total_damage_taken,
+        "potions_used": potions_used,
+        "superpotions_used": superpotions_used,
+        "antidotes_used": antidotes_used,
+        "best_streak": best_streak,
+        "state_hash": "%016x" % state_hash(),  # final state, for deduplicating runs
+    }
+
+def finish_run(outcome, show=True):
+    """End-of-run bookkeeping shared by every exit of main(); returns run_summary()."""
+    global TIMELINE
+    TIMELINE = None  # the undo history dies with the run
+    if show:
+        summary_screen()
+    summary = run_summary(outcome)
+    if TELEMETRY:
+        TELEMETRY.emit("run_summary", summary)
+    flush_log()
+    return summary
+
 def summary_screen():
     log("")
     log(c("=== RUN SUMMARY ===", "hud"))
@@ -1086,92 +3185,44 @@ def summary_screen():
         log(c("Achievement: COIN HOARDER (100+)", "status"))
     log(c("===================", "hud"))
 
-# ---------------- Tests (kept intentionally similar) ----------------
-class GameTests(unittest.TestCase):
-    def setUp(self):
-        global ENABLE_COLOR, DEMO_MODE, QUIET, _DEMO_STEP_COUNT
-        ENABLE_COLOR = False
-        DEMO_MODE = True
-        QUIET = True
-        _DEMO_STEP_COUNT = 0
-        random.seed(1234)
-
-    def test_draw_bar_bounds(self):
-        self.assertIn("(0/100)", draw_bar(0, 100))
-        self.assertIn("(100/100)", draw_bar(150, 100))
-        self.assertIn("(0/100)", draw_bar(-10, 100))
-
-    def test_map_rectangular(self):
-        for y in range(MAP_HEIGHT):
-            self.assertEqual(len(obstacle_definition[y]), MAP_WIDTH)
-
-    def test_free_cell(self):
-        map_objects[:] = []
-        map_objects.append({"type": "potion", "heal": 25, "pos": [1, 1]})
-        for _ in range(20):
-            x, y = random_free_cell()
-            self.assertNotEqual([x, y], my_position)
-            self.assertTrue(obstacle_definition[y][x] != "#")
-            self.assertTrue(all(o["pos"] != [x, y] for o in map_objects))
-
-    def test_populate_counts(self):
-        map_objects[:] = []
-        # Use original signature subset to preserve expectations; extras default to 0
-        populate_map(5, 2, 1, 1, 0, 0)
-        enemies = [o for o in map_objects if o["type"] == "enemy"]
-        pots = [o for o in map_objects if o["type"] == "potion"]
-        sups = [o for o in map_objects if o["type"] == "superpotion"]
-        ants = [o for o in map_objects if o["type"] == "antidote"]
-        self.assertEqual(len(enemies), 5)
-        self.assertEqual(len(pots), 2)
-        self.assertEqual(len(sups), 1)
-        self.assertEqual(len(ants), 1)
-        positions = [tuple(o["pos"]) for o in map_objects]
-        self.assertEqual(len(positions), len(set(positions)))
-
-    def test_enemy_turn_damage_range(self):
-        e = {"name": "Machop", "hp": 100, "pos": [5, 5], "type": "enemy"}
-        zeros = 0
-        normals = 0
-        for _ in range(60):
-            dmg, eff, _msg = enemy_turn(e)
-            self.assertTrue(dmg >= 0)
-            if dmg == 0:
-                zeros += 1
-            if dmg >= 10:
-                normals += 1
-        self.assertTrue(zeros >= 1)
-        self.assertTrue(normals >= 1)
-
-    def test_demo_key_valid(self):
-        ks = set()
-        for _ in range(20):
-            ks.add(read_key())
-        self.assertTrue(ks.issubset({'w', 'a', 's', 'd', 'q'}))
-
-    def test_antidote_usage(self):
-        global player_poisoned, inventory, current_hp
-        inventory["antidote"] = 1
-        player_poisoned = True
-        before = current_hp
-        used = use_item("antidote")
-        self.assertTrue(used)
-        self.assertFalse(player_poisoned)
-        self.assertEqual(current_hp, before)
+def profile_report():
+    """Print the --profile table and write --profile-json, however the run ended."""
+    PROFILER.report()
+    flush_log()
+    if PROFILE_JSON:
+        PROFILER.dump_json(PROFILE_JSON)
 
-    # Ensure draw_map does not crash in DEMO/QUIET mode
-    def test_draw_map_no_crash(self):
-        try:
-            draw_map()
-        except Exception as e:
-            self.fail("draw_map raised an exception: %s" % e)
+# ---------------- Tools (loaded on demand) ----------------
+TOOLS_FILE = "pokemaze_tools.py"
+
+def load_tools():
+    """
+    Compile the tests, benchmarks, sweeps, seed search, stress harness, tuner
+    and leaderboard (TOOLS_FILE, next to this file) into this module's
+    namespace, so a normal launch never parses them. Safe to call again.
+    """
+    if "_game_tests" in globals():
+        return
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), TOOLS_FILE)
+    with open(path) as fh:
+        code = compile(fh.read(), path, "exec")
+    exec(code, globals())
+
+def _tool_worker(job):
+    """multiprocessing entry point for tools: (function name, argument) -> result."""
+    load_tools()
+    name, arg = job
+    return globals()[name](arg)
 
 # ---------------- CLI ----------------
 
 def parse_args(argv=None):
+    import argparse
     p = argparse.ArgumentParser(description="ASCII PokeMaze++")
     p.add_argument("--test", action="store_true", help="Run tests and exit")
     p.add_argument("--demo", action="store_true", help="Force DEMO (no interactive input)")
+    p.add_argument("--demo-steps", type=int, default=DEMO_STEPS, metavar="N",
+                   help="Keys a DEMO run plays before it quits")
     p.add_argument("--seed", type=int, help="RNG seed for reproducibility")
     p.add_argument("--no-color", action="store_true", help="Disable ANSI colors")
     p.add_argument("--enemies", type=int, default=DEFAULT_NUM_ENEMIES, help="Number of enemies")
@@ -1182,26 +3233,136 @@ def parse_args(argv=None):
     p.add_argument("--mystery", type=int, default=DEFAULT_NUM_MYSTERY, help="Number of Mystery tiles")
     p.add_argument("--hard", action="store_true", help="Hard mode")
     p.add_argument("--no-wrap", action="store_true", help="Disable wrap-around at map borders")
+    p.add_argument("--open-world", action="store_true",
+                   help="Endless chunked map generated around you (boss after --enemies wins)")
+    p.add_argument("--fog", type=int, nargs="?", const=FOV_RADIUS, metavar="R",
+                   help="Fog of war: only cells in line of sight (radius R) are shown")
+    p.add_argument("--undo", action="store_true",
+                   help="Keep a per-step history; press u to take a step back (not with --open-world)")
+    p.add_argument("--active-radius", type=int, default=ACTIVE_RADIUS, metavar="R",
+                   help="Only enemies within R cells of you roam on big maps (0: all)")
     p.add_argument("--quiet-title", action="store_true", help="Skip splash screen")
+    p.add_argument("--turbo", action="store_true",
+                   help="No sleeps, no ENTER pauses, one screen per battle")
+    p.add_argument("--profile", action="store_true", help="Time each turn phase; report p50/p95/p99 at the end")
+    p.add_argument("--profile-json", metavar="FILE", help="Also dump the --profile report as JSON (implies --profile)")
+    p.add_argument("--bench", nargs="?", const="quick", choices=("quick", "all"),
+                   help="Run the benchmark suite (JSON lines) and exit; 'all' adds the multi-second runs")
+    p.add_argument("--bench-out", metavar="FILE", help="Also append benchmark JSON lines to FILE")
+    p.add_argument("--bench-only", metavar="NAMES", help="Comma-separated benchmark names to run")
+    p.add_argument("--headless", action="store_true", help="No terminal output at all (tools, simulations)")
+    p.add_argument("--telemetry", metavar="FILE", help="Append a JSONL event stream to FILE")
+    p.add_argument("--telemetry-thread", action="store_true", help="Write telemetry from a background thread")
+    p.add_argument("--sim", type=int, metavar="N", help="Play N headless games per difficulty and print aggregate stats")
+    p.add_argument("--workers", type=int, help="Worker processes for --sim (default: CPU count)")
+    p.add_argument("--sim-json", metavar="FILE", help="Write the mergeable --sim aggregate as JSON")
+    p.add_argument("--startup-bench", type=int, nargs="?", const=20, metavar="N",
+                   help="Spawn N fresh processes and report import-to-first-frame time")
+    p.add_argument("--first-frame-exit", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--content", metavar="FILE", help="Load enemies/attacks/items/spawn weights from a JSON file")
+    p.add_argument("--dump-content", metavar="FILE", help="Write the built-in content as JSON (a template) and exit")
+    p.add_argument("--find-seeds", type=int, metavar="N",
+                   help="Scan N seeds (from --seed) and print those meeting --criteria as JSON lines")
+    p.add_argument("--criteria", default="nearest_enemy>5", metavar="EXPR",
+                   help="Comma-separated checks for --find-seeds, e.g. 'enemy_steps<=50,score>=20'")
+    p.add_argument("--limit", type=int, metavar="M", help="Stop --find-seeds after M matches")
+    p.add_argument("--stress", type=int, metavar="N",
+                   help="Play random games for N turns checking invariants; shrink and print any failure")
+    p.add_argument("--tune", nargs="?", const=TUNE_TARGETS, metavar="TIER=RATE,...",
+                   help="Search counts and enemy HP to hit target survival rates; write --tune-out")
+    p.add_argument("--tune-out", default="preset.json", metavar="FILE", help="Preset file written by --tune")
+    p.add_argument("--preset", metavar="FILE", help="Load tuned counts and enemy HP from a --tune preset")
+    p.add_argument("--tier", metavar="NAME", help="Preset tier to use (default: hard with --hard, else normal)")
+    p.add_argument("--hp-scale", type=float, default=1.0, metavar="F", help="Multiply every enemy's HP by F")
+    p.add_argument("--db", metavar="FILE", help="Save this run (or every --sim run) to a SQLite leaderboard")
+    p.add_argument("--leaderboard", type=int, nargs="?", const=10, metavar="N",
+                   help="Show the top N runs per difficulty (per seed with --seed) and exit")
+    p.add_argument("--cast", metavar="FILE",
+                   help="Export a --replay or seeded DEMO game to an asciinema v2 .cast file (no terminal)")
+    p.add_argument("--record", metavar="FILE", help="Record your inputs (and seed) to FILE")
+    p.add_argument("--replay", metavar="FILE", help="Replay inputs recorded with --record")
+    p.add_argument("--log-level", choices=sorted(LOG_LEVELS, key=LOG_LEVELS.get), default="info",
+                   help="Minimum level for game messages")
+    p.add_argument("--log-file", help="Also append game messages to this file")
     return p.parse_args(argv)
 
 if __name__ == "__main__":
     args = parse_args()
+    if args.replay:
+        recorded_seed = load_replay(args.replay)
+        if args.seed is None:
+            args.seed = recorded_seed
+    if args.record:
+        if args.seed is None:
+            args.seed = random.randrange(1 << 31)
+        start_recording(args.record, args.seed)
     if args.seed is not None:
         random.seed(args.seed)
-    if args.test:
+    if (args.test or args.bench or args.sim or args.startup_bench or args.tune or args.find_seeds
+            or args.stress or args.leaderboard or args.db):
+        load_tools()
+    if args.dump_content:
+        import json
+        with open(args.dump_content, "w") as fh:
+            json.dump(content_dict(), fh, indent=2, sort_keys=True)
+            fh.write("\n")
+    elif args.startup_bench:
+        run_startup_bench(args.startup_bench)
+    elif args.tune:
+        # each tier brings its own difficulty, so --hard is not forwarded
+        argv = [a for a in game_argv(args) if a != "--hard"]
+        run_tuner(args.tune, seed=args.seed or 0, workers=args.workers, out_path=args.tune_out, argv=argv)
+    elif args.find_seeds:
+        t0 = _clock()
+        found = find_seeds(args.find_seeds, args.criteria, game_argv(args), args.seed or 0,
+                           args.workers, args.limit)
+        sys.stderr.write("%d matching seeds (scanned up to %d) in %.1f s\n"
+                         % (found, args.find_seeds, _clock() - t0))
+    elif args.stress:
+        if not run_stress(args.stress, args.workers, args.seed or 0, game_argv(args)):
+            sys.exit(1)
+    elif args.leaderboard:
+        show_leaderboard(args.db or LEADERBOARD_DB, args.leaderboard, args.seed)
+    elif args.sim:
+        board = Leaderboard(args.db) if args.db else None
+        try:
+            # every difficulty group is swept anyway, so --hard is not forwarded
+            argv = [a for a in game_argv(args) if a != "--hard"]
+            stats = run_sweep(args.sim, args.workers, args.seed or 0, argv, board=board)
+        finally:
+            if board is not None:
+                board.close()
+        sys.stdout.write(stats.report() + "\n")
+        if args.sim_json:
+            import json
+            with open(args.sim_json, "w") as fh:
+                json.dump(stats.to_dict(), fh, sort_keys=True)
+    elif args.bench:
+        if args.no_color:
+            ENABLE_COLOR = False
+        run_benchmarks(only=args.bench_only.split(",") if args.bench_only else None,
+                       out_path=args.bench_out, suite=args.bench)
+    elif args.test:
         os.environ["NO_COLOR"] = "1"
         try:
             # Ensure tests don't spam title
             args.quiet_title = True
         except Exception:
             pass
+        import unittest
+        GameTests = _game_tests()
         try:
             unittest.main(argv=[sys.argv[0]], exit=False)
         except TypeError:
             unittest.main(argv=[sys.argv[0]])
     else:
         try:
-            main(args)
+            summary = main(args)
+            if args.db:
+                board = Leaderboard(args.db)
+                board.add(leaderboard_row(summary, args.seed, run_flags(args)))
+                board.close()
         except KeyboardInterrupt:
-            print("\nInterrupted by user.")
+            log("\nInterrupted by user.")
+        finally:
+            LOGGER.close()
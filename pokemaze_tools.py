@@ -0,0 +1,2166 @@
+# -*- coding: utf-8 -*-
+"""
+Tooling for PokeMaze.py: benchmarks, simulation sweeps, seed search, the
+stress harness, the difficulty tuner, the leaderboard and the test suite.
+
+Not a standalone module: PokeMaze.load_tools() compiles this file into the
+game's own namespace the first time one of those CLI flags is used, so the
+code here reads and rebinds game globals directly.
+"""
+
+# ---------------- Benchmarks ----------------
+
+class _NullStream(object):
+    """File-like sink that drops writes (render cost without terminal cost)."""
+    def write(self, s):
+        pass
+
+    def flush(self):
+        pass
+
+def _time_call(fn, min_time=0.05, repeat=3):
+    """Return best seconds-per-call of fn() over `repeat` calibrated runs."""
+    loops = 1
+    while True:
+        t0 = _clock()
+        for _ in range(loops):
+            fn()
+        elapsed = _clock() - t0
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        t0 = _clock()
+        for _ in range(loops):
+            fn()
+        best = min(best, (_clock() - t0) / loops)
+    return best, loops
+
+def _bench_world(width, height, entities, seed=1234):
+    """Reset globals to a fresh generated world with ~`entities` objects."""
+    global my_position, current_hp, char_max_hp, player_poisoned, inventory
+    random.seed(seed)
+    seed_streams()
+    default_grid, default_w, default_h = build_map(ASCII_MAP)
+    if (width, height) == (default_w, default_h):
+        use_map(default_grid)
+    else:
+        use_map(generate_map(width, height, rng=random.Random(seed)))
+    my_position = [0, 1]
+    char_max_hp = BASE_MAX_HP
+    current_hp = char_max_hp
+    player_poisoned = False
+    inventory = {"potion": 0, "superpotion": 0, "antidote": 0}
+    reset_meta()
+    set_weather("Clear", 0)
+    free = sum(1 for _ in all_free_cells())
+    n = max(1, min(entities, free - 1))
+    populate_map(n - n // 2, 0, 0, 0, n // 2, 0)
+    return n
+
+def _bench_cases():
+    """(name, setup, fn) triples; setup() runs before timing, fn() is timed."""
+    def fight():
+        global current_hp, player_poisoned
+        current_hp = char_max_hp
+        player_poisoned = False
+        do_battle(new_enemy(ENEMY_ID["Machop"], [0, 0]))
+
+    def draw_view():
+        CAMERA.fixed = (26, 16)  # an 80x24 terminal
+        try:
+            draw_map()
+        finally:
+            CAMERA.fixed = None
+
+    machop = {"type": "enemy", "name": "Machop", "hp": 100, "pos": [0, 0]}
+    saved = {}
+
+    def snapshot():
+        saved["objs"] = [dict(o, pos=list(o["pos"])) for o in map_objects]
+
+    def restore():
+        replace_objects([dict(o, pos=list(o["pos"])) for o in saved["objs"]])
+
+    return [
+        ("draw_map", None, draw_map),
+        ("draw_map_view", None, draw_view),
+        ("occupancy_index", None, occupancy_index),
+        ("random_free_cell", None, random_free_cell),
+        ("fov_compute", None, lambda: FieldOfView().compute(my_position[POS_X], my_position[POS_Y])),
+        ("move_enemies", snapshot, move_enemies),
+        ("populate_map", snapshot, lambda: populate_map(
+            sum(1 for o in saved["objs"] if o["type"] == "enemy"), 0, 0, 0,
+            sum(1 for o in saved["objs"] if o["type"] != "enemy"), 0)),
+        ("enemy_turn", None, lambda: enemy_turn(machop)),
+        ("roll_damage", None, lambda: roll_damage(10, 0.05, 0.10, 1.5)),
+        ("do_battle", None, fight),
+    ], restore
+
+BENCH_SIZES = [(30, 15), (64, 32), (128, 64)]  # first entry is ASCII_MAP
+BENCH_ENTITIES = [16, 128, 1024]
+# seconds-long runs that only `--bench all` (or naming them in --bench-only) includes
+BENCH_HEAVY = ("move_enemies_100k", "snapshot_fork", "cast_export", "leaderboard", "game_telemetry")
+
+def bench_telemetry_overhead(games=20, repeat=3):
+    """Time identical seeded headless games with telemetry off / batched / threaded."""
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    modes = [("off", []), ("batched", ["--telemetry", path]),
+             ("thread", ["--telemetry", path, "--telemetry-thread"])]
+    results = []
+    try:
+        for mode, argv in modes:
+            best = None
+            for _ in range(repeat):
+                t0 = _clock()
+                for seed in range(games):
+                    random.seed(seed)
+                    play_headless(argv)
+                elapsed = _clock() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            results.append({"bench": "game_telemetry", "mode": mode, "games": games,
+                            "us_per_game": round(best * 1e6 / games, 3)})
+        with open(path) as fh:
+            events = sum(1 for _ in fh)
+        per_mode_events = events // (2 * repeat) if events else 0
+        off = results[0]["us_per_game"]
+        for rec in results:
+            rec["events_per_pass"] = per_mode_events if rec["mode"] != "off" else 0
+            rec["overhead_pct"] = round(100.0 * (rec["us_per_game"] - off) / off, 2) if off else 0.0
+    finally:
+        os.remove(path)
+    return results
+
+def bench_active_enemies(enemies=100000, width=1024, height=512, turns=20):
+    """move_enemies() per turn on a big map: active-region scheduler vs updating everyone."""
+    _bench_world(width, height, 1)
+    populate_map(enemies, 0, 0, 0, 0, 0)
+    results = []
+    saved_radius = ENEMY_SCHEDULER.radius
+    try:
+        for mode, radius, n in (("active", ACTIVE_RADIUS, turns), ("all", 0, 3)):
+            ENEMY_SCHEDULER.radius = radius
+            ENEMY_SCHEDULER.mark_dirty()
+            move_enemies()  # warm-up (builds the bucket grid once)
+            t0 = _clock()
+            for _ in range(n):
+                move_enemies()
+            elapsed = _clock() - t0
+            results.append({"bench": "move_enemies_100k", "mode": mode, "width": width,
+                            "height": height, "enemies": enemies, "radius": radius,
+                            "active": ENEMY_SCHEDULER.active if radius else enemies,
+                            "us_per_turn": round(elapsed * 1e6 / n, 3)})
+    finally:
+        ENEMY_SCHEDULER.radius = saved_radius
+        ENEMY_SCHEDULER.mark_dirty()
+    return results
+
+def bench_snapshots(entity_counts=(1000, 10000, 100000), width=1024, height=512, forks=2000):
+    """Timeline.fork() rate vs a full copy of map_objects, and fork -> step -> rewind cycles."""
+    global TIMELINE
+    results = []
+    try:
+        for n in entity_counts:
+            _bench_world(width, height, 1)
+            populate_map(n, 0, 0, 0, 0, 0)
+            TIMELINE = Timeline()
+            t0 = _clock()
+            for _ in range(forks):
+                TIMELINE.fork()
+            fork_s = (_clock() - t0) / forks
+            copies = max(1, 200000 // n)
+            t0 = _clock()
+            for _ in range(copies):
+                [dict(o, pos=list(o["pos"])) for o in map_objects]
+            copy_s = (_clock() - t0) / copies
+            move_enemies()  # warm-up (bucket grid)
+            cp = TIMELINE.fork()
+            t0 = _clock()
+            for _ in range(100):
+                move_enemies()
+                TIMELINE.rewind_to(cp)
+            cycle_s = (_clock() - t0) / 100
+            results.append({"bench": "snapshot_fork", "width": width, "height": height,
+                            "entities": n, "forks_per_s": int(1 / fork_s) if fork_s else 0,
+                            "full_copies_per_s": round(1 / copy_s, 1) if copy_s else 0,
+                            "us_step_rewind": round(cycle_s * 1e6, 3)})
+    finally:
+        TIMELINE = None
+    return results
+
+def bench_cast_export(turns=10000):
+    """Render `turns` roaming turns on the built-in map into a .cast file (no terminal)."""
+    global QUIET
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix=".cast")
+    os.close(fd)
+    _bench_world(BENCH_SIZES[0][0], BENCH_SIZES[0][1], 16)
+    saved_sinks, saved_quiet = LOGGER.sinks, QUIET
+    sink = CastSink(path)
+    QUIET = False
+    LOGGER.set_sinks([sink])
+    t0 = _clock()
+    try:
+        for _ in range(turns):
+            draw_map()
+            move_enemies()
+            safe_clear()
+        LOGGER.close()
+        elapsed = _clock() - t0
+        size = os.path.getsize(path)
+    finally:
+        QUIET = saved_quiet
+        LOGGER.set_sinks(saved_sinks)
+        os.remove(path)
+    return {"bench": "cast_export", "turns": turns, "frames": sink.frames, "seconds": round(elapsed, 3),
+            "bytes": size, "bytes_per_frame": size // max(1, sink.frames)}
+
+class _CountingStream(object):
+    """File-like sink that only counts the UTF-8 bytes written to it."""
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, s):
+        self.bytes += len(s.encode("utf-8") if not isinstance(s, bytes) else s)
+
+    def flush(self):
+        pass
+
+class _CaptureStream(object):
+    """File-like sink that keeps everything written to it (for tests)."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, s):
+        self.chunks.append(s)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+def bench_frame_bytes(entities=16):
+    """Bytes one draw_map() frame (HUD + map) sends, colored vs NO_COLOR."""
+    global ENABLE_COLOR, QUIET
+    saved_sinks, saved = LOGGER.sinks, (ENABLE_COLOR, QUIET)
+    results = []
+    try:
+        QUIET = False
+        for width, height in BENCH_SIZES:
+            placed = _bench_world(width, height, entities)
+            for color in (False, True):
+                ENABLE_COLOR = color
+                stream = _CountingStream()
+                LOGGER.set_sinks([TerminalSink(stream)])
+                draw_map()
+                results.append({"bench": "frame_bytes", "color": color, "width": width,
+                                "height": height, "entities": placed, "cells": width * height,
+                                "bytes_per_frame": stream.bytes})
+            plain = results[-2]["bytes_per_frame"]
+            for rec in results[-2:]:
+                rec["overhead_pct"] = round(100.0 * (rec["bytes_per_frame"] - plain) / plain, 2)
+    finally:
+        ENABLE_COLOR, QUIET = saved
+        LOGGER.set_sinks(saved_sinks)
+    return results
+
+def run_benchmarks(sizes=None, entity_counts=None, only=None, out_path=None, min_time=0.05, suite="quick"):
+    """
+    Time the hot paths across map sizes and entity counts. The "quick" suite
+    keeps the smallest and largest of each; "all" runs the whole grid plus
+    the BENCH_HEAVY runs. Emits one JSON object per line (stdout and/or
+    out_path) for regression tracking.
+    """
+    global DEMO_MODE, TURBO, QUIET, PROFILING
+    import json
+    import platform
+    full = suite == "all"
+    sizes = sizes or (BENCH_SIZES if full else [BENCH_SIZES[0], BENCH_SIZES[-1]])
+    entity_counts = entity_counts or (BENCH_ENTITIES if full else [BENCH_ENTITIES[0], BENCH_ENTITIES[-1]])
+    fh = open(out_path, "a") if out_path else None
+
+    def emit(rec):
+        line = json.dumps(rec, sort_keys=True)
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+        if fh:
+            fh.write(line + "\n")
+
+    saved_sinks = LOGGER.sinks
+    saved_flags = DEMO_MODE, TURBO, QUIET, PROFILING
+    DEMO_MODE, TURBO, QUIET, PROFILING = True, True, True, False
+    run_id = int(time.time())
+    emit({"bench": "meta", "run": run_id, "python": platform.python_version(),
+          "implementation": platform.python_implementation(), "platform": sys.platform,
+          "color": bool(ENABLE_COLOR), "suite": suite})
+    try:
+        # draw_map renders into a discarding stream: measures frame building only
+        LOGGER.set_sinks([TerminalSink(_NullStream())])
+        for width, height in sizes:
+            for entities in entity_counts:
+                placed = _bench_world(width, height, entities)
+                cases, restore = _bench_cases()
+                for name, setup, fn in cases:
+                    if only and name not in only:
+                        continue
+                    if setup:
+                        setup()
+                    per_call, loops = _time_call(fn, min_time)
+                    if setup:
+                        restore()
+                    emit({"bench": name, "run": run_id, "width": width, "height": height,
+                          "entities": placed, "loops": loops, "us_per_call": round(per_call * 1e6, 3)})
+        for name, bench in (("move_enemies_100k", bench_active_enemies), ("snapshot_fork", bench_snapshots),
+                            ("cast_export", bench_cast_export), ("frame_bytes", bench_frame_bytes),
+                            ("leaderboard", bench_leaderboard), ("game_telemetry", bench_telemetry_overhead)):
+            if only and name not in only or not only and not full and name in BENCH_HEAVY:
+                continue
+            recs = bench()
+            for rec in recs if isinstance(recs, list) else [recs]:
+                rec["run"] = run_id
+                emit(rec)
+    finally:
+        DEMO_MODE, TURBO, QUIET, PROFILING = saved_flags
+        LOGGER.set_sinks(saved_sinks)
+        use_map(build_map(ASCII_MAP)[0])
+        replace_objects([])
+        if fh:
+            fh.close()
+
+def _spawn_to_first_frame(cmd, devnull, cwd=None):
+    """(ms from spawn to the first frame, the child's own module-body ms, ms to exit)."""
+    import subprocess
+    t0 = _clock()
+    proc = subprocess.Popen(cmd, stdout=devnull, stderr=subprocess.PIPE, cwd=cwd)
+    frame = body = None
+    for line in iter(proc.stderr.readline, b""):
+        line = line.decode("utf-8", "ignore")
+        if line.startswith("first_frame_ms "):
+            frame = (_clock() - t0) * 1e3
+            body = float(line.split()[1])
+            break
+    proc.communicate()
+    return frame, body, (_clock() - t0) * 1e3
+
+def run_startup_bench(runs=20):
+    """
+    Spawn fresh interpreters and time process spawn -> first frame. The
+    target is judged on that minus a bare interpreter's spawn -> exit, so
+    compiling the script counts (the in-process clock starts after it).
+    """
+    import subprocess
+    devnull = open(os.devnull, "w")
+    path = os.path.abspath(__file__)
+    flags = ["--demo", "--turbo", "--quiet-title", "--seed", "1", "--first-frame-exit"]
+    script = [sys.executable, path] + flags
+    # -m reuses the cached bytecode in __pycache__ instead of compiling the script;
+    # refresh it up front since PYTHONDONTWRITEBYTECODE would leave it stale
+    import py_compile
+    py_compile.compile(path)
+    module = [sys.executable, "-m", os.path.splitext(os.path.basename(path))[0]] + flags
+    spawn_ms, body_ms, wall_ms, cached_ms, bare_ms = [], [], [], [], []
+    try:
+        for _ in range(runs):
+            t0 = _clock()
+            subprocess.call([sys.executable, "-c", "pass"], stdout=devnull, stderr=devnull)
+            bare_ms.append((_clock() - t0) * 1e3)
+            frame, body, wall = _spawn_to_first_frame(script, devnull)
+            wall_ms.append(wall)
+            if frame is not None:
+                spawn_ms.append(frame)
+                body_ms.append(body)
+            frame = _spawn_to_first_frame(module, devnull, cwd=os.path.dirname(path))[0]
+            if frame is not None:
+                cached_ms.append(frame)
+    finally:
+        devnull.close()
+    for vals in (spawn_ms, body_ms, wall_ms, cached_ms, bare_ms):
+        vals.sort()
+
+    def row(label, vals):
+        return "%-36s p50 %7.2f ms  p95 %7.2f ms  max %7.2f ms" % (
+            label, _percentile(vals, 50), _percentile(vals, 95), vals[-1] if vals else 0.0)
+
+    def verdict(label, vals):
+        own = _percentile(vals, 50) - _percentile(bare_ms, 50) if vals else None
+        return "target (%s): first frame < 30 ms over a bare interpreter (p50 %s) -> %s" % (
+            label, "n/a" if own is None else "%.2f ms" % own,
+            "OK" if own is not None and own < 30 else "MISSED")
+
+    sys.stdout.write("\n".join([
+        "startup bench (%d runs)" % runs,
+        row("process spawn -> first frame", spawn_ms),
+        row("  same, python -m (cached bytecode)", cached_ms),
+        row("module body -> first frame", body_ms),
+        row("process spawn -> exit", wall_ms),
+        row("bare interpreter", bare_ms),
+        verdict("script", spawn_ms),
+        verdict("python -m", cached_ms),
+    ]) + "\n")
+
+# ---------------- Simulation sweeps ----------------
+
+class Metric(object):
+    """
+    Streaming summary of one counter: running mean/variance (Welford) plus a
+    log-bucket quantile sketch with ~2% relative error. Memory is bounded by
+    the value range, not the sample count, and two Metrics merge exactly
+    (e.g. results from different worker processes).
+    """
+    ALPHA = 0.02
+    GAMMA_LOG = math.log((1 + ALPHA) / (1 - ALPHA))
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.lo = None
+        self.hi = None
+        self.zeros = 0
+        self.buckets = {}
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if self.lo is None or x < self.lo:
+            self.lo = x
+        if self.hi is None or x > self.hi:
+            self.hi = x
+        if x <= 0:
+            self.zeros += 1
+        else:
+            k = int(math.ceil(math.log(x) / self.GAMMA_LOG))
+            self.buckets[k] = self.buckets.get(k, 0) + 1
+
+    def merge(self, other):
+        if not other.n:
+            return self
+        if not self.n:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            self.lo, self.hi = other.lo, other.hi
+        else:
+            n = self.n + other.n
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.n * other.n / n
+            self.mean += delta * other.n / n
+            self.n = n
+            self.lo = min(self.lo, other.lo)
+            self.hi = max(self.hi, other.hi)
+        self.zeros += other.zeros
+        for k, v in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + v
+        return self
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def quantile(self, q):
+        """Approximate q-quantile (0..1), clamped to the observed min/max."""
+        if not self.n:
+            return 0.0
+        rank = q * (self.n - 1)
+        seen = self.zeros
+        if rank < seen:
+            return max(self.lo, 0)
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                # bucket k covers (gamma^(k-1), gamma^k]; report its midpoint
+                v = 2.0 * math.exp(k * self.GAMMA_LOG) / (1.0 + math.exp(self.GAMMA_LOG))
+                return min(self.hi, max(self.lo, v))
+        return self.hi
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "lo": self.lo, "hi": self.hi,
+                "zeros": self.zeros, "buckets": dict((str(k), v) for k, v in self.buckets.items())}
+
+    @classmethod
+    def from_dict(cls, d):
+        m = cls()
+        m.n, m.mean, m.m2 = d["n"], d["mean"], d["m2"]
+        m.lo, m.hi, m.zeros = d["lo"], d["hi"], d["zeros"]
+        m.buckets = dict((int(k), v) for k, v in d["buckets"].items())
+        return m
+
+SIM_METRICS = ("score", "level", "steps", "enemies_defeated", "damage_dealt", "damage_taken",
+               "potions_used", "superpotions_used", "antidotes_used", "best_streak")
+
+class SweepStats(object):
+    """
+    Per-difficulty run metrics, outcome counts and per-enemy battle stats.
+    Constant memory per (difficulty, enemy type); merge() combines workers.
+    """
+    def __init__(self):
+        self.runs = {}      # group -> {metric: Metric}
+        self.outcomes = {}  # group -> {outcome: count}
+        self.enemies = {}   # group -> {enemy: {"battles": {result: n}, "rounds": Metric, "damage_taken": Metric}}
+
+    def add_run(self, group, summary):
+        metrics = self.runs.setdefault(group, dict((m, Metric()) for m in SIM_METRICS))
+        for m in SIM_METRICS:
+            metrics[m].add(summary[m])
+        counts = self.outcomes.setdefault(group, {})
+        counts[summary["outcome"]] = counts.get(summary["outcome"], 0) + 1
+
+    def _enemy(self, group, name):
+        per = self.enemies.setdefault(group, {})
+        e = per.get(name)
+        if e is None:
+            e = per[name] = {"battles": {}, "rounds": Metric(), "damage_taken": Metric()}
+        return e
+
+    def add_battle(self, group, name, result, rounds, damage_taken):
+        e = self._enemy(group, name)
+        e["battles"][result] = e["battles"].get(result, 0) + 1
+        e["rounds"].add(rounds)
+        e["damage_taken"].add(damage_taken)
+
+    def merge(self, other):
+        for group, metrics in other.runs.items():
+            mine = self.runs.setdefault(group, dict((m, Metric()) for m in SIM_METRICS))
+            for m, metric in metrics.items():
+                mine[m].merge(metric)
+        for group, counts in other.outcomes.items():
+            mine = self.outcomes.setdefault(group, {})
+            for k, v in counts.items():
+                mine[k] = mine.get(k, 0) + v
+        for group, per in other.enemies.items():
+            for name, e in per.items():
+                mine = self._enemy(group, name)
+                for k, v in e["battles"].items():
+                    mine["battles"][k] = mine["battles"].get(k, 0) + v
+                mine["rounds"].merge(e["rounds"])
+                mine["damage_taken"].merge(e["damage_taken"])
+        return self
+
+    def to_dict(self):
+        return {
+            "runs": dict((g, dict((m, v.to_dict()) for m, v in ms.items())) for g, ms in self.runs.items()),
+            "outcomes": self.outcomes,
+            "enemies": dict((g, dict((n, {"battles": e["battles"], "rounds": e["rounds"].to_dict(),
+                                          "damage_taken": e["damage_taken"].to_dict()})
+                                     for n, e in per.items()))
+                            for g, per in self.enemies.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        st = cls()
+        for g, ms in d["runs"].items():
+            st.runs[g] = dict((m, Metric.from_dict(v)) for m, v in ms.items())
+        st.outcomes = dict((g, dict(c)) for g, c in d["outcomes"].items())
+        for g, per in d["enemies"].items():
+            for n, e in per.items():
+                mine = st._enemy(g, n)
+                mine["battles"] = dict(e["battles"])
+                mine["rounds"] = Metric.from_dict(e["rounds"])
+                mine["damage_taken"] = Metric.from_dict(e["damage_taken"])
+        return st
+
+    def report(self):
+        lines = []
+        for group in sorted(self.runs):
+            metrics = self.runs[group]
+            counts = self.outcomes.get(group, {})
+            total = sum(counts.values()) or 1
+            lines.append("== %s: %d runs  %s" % (group, total, "  ".join(
+                "%s %.1f%%" % (k, 100.0 * v / total) for k, v in sorted(counts.items()))))
+            lines.append("%-18s %9s %8s %8s %8s %8s %8s" % ("metric", "mean", "sd", "p50", "p90", "p99", "max"))
+            for m in SIM_METRICS:
+                x = metrics[m]
+                lines.append("%-18s %9.2f %8.2f %8.1f %8.1f %8.1f %8d" % (
+                    m, x.mean, x.variance() ** 0.5, x.quantile(0.5), x.quantile(0.9), x.quantile(0.99), x.hi))
+            per = self.enemies.get(group, {})
+            if per:
+                lines.append("%-12s %8s %6s %6s %6s %12s %14s" % (
+                    "enemy", "battles", "win%", "lose%", "esc%", "rounds p50", "dmg taken p90"))
+                for name in sorted(per):
+                    e = per[name]
+                    n = sum(e["battles"].values()) or 1
+                    lines.append("%-12s %8d %6.1f %6.1f %6.1f %12.1f %14.1f" % (
+                        name, n, 100.0 * e["battles"].get("win", 0) / n,
+                        100.0 * e["battles"].get("lose", 0) / n, 100.0 * e["battles"].get("escape", 0) / n,
+                        e["rounds"].quantile(0.5), e["damage_taken"].quantile(0.9)))
+            lines.append("")
+        return "\n".join(lines)
+
+class _SweepTap(object):
+    """TELEMETRY stand-in that feeds battle events straight into SweepStats."""
+    def __init__(self, stats, group):
+        self.stats = stats
+        self.group = group
+        self.taken = 0
+
+    def emit(self, kind, *values):
+        if kind == "battle_turn":
+            self.taken += values[2]
+        elif kind == "battle_end":
+            self.stats.add_battle(self.group, values[0], values[1], values[2], self.taken)
+            self.taken = 0
+        elif kind == "battle_start":
+            self.taken = 0
+
+    def close(self):
+        pass
+
+SIM_GROUPS = (("default", []), ("hard", ["--hard"]))
+
+def _sweep_chunk(job):
+    """
+    Worker: play `count` seeded headless games per difficulty; return
+    (SweepStats as a dict, leaderboard rows or []).
+    """
+    global TELEMETRY
+    seed0, count, argv, want_rows = job
+    stats = SweepStats()
+    rows = []
+    for group, extra in SIM_GROUPS:
+        tap = _SweepTap(stats, group)
+        flags = run_flags(parse_args(list(argv) + extra)) if want_rows else None
+        for seed in range(seed0, seed0 + count):
+            random.seed(seed)
+            TELEMETRY = tap
+            try:
+                summary = play_headless(list(argv) + extra)
+            finally:
+                TELEMETRY = None
+            stats.add_run(group, summary)
+            if want_rows:
+                rows.append(leaderboard_row(summary, seed, flags))
+    return stats.to_dict(), rows
+
+def run_sweep(games, workers=None, seed=0, argv=(), chunk=200, board=None):
+    """
+    Play `games` seeded games per difficulty, spread over worker processes.
+    Workers stream back compact partial aggregates that are merged here, so
+    memory does not grow with the number of games. With a Leaderboard every
+    run is also recorded (batched writes from this process only).
+    """
+    jobs = [(seed + start, min(chunk, games - start), tuple(argv), board is not None)
+            for start in range(0, games, chunk)]
+    total = SweepStats()
+    pool = None
+    if workers == 1 or len(jobs) == 1:
+        parts = (_sweep_chunk(job) for job in jobs)
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers or None)
+        parts = pool.imap_unordered(_tool_worker, [("_sweep_chunk", job) for job in jobs])
+    try:
+        for part, rows in parts:
+            total.merge(SweepStats.from_dict(part))
+            if board is not None:
+                board.add_rows(rows)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return total
+
+# ---------------- Seed search ----------------
+UNREACHABLE = 10 ** 9  # step count reported for objects the player cannot reach
+SEED_LAYOUT_METRICS = ("nearest_enemy", "enemy_steps", "item_steps")
+SEED_PLAY_METRICS = ("win", "steps", "score", "level")
+
+def parse_criteria(text):
+    """'enemy_steps<=50, nearest_enemy>5' -> [(name, op, value)], layout checks first."""
+    import operator
+    import re
+    ops = {"<=": operator.le, ">=": operator.ge, "<": operator.lt, ">": operator.gt,
+           "=": operator.eq, "==": operator.eq}
+    criteria = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        m = re.match(r"^\s*(\w+)\s*(<=|>=|==|=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$", part)
+        if not m or m.group(1) not in SEED_LAYOUT_METRICS + SEED_PLAY_METRICS:
+            raise ValueError("bad criterion %r (metrics: %s)" % (
+                part.strip(), ", ".join(SEED_LAYOUT_METRICS + SEED_PLAY_METRICS)))
+        criteria.append((m.group(1), ops[m.group(2)], float(m.group(3))))
+    # cheap layout checks first so most seeds are rejected before any playthrough
+    criteria.sort(key=lambda c: c[0] in SEED_PLAY_METRICS)
+    return criteria
+
+def start_distances(start, wrap):
+    """Player steps from `start` to every reachable cell of the classic map (BFS)."""
+    from collections import deque
+    dist = {tuple(start): 0}
+    queue = deque([tuple(start)])
+    while queue:
+        cell = queue.popleft()
+        d = dist[cell] + 1
+        for step in STEPS.values():
+            nxt = step_position(cell, step, wrap)
+            if nxt is None or obstacle_definition[nxt[POS_Y]][nxt[POS_X]] == "#":
+                continue
+            nxt = tuple(nxt)
+            if nxt not in dist:
+                dist[nxt] = d
+                queue.append(nxt)
+    return dist
+
+def game_argv(args):
+    """CLI flags that reproduce the map/difficulty setup of parsed args."""
+    argv = ["--enemies", str(args.enemies), "--potions", str(args.potions),
+            "--superpotions", str(args.superpotions), "--antidotes", str(args.antidotes),
+            "--coins", str(args.coins), "--mystery", str(args.mystery)]
+    if args.hard:
+        argv.append("--hard")
+    if args.no_wrap:
+        argv.append("--no-wrap")
+    if args.content:
+        argv += ["--content", args.content]
+    return argv
+
+def evaluate_seed(seed, counts, criteria, dist, argv):
+    """
+    Lay out `seed` exactly like a run started with --seed and check the
+    criteria in order; return the metrics dict, or None at the first failure.
+    """
+    global my_position
+    random.seed(seed)
+    seed_streams()  # as _run_game does, so the layout matches
+    my_position = [0, 1]
+    populate_with_retry(*counts)
+    metrics = {"seed": seed}
+    for name, op, value in criteria:
+        if name not in metrics:
+            if name == "nearest_enemy":
+                metrics[name] = min([abs(o["pos"][0] - my_position[0]) + abs(o["pos"][1] - my_position[1])
+                                     for o in map_objects if o["type"] == "enemy"] or [UNREACHABLE])
+            elif name in ("enemy_steps", "item_steps"):
+                want_enemy = name == "enemy_steps"
+                metrics[name] = max([dist.get(tuple(o["pos"]), UNREACHABLE) for o in map_objects
+                                     if (o["type"] == "enemy") == want_enemy] or [0])
+            else:
+                random.seed(seed)
+                summary = play_headless(argv)
+                metrics.update(win=int(summary["outcome"] == "win"), steps=summary["steps"],
+                               score=summary["score"], level=summary["level"])
+        if not op(metrics[name], value):
+            return None
+    return metrics
+
+def _seed_chunk(job):
+    """Worker: evaluate seeds [start, start + count); return the matches."""
+    start, count, argv, criteria_text = job
+    args = parse_args(list(argv))
+    ensure_map()
+    if args.content:
+        load_content(args.content)
+    apply_game_flags(args)  # as _run_game does: wrap, HP scale, active radius
+    criteria = parse_criteria(criteria_text)
+    counts = difficulty_counts(args)
+    dist = start_distances([0, 1], not args.no_wrap)
+    found = []
+    for seed in range(start, start + count):
+        metrics = evaluate_seed(seed, counts, criteria, dist, argv)
+        if metrics is not None:
+            found.append(metrics)
+    return found
+
+def find_seeds(count, criteria_text, argv=(), start=0, workers=None, limit=None, chunk=2000, out=None):
+    """
+    Scan seeds start .. start+count-1 in parallel and stream every match as a
+    JSON line to `out` as soon as its chunk finishes; stop after `limit` matches.
+    Returns the number of matches written.
+    """
+    import json
+    criteria = parse_criteria(criteria_text)  # fail fast on typos, before any worker starts
+    if any(name == "win" for name, _op, _v in criteria):
+        sys.stderr.write("warning: playthroughs use the demo policy, which quits after %d keys "
+                         "and rarely wins; win=1 may match no seed\n" % DEMO_STEPS)
+    out = out or sys.stdout
+    jobs = [(start + i, min(chunk, count - i), tuple(argv), criteria_text)
+            for i in range(0, count, chunk)]
+    pool = None
+    if workers == 1 or len(jobs) == 1:
+        parts = (_seed_chunk(job) for job in jobs)
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers or None)
+        parts = pool.imap_unordered(_tool_worker, [("_seed_chunk", job) for job in jobs])
+    matches = 0
+    try:
+        for found in parts:
+            for metrics in found:
+                out.write(json.dumps(metrics, sort_keys=True) + "\n")
+                matches += 1
+                if limit and matches >= limit:
+                    return matches
+            out.flush()
+    finally:
+        out.flush()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return matches
+
+# ---------------- Stress harness ----------------
+STRESS_KEYS = "wwwaaasssddddlnpur"  # map moves plus battle choices (read as letters by both)
+STRESS_GAME_KEYS = 2000             # keys per game; an exhausted stream quits the run
+STRESS_CHUNK = 40                   # games per worker job
+
+class InvariantError(AssertionError):
+    """A game-state invariant broke; `kind` groups failures while shrinking."""
+
+    def __init__(self, kind, message):
+        AssertionError.__init__(self, "%s: %s" % (kind, message))
+        self.kind = kind
+
+_XP_CURVE = {}
+
+def _xp_curve(lvl):
+    """xp_to_next and char_max_hp that add_xp() must have produced at level `lvl`."""
+    if lvl not in _XP_CURVE:
+        need = 100
+        for _ in range(lvl - 1):
+            need = int(round(need * 1.25))
+        _XP_CURVE[lvl] = (need, BASE_MAX_HP + 10 * (lvl - 1))
+    return _XP_CURVE[lvl]
+
+def check_invariants():
+    """Raise InvariantError unless objects, terrain, HP and XP bookkeeping are consistent."""
+    cells = set(tuple(o["pos"]) for o in map_objects)
+    if len(cells) != len(map_objects):
+        seen = set()
+        for o in map_objects:
+            p = tuple(o["pos"])
+            if p in seen:
+                raise InvariantError("overlap", "two objects on %d,%d" % p)
+            seen.add(p)
+    cells.add(tuple(my_position))
+    if WORLD is not None:
+        walls = [p for p in cells if WORLD.peek(p[0], p[1]) == "#"]
+    else:
+        grid = obstacle_definition
+        walls = [p for p in cells if grid[p[1]][p[0]] == "#"]
+    for x, y in walls:
+        what = [o.get("name", o["type"]) for o in map_objects if o["pos"] == [x, y]] or ["player"]
+        raise InvariantError("wall", "%s on a wall at %d,%d" % (what[0], x, y))
+    if not 0 <= current_hp <= char_max_hp:
+        raise InvariantError("hp", "HP %d outside [0, %d]" % (current_hp, char_max_hp))
+    if level < 1 or not 0 <= xp < xp_to_next:
+        raise InvariantError("xp", "level %d with XP %d/%d" % (level, xp, xp_to_next))
+    if (xp_to_next, char_max_hp) != _xp_curve(level):
+        raise InvariantError("xp", "level %d has xp_to_next %d, max HP %d; expected %d, %d"
+                             % ((level, xp_to_next, char_max_hp) + _xp_curve(level)))
+
+def stress_keys(seed, n=STRESS_GAME_KEYS):
+    """The random action stream of one stress game (a pure function of the seed)."""
+    rng = RngStreams(seed).split("input", 1)  # never overlaps the game's own streams
+    k = len(STRESS_KEYS)
+    return [STRESS_KEYS[int(rng.random() * k)] for _ in range(n)]
+
+def run_stress_case(seed, keys, argv=()):
+    """
+    Play one turbo headless game on scripted `keys` (moves and battle choices)
+    with check_invariants() before every turn. Returns (turns, keys used, error)
+    where error is None, an InvariantError, or whatever else the game raised.
+    """
+    global _REPLAY, STEP_HOOK
+    turns = [0]
+
+    def hook():
+        turns[0] += 1
+        check_invariants()
+    args = parse_args(["--turbo", "--quiet-title", "--headless"] + list(argv))
+    random.seed(seed)
+    _REPLAY = list(reversed(keys))
+    STEP_HOOK = hook
+    error = None
+    try:
+        main(args)
+        check_invariants()  # the final state too
+    except Exception as e:
+        error = e
+    finally:
+        used = len(keys) - len(_REPLAY)
+        _REPLAY = None
+        STEP_HOOK = None
+    return turns[0], used, error
+
+def _failure_kind(error):
+    return getattr(error, "kind", type(error).__name__)
+
+def shrink_failure(seed, keys, argv, error, budget=2000):
+    """Delta-debug `keys` to a short sequence that still fails the same way."""
+    kind = _failure_kind(error)
+    _, used, error = run_stress_case(seed, keys, argv)
+    keys = keys[:used]
+    chunk = len(keys) // 2
+    while chunk >= 1 and budget > 0:
+        i = 0
+        while i < len(keys) and budget > 0:
+            candidate = keys[:i] + keys[i + chunk:]
+            budget -= 1
+            _, used, err = run_stress_case(seed, candidate, argv)
+            if err is not None and _failure_kind(err) == kind:
+                keys, error = candidate[:used], err
+            else:
+                i += chunk
+        chunk //= 2
+    return keys, error
+
+def _stress_chunk(job):
+    """Worker: play games [start, start + count); stop at the first failure."""
+    start, count, argv = job
+    ensure_map()
+    turns = games = 0
+    for seed in range(start, start + count):
+        t, _, error = run_stress_case(seed, stress_keys(seed), argv)
+        turns += t
+        games += 1
+        if error is not None:
+            return turns, games, (seed, "%s" % error)
+    return turns, games, None
+
+def run_stress(steps, workers=None, start=0, argv=(), out=None):
+    """
+    Play seeded stress games (in parallel) until `steps` turns were checked or an
+    invariant breaks; a failure is shrunk and printed as a replay file body.
+    Returns True when no invariant broke.
+    """
+    out = out or sys.stdout
+    argv = tuple(argv)
+    t0 = _clock()
+    pool = None
+    if workers != 1:
+        import multiprocessing
+        workers = workers or multiprocessing.cpu_count()
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+    turns = games = 0
+    failure = None
+    seed = start
+    try:
+        while turns < steps and failure is None:
+            jobs = [(seed + i * STRESS_CHUNK, STRESS_CHUNK, argv) for i in range(max(1, workers or 1) * 2)]
+            seed += len(jobs) * STRESS_CHUNK
+            if pool:
+                parts = pool.imap(_tool_worker, [("_stress_chunk", j) for j in jobs])
+            else:
+                parts = (_stress_chunk(j) for j in jobs)
+            for t, g, fail in parts:
+                turns += t
+                games += g
+                if fail is not None and failure is None:
+                    failure = fail
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    elapsed = _clock() - t0
+    out.write("stress: %d turns in %d games, %.1f s (%d turns/s)\n"
+              % (turns, games, elapsed, turns / elapsed if elapsed else 0))
+    if failure is None:
+        out.write("all invariants held\n")
+        return True
+    fseed, message = failure
+    keys = stress_keys(fseed)
+    _, _, error = run_stress_case(fseed, keys, argv)
+    keys, error = shrink_failure(fseed, keys, argv, error)
+    out.write("FAILED seed %d: %s\nminimal input (%d keys), save as a --replay file:\n# seed %d\n%s\n"
+              % (fseed, error, len(keys), fseed, "\n".join(keys)))
+    return False
+
+# ---------------- Difficulty tuner ----------------
+TUNE_SPACE = {
+    "enemies": list(range(3, 11)),
+    "potions": list(range(0, 7)),
+    "superpotions": list(range(0, 4)),
+    "antidotes": list(range(0, 4)),
+    "hp_scale": [0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4],
+}
+
+TUNE_DEMO_STEPS = 2000  # long enough that demo runs end in a win or a loss, not the key cap
+TUNE_TIER_FLAGS = {"hard": ["--hard"]}  # difficulty flags a tier is tuned and played with
+
+def _tune_argv(config):
+    return ["--enemies", str(config["enemies"]), "--potions", str(config["potions"]),
+            "--superpotions", str(config["superpotions"]), "--antidotes", str(config["antidotes"]),
+            "--hp-scale", repr(config["hp_scale"]), "--demo-steps", str(TUNE_DEMO_STEPS)]
+
+def _tune_eval(job):
+    """Worker: (config index, argv, seeds) -> (index, runs won or survived to the cap, runs)."""
+    idx, argv, seeds = job
+    survived = 0
+    for seed in seeds:
+        random.seed(seed)
+        survived += play_headless(argv)["outcome"] != "lose"
+    return idx, survived, len(seeds)
+
+def tune_tier(target, configs, pool=None, games=8, eta=3, seed=0, argv=()):
+    """
+    Successive halving: every config plays `games` seeded headless runs with
+    the tier's `argv` (the same seeds for all, so they are compared on equal
+    maps); the 1/eta closest to the target survival rate stay and get eta
+    times more runs, until one is left. Returns (config, survival rate, runs
+    played for it).
+    """
+    alive = list(range(len(configs)))
+    stats = dict((i, [0, 0]) for i in alive)  # index -> [survived, runs]
+    played = 0
+    while True:
+        jobs = [(i, list(argv) + _tune_argv(configs[i]), range(seed + played, seed + played + games))
+                for i in alive]
+        results = pool.map(_tool_worker, [("_tune_eval", j) for j in jobs]) if pool is not None else [_tune_eval(j) for j in jobs]
+        for i, survived, runs in results:
+            stats[i][0] += survived
+            stats[i][1] += runs
+        played += games
+        rank = sorted(alive, key=lambda i: (abs(float(stats[i][0]) / stats[i][1] - target), i))
+        if len(alive) == 1:
+            best = rank[0]
+            return configs[best], float(stats[best][0]) / stats[best][1], stats[best][1]
+        alive = rank[:max(1, len(alive) // eta)]
+        games *= eta
+
+def run_tuner(targets=TUNE_TARGETS, candidates=27, games=8, seed=0, workers=None, out_path="preset.json",
+              argv=()):
+    """
+    Tune every tier in `targets` ('tier=rate,...') and write a --preset file.
+    `argv` (game flags such as --no-wrap) applies to every tier, and a tier
+    named in TUNE_TIER_FLAGS adds its difficulty flags on top.
+    """
+    import json
+    rng = random.Random(seed)
+    configs = [{"enemies": DEFAULT_NUM_ENEMIES, "potions": DEFAULT_NUM_POTIONS,
+                "superpotions": DEFAULT_NUM_SUPERPOTIONS, "antidotes": DEFAULT_NUM_ANTIDOTES,
+                "hp_scale": 1.0}]
+    while len(configs) < candidates:
+        configs.append(dict((k, rng.choice(TUNE_SPACE[k])) for k in TUNE_KNOBS))
+    pool = None
+    if workers != 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers or None)
+    tiers = {}
+    try:
+        for part in targets.split(","):
+            name, rate = part.split("=")
+            name = name.strip()
+            flags = list(argv) + TUNE_TIER_FLAGS.get(name, [])
+            t0 = _clock()
+            config, measured, runs = tune_tier(float(rate), configs, pool, games, seed=seed, argv=flags)
+            tiers[name] = dict(config, target=float(rate), survival=round(measured, 3), runs=runs,
+                               hard="--hard" in flags, wrap="--no-wrap" not in flags)
+            sys.stdout.write("%-8s target %.2f  survival %.3f over %d runs  %s  (%.1f s)\n" % (
+                name, float(rate), measured, runs,
+                " ".join("%s=%s" % (k, config[k]) for k in TUNE_KNOBS), _clock() - t0))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    with open(out_path, "w") as fh:
+        json.dump({"tiers": tiers, "metric": "survival", "demo_steps": TUNE_DEMO_STEPS}, fh,
+                  indent=2, sort_keys=True)
+        fh.write("\n")
+    return tiers
+
+# ---------------- Leaderboard ----------------
+LEADERBOARD_DB = "pokemaze.db"
+RUN_FLAGS = ("difficulty", "wrap", "open_world", "enemies", "potions", "superpotions",
+             "antidotes", "coins", "mystery")
+RUN_FIELDS = ("outcome", "score", "level", "xp", "steps", "enemies_defeated", "damage_dealt",
+              "damage_taken", "potions_used", "superpotions_used", "antidotes_used", "best_streak")
+
+def run_flags(args):
+    """The leaderboard flag columns for parsed CLI args."""
+    return {
+        "difficulty": "hard" if args.hard else "normal",
+        "wrap": int(not args.no_wrap),
+        "open_world": int(bool(args.open_world)),
+        "enemies": args.enemies,
+        "potions": args.potions,
+        "superpotions": args.superpotions,
+        "antidotes": args.antidotes,
+        "coins": args.coins,
+        "mystery": args.mystery,
+    }
+
+def leaderboard_row(summary, seed, flags):
+    """Flat row tuple in the `runs` column order (after the id)."""
+    return ((time.time(), seed) + tuple(flags[k] for k in RUN_FLAGS) +
+            tuple(summary[k] for k in RUN_FIELDS))
+
+class Leaderboard(object):
+    """
+    Local SQLite store of finished runs. Rows are queued and written in one
+    transaction per `batch`, and (difficulty, score) / (seed, score) indexes
+    keep top-K queries at a few index pages however many rows there are.
+    """
+
+    COLUMNS = ("ts", "seed") + RUN_FLAGS + RUN_FIELDS
+
+    def __init__(self, path=LEADERBOARD_DB, batch=1000):
+        import sqlite3
+        self.conn = sqlite3.connect(path)
+        self.batch = batch
+        self.pending = []
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        text = ("difficulty", "outcome")
+        cols = ", ".join("%s %s" % (k, "TEXT" if k in text else "REAL" if k == "ts" else "INTEGER")
+                         for k in self.COLUMNS)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, %s)" % cols)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS runs_difficulty_score "
+                              "ON runs (difficulty, score DESC)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS runs_seed_score ON runs (seed, score DESC)")
+        self._insert = "INSERT INTO runs (%s) VALUES (%s)" % (
+            ", ".join(self.COLUMNS), ", ".join("?" * len(self.COLUMNS)))
+
+    def add(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        if self.pending:
+            with self.conn:
+                self.conn.executemany(self._insert, self.pending)
+            self.pending = []
+
+    def top(self, k=10, difficulty=None, seed=None):
+        """Best `k` runs by score as dicts, for one difficulty or one seed."""
+        self.flush()
+        cols = ("id",) + self.COLUMNS
+        sql = "SELECT %s FROM runs" % ", ".join(cols)
+        if seed is not None:
+            sql += " WHERE seed = ?"
+            params = (seed,)
+        elif difficulty is not None:
+            sql += " WHERE difficulty = ?"
+            params = (difficulty,)
+        else:
+            params = ()
+        rows = self.conn.execute(sql + " ORDER BY score DESC, id LIMIT ?", params + (k,))
+        return [dict(zip(cols, r)) for r in rows]
+
+    def difficulties(self):
+        self.flush()
+        # walks the (difficulty, score) index: one skip-scan step per value
+        found = []
+        row = self.conn.execute("SELECT MIN(difficulty) FROM runs").fetchone()
+        while row and row[0] is not None:
+            found.append(row[0])
+            row = self.conn.execute("SELECT MIN(difficulty) FROM runs WHERE difficulty > ?",
+                                    (row[0],)).fetchone()
+        return found
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+def show_leaderboard(path, k=10, seed=None):
+    """Print the top `k` runs per difficulty (or for one seed) and the query time."""
+    board = Leaderboard(path)
+    try:
+        t0 = _clock()
+        if seed is not None:
+            tables = [("seed %d" % seed, board.top(k, seed=seed))]
+        else:
+            tables = [(d, board.top(k, difficulty=d)) for d in board.difficulties()]
+        elapsed = _clock() - t0
+    finally:
+        board.close()
+    lines = []
+    for title, rows in tables:
+        lines.append("=== TOP %d: %s ===" % (k, title))
+        lines.append("%4s  %6s  %3s  %5s  %4s  %-7s  %-6s  %s" % (
+            "#", "score", "lvl", "steps", "foes", "outcome", "diff", "seed"))
+        for rank, r in enumerate(rows, 1):
+            lines.append("%4d  %6d  %3d  %5d  %4d  %-7s  %-6s  %s" % (
+                rank, r["score"], r["level"], r["steps"], r["enemies_defeated"],
+                r["outcome"], r["difficulty"], "-" if r["seed"] is None else r["seed"]))
+    if not tables:
+        lines.append("No runs recorded in %s yet (play with --db %s)." % (path, path))
+    lines.append("(query %.2f ms)" % ((elapsed) * 1e3))
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def bench_leaderboard(rows=100000, batch=1000):
+    """Insert throughput and top-K latency for a temporary leaderboard."""
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        board = Leaderboard(path, batch=batch)
+        flags = {"difficulty": "normal", "wrap": 1, "open_world": 0, "enemies": 6, "potions": 4,
+                 "superpotions": 2, "antidotes": 2, "coins": 8, "mystery": 4}
+        summary = run_summary("win")
+        rng = random.Random(1)
+        t0 = _clock()
+        for i in range(rows):
+            summary["score"] = rng.randrange(500)
+            flags["difficulty"] = "hard" if i & 1 else "normal"
+            board.add(leaderboard_row(summary, i % 1000, flags))
+        board.flush()
+        insert = _clock() - t0
+        per_query, _loops = _time_call(lambda: board.top(10, difficulty="hard"))
+        per_seed, _loops = _time_call(lambda: board.top(10, seed=7))
+        board.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return {"bench": "leaderboard", "rows": rows, "batch": batch,
+            "rows_per_s": int(rows / insert), "top10_difficulty_us": round(per_query * 1e6, 3),
+            "top10_seed_us": round(per_seed * 1e6, 3)}
+
+# ---------------- Tests (kept intentionally similar) ----------------
+# Defined on demand so a normal launch never imports unittest.
+
+def _game_tests():
+    import unittest
+
+    class GameTests(unittest.TestCase):
+        def setUp(self):
+            global ENABLE_COLOR, DEMO_MODE, QUIET, _DEMO_STEP_COUNT
+            ensure_map()
+            ENABLE_COLOR = False
+            DEMO_MODE = True
+            QUIET = True
+            _DEMO_STEP_COUNT = 0
+            random.seed(1234)
+            seed_streams()
+
+        def test_draw_bar_bounds(self):
+            self.assertIn("(0/100)", draw_bar(0, 100))
+            self.assertIn("(100/100)", draw_bar(150, 100))
+            self.assertIn("(0/100)", draw_bar(-10, 100))
+
+        def test_map_rectangular(self):
+            for y in range(MAP_HEIGHT):
+                self.assertEqual(len(obstacle_definition[y]), MAP_WIDTH)
+
+        def test_free_cell(self):
+            map_objects[:] = []
+            map_objects.append({"type": "potion", "heal": 25, "pos": [1, 1]})
+            for _ in range(20):
+                x, y = random_free_cell()
+                self.assertNotEqual([x, y], my_position)
+                self.assertTrue(obstacle_definition[y][x] != "#")
+                self.assertTrue(all(o["pos"] != [x, y] for o in map_objects))
+
+        def test_populate_counts(self):
+            map_objects[:] = []
+            # Use original signature subset to preserve expectations; extras default to 0
+            populate_map(5, 2, 1, 1, 0, 0)
+            enemies = [o for o in map_objects if o["type"] == "enemy"]
+            pots = [o for o in map_objects if o["type"] == "potion"]
+            sups = [o for o in map_objects if o["type"] == "superpotion"]
+            ants = [o for o in map_objects if o["type"] == "antidote"]
+            self.assertEqual(len(enemies), 5)
+            self.assertEqual(len(pots), 2)
+            self.assertEqual(len(sups), 1)
+            self.assertEqual(len(ants), 1)
+            positions = [tuple(o["pos"]) for o in map_objects]
+            self.assertEqual(len(positions), len(set(positions)))
+
+        def test_enemy_turn_damage_range(self):
+            e = {"name": "Machop", "hp": 100, "pos": [5, 5], "type": "enemy"}
+            zeros = 0
+            normals = 0
+            for _ in range(60):
+                dmg, eff, _msg = enemy_turn(e)
+                self.assertTrue(dmg >= 0)
+                if dmg == 0:
+                    zeros += 1
+                if dmg >= 10:
+                    normals += 1
+            self.assertTrue(zeros >= 1)
+            self.assertTrue(normals >= 1)
+
+        def test_demo_key_valid(self):
+            ks = set()
+            for _ in range(20):
+                ks.add(read_key())
+            self.assertTrue(ks.issubset({'w', 'a', 's', 'd', 'q'}))
+
+        def test_antidote_usage(self):
+            global player_poisoned, inventory, current_hp
+            inventory["antidote"] = 1
+            player_poisoned = True
+            before = current_hp
+            used = use_item("antidote")
+            self.assertTrue(used)
+            self.assertFalse(player_poisoned)
+            self.assertEqual(current_hp, before)
+
+        def test_logger_defers_formatting(self):
+            global QUIET
+            calls = []
+
+            def render():
+                calls.append(1)
+                return "rendered"
+
+            saved = LOGGER.sinks
+            QUIET = False
+            try:
+                LOGGER.set_sinks([NullSink()])
+                log("x", Lazy(render))
+                logf("%s", Lazy(render))
+                flush_log()
+                self.assertEqual(calls, [])
+                ring = RingSink(4)
+                LOGGER.set_sinks([ring])
+                log("x", Lazy(render))
+                log_at(DEBUG, "hidden %d", 1)
+                out("screen only")
+                self.assertEqual(calls, [])
+                flush_log()
+                self.assertEqual(list(ring.lines), ["x rendered"])
+            finally:
+                QUIET = True
+                LOGGER.set_sinks(saved)
+
+        def test_replay_feeds_recorded_inputs(self):
+            global _REPLAY
+            import tempfile
+            fd, path = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                with open(path, "w") as fh:
+                    fh.write("# seed 42\nd\nA\ns\n")
+                self.assertEqual(load_replay(path), 42)
+                self.assertTrue(scripted_input())
+                self.assertEqual(read_key(), "d")
+                self.assertEqual(safe_input("> "), "A")
+                self.assertEqual(read_key(), "s")
+                self.assertEqual(read_key(), "q")  # exhausted replay quits
+            finally:
+                _REPLAY = None
+                os.remove(path)
+
+        def test_profiler_percentiles(self):
+            prof = PhaseProfiler()
+            prof.samples["draw"] = [i / 1000.0 for i in range(1, 101)]
+            prof.samples["custom"] = [0.5]
+            st = prof.stats()
+            self.assertEqual(prof.phases(), ["draw", "custom"])
+            self.assertEqual(st["draw"]["count"], 100)
+            self.assertAlmostEqual(st["draw"]["p50_ms"], 51.0, places=6)
+            self.assertAlmostEqual(st["draw"]["p99_ms"], 99.0, places=6)
+            self.assertEqual(st["custom"]["histogram"][">=100ms"], 1)
+
+        def test_bench_emits_json_lines(self):
+            import json
+            import tempfile
+            fd, path = tempfile.mkstemp()
+            os.close(fd)
+            saved_stdout = sys.stdout
+            sys.stdout = _NullStream()
+            try:
+                run_benchmarks(sizes=[(30, 15), (40, 20)], entity_counts=[4],
+                               only=["roll_damage", "draw_map"], out_path=path, min_time=0.001)
+            finally:
+                sys.stdout = saved_stdout
+            with open(path) as fh:
+                recs = [json.loads(line) for line in fh]
+            os.remove(path)
+            self.assertEqual((recs[0]["bench"], recs[0]["suite"]), ("meta", "quick"))
+            self.assertEqual(sorted((r["bench"], r["width"]) for r in recs[1:]),
+                             [("draw_map", 30), ("draw_map", 40), ("roll_damage", 30), ("roll_damage", 40)])
+            self.assertTrue(all(r["us_per_call"] > 0 for r in recs[1:]))
+            self.assertEqual(MAP_WIDTH, build_map(ASCII_MAP)[1])
+
+        def test_generate_map_shape(self):
+            grid = generate_map(50, 20, rng=random.Random(7))
+            self.assertEqual(len(grid), 20)
+            self.assertTrue(all(len(row) == 50 for row in grid))
+            self.assertEqual(grid[1][0], " ")
+            self.assertEqual(grid, generate_map(50, 20, rng=random.Random(7)))
+
+        def test_telemetry_jsonl_batches(self):
+            import json
+            import tempfile
+            fd, path = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                for threaded in (False, True):
+                    open(path, "w").close()
+                    bus = EventBus(path, capacity=4, threaded=threaded)
+                    for i in range(10):
+                        bus.emit("step", i + 1, i, 1)
+                    bus.emit("weather", "Fog", 9)
+                    bus.close()
+                    with open(path) as fh:
+                        recs = [json.loads(line) for line in fh]
+                    self.assertEqual([r["seq"] for r in recs], list(range(11)))
+                    self.assertEqual(recs[3]["steps"], 4)
+                    self.assertEqual(recs[-1]["ev"], "weather")
+                    self.assertEqual(recs[-1]["state"], "Fog")
+            finally:
+                os.remove(path)
+
+        def test_weather_expiry_emits_event(self):
+            global TELEMETRY
+            import json
+            import tempfile
+            fd, path = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                TELEMETRY = EventBus(path)
+                set_weather("Rain", 2)
+                tick_weather()
+                tick_weather()
+                stop_telemetry()
+                with open(path) as fh:
+                    recs = [json.loads(line) for line in fh]
+                self.assertEqual([(r["state"], r["turns"]) for r in recs], [("Rain", 2), ("Clear", 0)])
+                self.assertEqual(weather["state"], "Clear")
+            finally:
+                TELEMETRY = None
+                os.remove(path)
+
+        def test_rng_streams_independent(self):
+            a, b = RngStreams(7), RngStreams(7)
+            self.assertEqual(a.ai.random(), b.ai.random())
+            for _ in range(100):
+                a.battle.random()  # extra battle rolls must not shift roaming
+            self.assertEqual([a.ai.random() for _ in range(5)], [b.ai.random() for _ in range(5)])
+            self.assertNotEqual(a.split("ai", 1).random(), a.split("ai", 2).random())
+            self.assertEqual(a.split("ai", 3).random(), b.split("ai", 3).random())
+            state = a.getstate()
+            rolls = [a.weather.random(), a.map.random()]
+            a.setstate(state)
+            self.assertEqual([a.weather.random(), a.map.random()], rolls)
+            summaries = []
+            for _ in range(2):
+                random.seed(21)
+                summaries.append(play_headless())
+            self.assertEqual(summaries[0], summaries[1])
+
+        def test_headless_run_summary(self):
+            global QUIET
+            random.seed(5)
+            try:
+                summary = play_headless()
+            finally:
+                QUIET = True
+            self.assertIn(summary["outcome"], ("win", "lose", "quit"))
+            self.assertEqual(summary["steps"], steps_taken)
+            self.assertTrue(summary["steps"] > 0)
+
+        def test_metric_merge_matches_single_stream(self):
+            values = [random.randint(0, 500) for _ in range(1000)]
+            whole, left, right = Metric(), Metric(), Metric()
+            for i, v in enumerate(values):
+                whole.add(v)
+                (left if i % 3 else right).add(v)
+            merged = Metric.from_dict(left.to_dict()).merge(right)
+            self.assertEqual(merged.n, 1000)
+            self.assertAlmostEqual(merged.mean, sum(values) / 1000.0, places=6)
+            self.assertAlmostEqual(merged.variance(), whole.variance(), places=6)
+            exact = sorted(values)[499]
+            self.assertTrue(abs(merged.quantile(0.5) - exact) <= 0.05 * exact + 1)
+            self.assertEqual(merged.quantile(1.0), max(values))
+
+        def test_sweep_stats_merge(self):
+            a, b = SweepStats(), SweepStats()
+            summary = dict((m, 1) for m in SIM_METRICS)
+            summary["outcome"] = "win"
+            a.add_run("default", summary)
+            b.add_run("default", dict(summary, outcome="lose"))
+            b.add_battle("default", "Zubat", "win", 4, 12)
+            total = SweepStats.from_dict(a.to_dict()).merge(SweepStats.from_dict(b.to_dict()))
+            self.assertEqual(total.outcomes["default"], {"win": 1, "lose": 1})
+            self.assertEqual(total.runs["default"]["score"].n, 2)
+            self.assertEqual(total.enemies["default"]["Zubat"]["battles"], {"win": 1})
+            self.assertIn("Zubat", total.report())
+
+        def test_import_is_lazy(self):
+            import subprocess
+            here = os.path.dirname(os.path.abspath(__file__))
+            code = ("import sys; sys.path.insert(0, %r); import PokeMaze; "
+                    "sys.stdout.write('%%s %%s' %% ([m for m in ('argparse', 'unittest', 'json') "
+                    "if m in sys.modules], PokeMaze.obstacle_definition is None))" % here)
+            output = subprocess.check_output([sys.executable, "-c", code]).decode("utf-8").strip()
+            self.assertEqual(output, "[] True")
+
+        def test_content_tables_match_defaults(self):
+            saved = content_dict()
+            try:
+                apply_content(saved)
+                for name, spec in ENEMIES.items():
+                    eid = ENEMY_ID[name]
+                    self.assertEqual(ENEMY_HP[eid], spec["hp"])
+                    start = ENEMY_ATK_START[eid]
+                    self.assertEqual([ATK_BASE[start + i] for i in range(ENEMY_ATK_COUNT[eid])],
+                                     [base for _n, base, _p in spec["attacks"]])
+                self.assertEqual(ENEMY_NAMES[BOSS_ID], "Boss Onix")
+                self.assertNotIn(BOSS_ID, SPAWN_IDS)
+                self.assertEqual(ITEM_HEAL["superpotion"], 50)
+            finally:
+                apply_content(saved)
+
+        def test_content_validation_rejects_bad_data(self):
+            bad = content_dict()
+            bad["enemies"]["Zubat"]["hp"] = 0
+            bad["spawn"].append(["Missingno", 1])
+            with self.assertRaises(ValueError) as ctx:
+                apply_content(bad)
+            self.assertIn("enemies.Zubat.hp", str(ctx.exception))
+            self.assertIn("Missingno", str(ctx.exception))
+            self.assertEqual(ENEMY_HP[ENEMY_ID["Zubat"]], ENEMIES["Zubat"]["hp"])
+
+        def test_content_validation_rejects_wrong_types(self):
+            bad = content_dict()
+            bad["spawn"] = [["Zubat", "heavy"], "Machop", [["Onix"], 1]]
+            bad["enemies"]["Zubat"]["attacks"][0]["miss"] = "often"
+            bad["enemies"]["Zubat"]["hp"] = True
+            bad["mystery_spawns"] = 3
+            bad["boss"] = ["Onix"]
+            bad["items"] = {"potion": 25, "superpotion": {"heal": "lots"}}
+            with self.assertRaises(ValueError) as ctx:
+                apply_content(bad)
+            msg = str(ctx.exception)
+            for part in ("spawn: weight", "spawn[1]", "unknown enemy [", "attacks[0].miss",
+                         "Zubat.hp", "mystery_spawns", "boss", "items.potion", "items.superpotion"):
+                self.assertIn(part, msg)
+            for data in ([], {"enemies": {"Zubat": {"hp": 1, "attacks": [{"name": "Bite"}]}},
+                              "spawn": [["Zubat", 1]], "boss": "Zubat", "items": []}):
+                self.assertRaises(ValueError, validate_content, data)
+            validate_content(content_dict())  # the built-in content still passes
+
+        def test_open_world_memory_bounded(self):
+            global WORLD, my_position
+            saved_pos = my_position
+            WORLD = ChunkWorld(7, (2, 1, 0, 0, 1, 0), capacity=12)
+            try:
+                map_objects[:] = []
+                my_position = [0, 0]
+                WORLD.focus(0, 0)
+                home = [dict(o) for o in map_objects if o["chunk"] == (0, 0)]
+                remove_object([o for o in map_objects if o["chunk"] == (0, 0)][0])
+                for x in range(0, 40 * CHUNK_SIZE, 4):
+                    WORLD.focus(x, x // 3)
+                    move_enemies()
+                    self.assertTrue(len(WORLD.chunks) <= 12)
+                    self.assertTrue(len(map_objects) <= 12 * 4)
+                self.assertTrue(WORLD.evicted > 0)
+                WORLD.focus(0, 0)  # revisit: regenerated from the seed + diff
+                back = sorted(o["idx"] for o in map_objects if o["chunk"] == (0, 0))
+                self.assertEqual(back, sorted(o["idx"] for o in home)[1:])
+                self.assertEqual(WORLD.generate(3, -2), ChunkWorld(7, (2, 1, 0, 0, 1, 0)).generate(3, -2))
+            finally:
+                WORLD = None
+                my_position = saved_pos
+
+        def test_open_world_evicts_by_position(self):
+            global WORLD
+            WORLD = ChunkWorld(7, (2, 1, 0, 0, 1, 0), capacity=9)
+            try:
+                map_objects[:] = []
+                WORLD.focus(0, 0)
+                n = len(map_objects)
+                far = (50, 50)
+                self.assertEqual(WORLD.cell(far[0] * CHUNK_SIZE, far[1] * CHUNK_SIZE),
+                                 WORLD.generate(far[0], far[1])[0][0][0])
+                self.assertEqual((len(WORLD.chunks), len(map_objects)), (9, n))  # cell() never loads
+                self.assertFalse(far in WORLD.chunks)
+                wanderer = [o for o in map_objects if o["type"] == "enemy" and o["chunk"] == (-1, 0)][0]
+                wanderer["pos"] = [CHUNK_SIZE - 1, 3]  # walked into chunk (0, 0)
+                WORLD.focus(CHUNK_SIZE + 1, 0)  # (-1, *) chunks drop out
+                self.assertFalse((-1, 0) in WORLD.chunks)
+                self.assertTrue(wanderer in map_objects)  # still stands in a resident chunk
+                WORLD.focus(0, 0)  # (-1, 0) reloads around the live enemy
+                clones = [o for o in map_objects if (o["chunk"], o["idx"]) == (wanderer["chunk"], wanderer["idx"])]
+                self.assertEqual(clones, [wanderer])
+            finally:
+                WORLD = None
+
+        def test_open_world_headless_run(self):
+            global QUIET, WORLD, my_position
+            random.seed(11)
+            try:
+                summary = play_headless(["--open-world"])
+            finally:
+                QUIET = True
+                WORLD = None
+                my_position = [0, 1]
+            self.assertIn(summary["outcome"], ("win", "lose", "quit"))
+            self.assertTrue(summary["steps"] > 0)
+
+        def test_fov_shadowcasting_and_cache(self):
+            global FOG
+            grid = [list("       ") for _ in range(5)]
+            grid[2][3] = "#"
+            use_map(grid)
+            FOG = FieldOfView(8)
+            try:
+                vis = FOG.visible([1, 2])
+                self.assertIn((3, 2), vis)
+                self.assertIn((6, 0), vis)
+                self.assertNotIn((5, 2), vis)
+                self.assertTrue(FOG.visible([1, 2]) is vis)
+                self.assertEqual((FOG.hits, FOG.misses), (1, 1))
+                set_cell(3, 2, " ")
+                self.assertIn((5, 2), FOG.visible([1, 2]))
+                self.assertEqual(FOG.misses, 2)
+                self.assertTrue(vis <= FOG.seen)
+            finally:
+                FOG = None
+                use_map(build_map(ASCII_MAP)[0])
+
+        def test_scheduler_moves_only_nearby_enemies(self):
+            global my_position
+            saved_pos = my_position
+            try:
+                use_map(generate_map(200, 100, rng=random.Random(3)))
+                my_position = [0, 1]
+                populate_map(400, 0, 0, 0, 0, 0)
+                before = [list(o["pos"]) for o in map_objects]
+                for _ in range(5):
+                    move_enemies()
+                    cells = [tuple(o["pos"]) for o in map_objects]
+                    self.assertEqual(len(cells), len(set(cells)))
+                r = ENEMY_SCHEDULER.radius + 5
+                for o, old in zip(map_objects, before):
+                    if max(abs(old[0]), abs(old[1] - 1)) > r:
+                        self.assertEqual(o["pos"], old)
+                    self.assertNotEqual(obstacle_definition[o["pos"][1]][o["pos"][0]], "#")
+                self.assertTrue(0 < ENEMY_SCHEDULER.active < 400)
+            finally:
+                my_position = saved_pos
+                use_map(build_map(ASCII_MAP)[0])
+                map_objects[:] = []
+
+        def test_leaderboard_batches_and_ranks(self):
+            board = Leaderboard(":memory:", batch=4)
+            flags = run_flags(parse_args(["--hard"]))
+            summary = run_summary("win")
+            for score in (5, 40, 15, 30, 25):
+                summary["score"] = score
+                board.add(leaderboard_row(summary, score % 2, flags))
+            self.assertEqual(len(board.pending), 1)  # 4 written in one transaction
+            top = board.top(3, difficulty="hard")
+            self.assertEqual([r["score"] for r in top], [40, 30, 25])
+            self.assertEqual([r["score"] for r in board.top(5, seed=1)], [25, 15, 5])
+            self.assertEqual(board.difficulties(), ["hard"])
+            plan = " ".join(str(r) for r in board.conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM runs WHERE seed = 1 ORDER BY score DESC LIMIT 3"))
+            self.assertIn("runs_seed_score", plan)
+            board.close()
+
+        def test_find_seeds_streams_matches(self):
+            global QUIET
+            import json
+            out = _CaptureStream()
+            try:
+                n = find_seeds(40, "steps<150, nearest_enemy>6", argv=["--enemies", "2"], workers=1, out=out)
+            finally:
+                QUIET = True
+            lines = out.getvalue().splitlines()
+            self.assertTrue(n > 0)
+            self.assertEqual(n, len(lines))
+            args = parse_args(["--enemies", "2"])
+            dist = start_distances([0, 1], True)
+            for rec in map(json.loads, lines):
+                self.assertTrue(rec["nearest_enemy"] > 6 and rec["steps"] < 150)
+                again = evaluate_seed(rec["seed"], difficulty_counts(args),
+                                      parse_criteria("nearest_enemy>6"), dist, [])
+                self.assertEqual(again["nearest_enemy"], rec["nearest_enemy"])
+            self.assertEqual([c[0] for c in parse_criteria("steps<9,enemy_steps<=5")], ["enemy_steps", "steps"])
+            self.assertRaises(ValueError, parse_criteria, "bogus>1")
+
+        def test_tuner_halves_and_preset_loads(self):
+            global QUIET, HP_SCALE
+            import json
+            import tempfile
+            configs = [dict(enemies=e, potions=0, superpotions=0, antidotes=0, hp_scale=h)
+                       for e, h in ((1, 0.6), (9, 1.4), (3, 1.0))]
+            try:
+                config, rate, runs = tune_tier(1.0, configs, games=2)
+            finally:
+                QUIET = True
+                HP_SCALE = 1.0
+            self.assertEqual(runs, 2 + 6)  # 3 configs -> 1 survivor played 3x more
+            self.assertEqual(config["enemies"], 1)
+            fd, path = tempfile.mkstemp(suffix=".json")
+            os.close(fd)
+            try:
+                with open(path, "w") as fh:
+                    json.dump({"tiers": {"hard": dict(config, enemies=5, target=1.0, hard=True, wrap=False)}}, fh)
+                args = parse_args(["--preset", path, "--tier", "hard"])
+                apply_preset(args)
+                self.assertEqual((args.enemies, args.hp_scale), (5, 0.6))
+                self.assertTrue(args.hard and args.no_wrap)  # the tier's own difficulty flags
+                self.assertEqual(difficulty_counts(args)[0], 6)  # played like the tuned runs
+            finally:
+                os.remove(path)
+
+        def test_placement_stays_in_player_region(self):
+            global my_position, MAP_WRAP
+            grid = [list("   #   "), list("   #   "), list("   #   ")]
+            use_map(grid)
+            my_position = [0, 1]
+            try:
+                MAP_WRAP = False
+                labels, cells = map_components(False)
+                self.assertEqual(len(cells), 2)
+                self.assertTrue(map_components(False)[1] is cells)  # cached
+                populate_map(3, 1, 0, 0, 3, 0)
+                self.assertTrue(all(o["pos"][0] < 3 for o in map_objects))
+                map_objects[:] = []
+                for _ in range(10):
+                    self.assertTrue(random_free_cell()[0] < 3)
+                set_cell(3, 1, " ")  # opening the wall merges the regions
+                self.assertEqual(len(map_components(False)[1]), 1)
+                MAP_WRAP = True  # wrapping edges connect both sides too
+                set_cell(3, 1, "#")
+                self.assertEqual(len(map_components(True)[1]), 1)
+            finally:
+                MAP_WRAP = True
+                my_position = [0, 1]
+                map_objects[:] = []
+                use_map(build_map(ASCII_MAP)[0])
+
+        def test_turn_scheduler_speeds_and_idle_poison(self):
+            global move_enemies, player_poisoned
+            calls = []
+            real_move, saved = move_enemies, content_dict()
+            move_enemies = lambda eids=None: calls.append(
+                None if eids is None else frozenset(ENEMY_NAMES[e] for e in eids))
+            try:
+                turns = new_turn_scheduler()  # built-in content: one class, no walking poison
+                idle = len(turns.heap)
+                player_poisoned = True
+                for _ in range(4):
+                    end_of_step(turns)
+                self.assertEqual(calls, [None] * 4)
+                self.assertEqual(len(turns.heap), idle)
+                player_poisoned = False
+                fast = content_dict()
+                fast["enemies"]["Zubat"]["speed"] = 2.0
+                fast["enemies"]["Onix"]["speed"] = 0.5
+                fast["poison_walk_steps"] = 4
+                apply_content(fast)
+                turns = new_turn_scheduler()
+                idle = len(turns.heap)
+                del calls[:]
+                for _ in range(4):
+                    end_of_step(turns)
+                self.assertEqual(sum("Zubat" in c for c in calls), 8)
+                self.assertEqual(sum("Machop" in c for c in calls), 4)
+                self.assertEqual(sum("Onix" in c for c in calls), 2)
+                player_poisoned = True
+                end_of_step(turns)
+                self.assertEqual(len(turns.heap), idle + 1)
+                player_poisoned = False
+                for _ in range(4):
+                    end_of_step(turns)
+                self.assertEqual(len(turns.heap), idle)  # cured: poison left the heap
+            finally:
+                move_enemies = real_move
+                player_poisoned = False
+                apply_content(saved)
+
+        def test_speed_classes_move_only_their_enemies(self):
+            saved = content_dict()
+            fast = content_dict()
+            fast["enemies"]["Zubat"]["speed"] = 2.0
+            try:
+                apply_content(fast)
+                random.seed(8)
+                populate_map(30, 0, 0, 0, 10, 0)
+                zubat = set([ENEMY_ID["Zubat"]])
+                before = [list(o["pos"]) for o in map_objects]
+                move_enemies(zubat)
+                for o, old in zip(map_objects, before):
+                    if o["type"] != "enemy" or o["eid"] != ENEMY_ID["Zubat"]:
+                        self.assertEqual(o["pos"], old)
+                self.assertEqual(ENEMY_SCHEDULER.enemy_count(), 30)
+                turns = new_turn_scheduler()
+                for _ in range(20):
+                    end_of_step(turns)
+                    cells = [tuple(o["pos"]) for o in map_objects]
+                    self.assertEqual(len(cells), len(set(cells)))
+                self.assertIsNone(ENEMY_SCHEDULER.taken)  # the shared set lives for one tick
+            finally:
+                apply_content(saved)
+                replace_objects([])
+
+        def test_turbo_battle_shows_menu_to_humans(self):
+            global TURBO, QUIET, DEMO_MODE, _raw_input, current_hp
+            shown = {}
+            real_input, saved = _raw_input, (LOGGER.sinks, current_hp, TURBO)
+            _raw_input = lambda prompt="": "a"
+            try:
+                TURBO, QUIET = True, False
+                for demo in (False, True):
+                    out = _CaptureStream()
+                    DEMO_MODE = demo
+                    current_hp = char_max_hp
+                    LOGGER.set_sinks([TerminalSink(out)])
+                    do_battle(new_enemy(ENEMY_ID["Zubat"], [0, 0]))
+                    flush_log()
+                    shown[demo] = out.getvalue()
+            finally:
+                _raw_input = real_input
+                LOGGER.set_sinks(saved[0])
+                current_hp, TURBO = saved[1], saved[2]
+                QUIET, DEMO_MODE = True, True
+            self.assertIn("[A] Ember", shown[False])  # a human picks moves with the menu
+            self.assertNotIn("[A] Ember", shown[True])  # scripted: one summary screen
+            self.assertIn("Battle vs Zubat:", shown[True])
+
+        def test_walking_poison_stings(self):
+            # Opt-in content rule: poison also hurts out of battle every
+            # poison_walk_steps steps, but never knocks you out.
+            global move_enemies, player_poisoned, current_hp, total_damage_taken
+            real_move, saved = move_enemies, (current_hp, total_damage_taken)
+            content = content_dict()
+            move_enemies = lambda eids=None: None
+            try:
+                apply_content(dict(content, poison_walk_steps=4))
+                turns = new_turn_scheduler()
+                player_poisoned, current_hp, total_damage_taken = True, 50, 0
+                for _ in range(3):
+                    end_of_step(turns)
+                self.assertEqual(current_hp, 50)
+                end_of_step(turns)
+                self.assertEqual((current_hp, total_damage_taken), (49, 1))
+                for _ in range(8):
+                    end_of_step(turns)
+                self.assertEqual(current_hp, 47)
+                current_hp = 2
+                for _ in range(40):
+                    end_of_step(turns)
+                self.assertEqual((current_hp, total_damage_taken), (1, 4))
+                player_poisoned, current_hp = False, 50
+                for _ in range(8):
+                    end_of_step(turns)
+                self.assertEqual(current_hp, 50)  # cured: no more stings
+            finally:
+                move_enemies = real_move
+                player_poisoned = False
+                current_hp, total_damage_taken = saved
+                apply_content(content)
+
+        def test_timeline_fork_rewind_diff(self):
+            global TIMELINE, current_hp
+            saved_hp, saved_inv = current_hp, dict(inventory)
+            try:
+                random.seed(3)
+                populate_map(6, 1, 1, 0, 2, 1)
+                before = [(id(o), list(o["pos"])) for o in map_objects]
+                TIMELINE = Timeline()
+                cp = TIMELINE.fork()
+                rng = random.getstate()
+                for _ in range(5):
+                    move_enemies()
+                coin = next(o for o in map_objects if o["type"] == "coin")
+                remove_object(coin)
+                add_object(new_enemy(0, random_free_cell()))
+                current_hp -= 7
+                inventory["potion"] += 1
+                d = TIMELINE.diff(cp)
+                self.assertEqual(d["current_hp"], (saved_hp, saved_hp - 7))
+                self.assertEqual(d["removed"], [("coin", coin["pos"])])
+                self.assertEqual(len(d["added"]), 1)
+                self.assertTrue(d["moved"])
+                TIMELINE.rewind_to(cp)
+                self.assertEqual([(id(o), o["pos"]) for o in map_objects], before)
+                self.assertEqual((current_hp, inventory), (saved_hp, saved_inv))
+                self.assertEqual(random.getstate(), rng)
+                # per-turn history: undo two steps at once
+                TIMELINE.checkpoint()
+                move_enemies()
+                TIMELINE.checkpoint()
+                move_enemies()
+                self.assertIsNotNone(TIMELINE.rewind(2))
+                self.assertEqual([(id(o), o["pos"]) for o in map_objects], before)
+                self.assertIsNone(TIMELINE.rewind(1))
+            finally:
+                TIMELINE = None
+                current_hp = saved_hp
+                inventory.clear()
+                inventory.update(saved_inv)
+
+        def test_random_free_cell_uses_bucket_grid(self):
+            random.seed(6)
+            populate_map(40, 5, 5, 5, 40, 5)
+            try:
+                self.assertTrue(ENEMY_SCHEDULER.occupied(*map_objects[0]["pos"]))
+                taken = set(tuple(o["pos"]) for o in map_objects)
+                for _ in range(50):
+                    cell = random_free_cell()
+                    self.assertNotIn(tuple(cell), taken)
+                    self.assertNotEqual(cell, my_position)
+                o = map_objects[0]
+                old = tuple(o["pos"])
+                move_object(o, cell)
+                # the move updates the grid in place: no rebuild before the next probe
+                self.assertEqual(ENEMY_SCHEDULER.indexed, len(map_objects))
+                self.assertTrue(ENEMY_SCHEDULER.occupied(cell[0], cell[1]))
+                self.assertFalse(ENEMY_SCHEDULER.occupied(*old))
+            finally:
+                replace_objects([])
+
+        def test_timeline_rewind_across_removal(self):
+            global TIMELINE
+            b = ENEMY_SCHEDULER.bucket
+            e = new_enemy(0, [b - 1, 1])
+            replace_objects([e, new_enemy(0, [1, 3])])
+            before = [(id(o), list(o["pos"])) for o in map_objects]
+            try:
+                TIMELINE = Timeline()
+                TIMELINE.checkpoint()
+                move_object(e, [b, 1])  # crosses into the next bucket
+                TIMELINE.checkpoint()
+                remove_object(e)
+                ENEMY_SCHEDULER._rebuild()  # the grid no longer holds e
+                move_enemies()
+                self.assertIsNotNone(TIMELINE.rewind(2))
+                self.assertEqual([(id(o), o["pos"]) for o in map_objects], before)
+                self.assertEqual(ENEMY_SCHEDULER.enemy_count(), 2)
+                h = state_hash()
+                rehash_objects()
+                self.assertEqual(state_hash(), h)
+            finally:
+                TIMELINE = None
+
+        def test_state_hash_incremental(self):
+            global TIMELINE
+            try:
+                random.seed(5)
+                populate_map(6, 1, 1, 1, 2, 1)
+                start = state_hash()
+                TIMELINE = Timeline()
+                cp = TIMELINE.fork()
+                for _ in range(10):
+                    move_enemies()
+                remove_object(next(o for o in map_objects if o["type"] == "coin"))
+                add_object(new_enemy(0, random_free_cell()))
+                incremental = OBJECTS_HASH
+                rehash_objects()
+                self.assertEqual(OBJECTS_HASH, incremental)
+                self.assertNotEqual(state_hash(), start)
+                TIMELINE.rewind_to(cp)
+                self.assertEqual(state_hash(), start)  # same state, same hash
+                potion = next(o for o in map_objects if o["type"] == "potion")
+                home = potion["pos"]
+                move_object(potion, random_free_cell())
+                move_object(potion, home)
+                self.assertEqual(state_hash(), start)  # path-independent
+                random.seed(9)
+                play_headless()
+                incremental = OBJECTS_HASH
+                rehash_objects()
+                self.assertEqual(OBJECTS_HASH, incremental)
+            finally:
+                TIMELINE = None
+
+        def test_camera_window(self):
+            global QUIET, my_position
+            frame = _CaptureStream()
+            saved, saved_radius = LOGGER.sinks, ENEMY_SCHEDULER.radius
+            try:
+                _bench_world(128, 64, 300)
+                CAMERA.fixed = (20, 10)
+                self.assertEqual(CAMERA.frame(), (0, 0, 20, 10))  # clamped at the corner
+                my_position = [127, 63]
+                self.assertEqual(CAMERA.frame(), (108, 54, 20, 10))
+                ENEMY_SCHEDULER.radius = 0  # every enemy roams: the grid must follow
+                for _ in range(5):
+                    move_enemies()
+                occ = dict((p, o) for p, o in occupancy_index().items()
+                           if 108 <= p[0] < 128 and 54 <= p[1] < 64)
+                self.assertEqual(ENEMY_SCHEDULER.window(108, 54, 20, 10), occ)
+                QUIET = False
+                LOGGER.set_sinks([TerminalSink(frame)])
+                draw_map()
+                rows = [line for line in frame.getvalue().splitlines() if line.startswith("|")]
+                self.assertEqual(len(rows), 10)
+                self.assertTrue(all(len(r) == 2 + 3 * 20 for r in rows))
+                self.assertIn(" @ ", rows[-1])
+            finally:
+                QUIET = True
+                LOGGER.set_sinks(saved)
+                CAMERA.fixed = None
+                ENEMY_SCHEDULER.radius = saved_radius
+                use_map(build_map(ASCII_MAP)[0])
+                replace_objects([])
+                my_position = [0, 1]
+
+        def test_camera_open_world_stays_resident(self):
+            global QUIET, WORLD, my_position
+            saved = LOGGER.sinks
+            WORLD = ChunkWorld(7, (2, 1, 0, 0, 1, 0))
+            try:
+                map_objects[:] = []
+                my_position = [CHUNK_SIZE, 5]  # left edge of chunk (1, 0)
+                WORLD.focus(my_position[0], my_position[1])
+                generated = WORLD.generated
+                CAMERA.fixed = (60, 60)
+                ox, oy, w, h = CAMERA.frame()
+                self.assertEqual((w, h), (3 * CHUNK_SIZE, 3 * CHUNK_SIZE))
+                self.assertEqual((ox, oy), (0, -CHUNK_SIZE))
+                CAMERA.fixed = (40, 20)
+                ox, oy, w, h = CAMERA.frame()
+                self.assertEqual((ox, w), (0, 40))  # slid right to stay on loaded chunks
+                self.assertTrue(ox <= my_position[0] < ox + w and oy <= my_position[1] < oy + h)
+                QUIET = False
+                LOGGER.set_sinks([TerminalSink(_NullStream())])
+                draw_map()
+                self.assertEqual((WORLD.generated, len(WORLD.chunks)), (generated, 9))
+            finally:
+                QUIET = True
+                LOGGER.set_sinks(saved)
+                CAMERA.fixed = None
+                WORLD = None
+                replace_objects([])
+                my_position = [0, 1]
+
+        def test_cast_export_writes_changed_lines(self):
+            import json
+            import tempfile
+            fd, path = tempfile.mkstemp(suffix=".cast")
+            os.close(fd)
+            try:
+                sink = CastSink(path)
+                sink.write("A\nB\n" + CLEAR_SCREEN + "A\nC\n")
+                sink.write(CLEAR_SCREEN + "A\nC\n" + CLEAR_SCREEN + "A\n")
+                sink.close()
+                with open(path) as fh:
+                    lines = [json.loads(line) for line in fh]
+                self.assertEqual(lines[0]["version"], 2)
+                self.assertEqual(lines[1], [0.0, "o", CLEAR_SCREEN + "A\r\nB"])
+                self.assertEqual(lines[2], [0.12, "o", "\033[2;1HC\033[K"])
+                self.assertEqual(lines[3], [0.36, "o", "\033[2;1H\033[K"])  # frame 3 was unchanged
+                random.seed(2)
+                play_headless(["--cast", path])
+                with open(path) as fh:
+                    header = json.loads(fh.readline())
+                    events = [json.loads(line) for line in fh]
+                self.assertEqual(header["version"], 2)
+                self.assertTrue(len(events) > 1)
+                self.assertFalse(os.path.exists(path + ".part"))
+            finally:
+                os.remove(path)
+
+        def test_profile_written_when_interrupted(self):
+            global STEP_HOOK, PROFILING, PROFILE_JSON
+            import json
+            import tempfile
+            fd, path = tempfile.mkstemp(suffix=".json")
+            os.close(fd)
+            os.remove(path)
+            turns = [0]
+
+            def hook():
+                turns[0] += 1
+                if turns[0] > 3:
+                    raise KeyboardInterrupt
+
+            STEP_HOOK = hook
+            try:
+                random.seed(3)
+                self.assertRaises(KeyboardInterrupt, play_headless, ["--profile-json", path])
+                with open(path) as fh:
+                    self.assertEqual(json.load(fh)["draw"]["count"], 3)
+            finally:
+                STEP_HOOK = None
+                PROFILING = False
+                PROFILE_JSON = None
+                if os.path.exists(path):
+                    os.remove(path)
+
+        def test_seed_search_applies_game_flags(self):
+            global MAP_WRAP, HP_SCALE
+            saved = MAP_WRAP, HP_SCALE
+            try:
+                MAP_WRAP, HP_SCALE = True, 1.0
+                found = _seed_chunk((3, 2, ("--no-wrap", "--hp-scale", "1.5"), "nearest_enemy>=0"))
+                self.assertEqual([m["seed"] for m in found], [3, 4])
+                self.assertFalse(MAP_WRAP)
+                self.assertEqual(HP_SCALE, 1.5)
+            finally:
+                MAP_WRAP, HP_SCALE = saved
+
+        def test_invariants_and_stress_shrink(self):
+            global current_hp, check_invariants
+            saved_hp = current_hp
+            random.seed(4)
+            populate_map(4, 1, 0, 0, 1, 0)
+            check_invariants()
+            try:
+                current_hp = char_max_hp + 1
+                with self.assertRaises(InvariantError):
+                    check_invariants()
+                current_hp = saved_hp
+                map_objects[1]["pos"] = list(map_objects[0]["pos"])
+                with self.assertRaises(InvariantError):
+                    check_invariants()
+            finally:
+                current_hp = saved_hp
+                replace_objects([])
+            turns, used, error = run_stress_case(3, stress_keys(3, 300))
+            self.assertIsNone(error)
+            self.assertTrue(turns > 0 and used > 0)
+            # a planted "bug": picking up any coin breaks the game
+            real = check_invariants
+
+            def planted():
+                real()
+                if score > 0:
+                    raise InvariantError("coin", "score %d" % score)
+            check_invariants = planted
+            try:
+                seed = next(s for s in range(50) if run_stress_case(s, stress_keys(s, 300))[2])
+                keys = stress_keys(seed, 300)
+                _, used, error = run_stress_case(seed, keys)
+                small, error = shrink_failure(seed, keys, (), error, budget=300)
+                self.assertEqual(error.kind, "coin")
+                self.assertTrue(len(small) <= used)
+                self.assertIsNotNone(run_stress_case(seed, small)[2])
+            finally:
+                check_invariants = real
+
+        def test_draw_map_coalesces_color_runs(self):
+            global ENABLE_COLOR, QUIET
+            import re
+            frames = {}
+            saved = LOGGER.sinks, ENABLE_COLOR, QUIET
+            try:
+                QUIET = False
+                _bench_world(30, 15, 16)
+                for color in (False, True):
+                    out = _CaptureStream()
+                    ENABLE_COLOR = color
+                    LOGGER.set_sinks([TerminalSink(out)])
+                    draw_map()
+                    frames[color] = out.getvalue()
+            finally:
+                LOGGER.set_sinks(saved[0])
+                ENABLE_COLOR, QUIET = saved[1], saved[2]
+            colored, plain = frames[True], frames[False]
+            self.assertEqual(re.sub("\033\\[[0-9;]*m", "", colored), plain)
+            self.assertLess(len(colored), 2 * len(plain))
+            rows = [r for r in colored.splitlines() if r.startswith("|")]
+            self.assertEqual(len(rows), 15)
+            # the top wall (plus trailing blanks) is a single run: one code, one reset
+            self.assertTrue(rows[0].startswith("|" + CSI + "0;" + COLORS["wall"][len(CSI):] + "###"))
+            self.assertEqual(rows[0].count(CSI), 2)
+            self.assertTrue(all(r.count(RESET) <= 1 and r.endswith("|") for r in rows))
+
+        # Ensure draw_map does not crash in DEMO/QUIET mode
+        def test_draw_map_no_crash(self):
+            try:
+                draw_map()
+            except Exception as e:
+                self.fail("draw_map raised an exception: %s" % e)
+
+    return GameTests